@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+
+from utils.cache import get_cache_stats
+from utils.images import get_image_stats
+from utils.log import log as logger
+
+
+router = APIRouter()
+
+
+## cache
+
+
+## stats
+@router.get("/cache/stats")
+async def cache_stats():
+    """查询缓存命中/未命中/失效计数, 图片镜像统计"""
+    logger.info(f"/api/cache/stats")
+
+    try:
+        stats = get_cache_stats()
+        stats['images'] = await get_image_stats()
+        logger.debug(f"stats: {stats}")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": stats
+        }
+    except Exception as e:
+        logger.error(f"/api/cache/stats - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
@@ -10,8 +10,15 @@ from fastapi import APIRouter, Depends, Request, BackgroundTasks
 from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
 from pydantic import BaseModel
 
-from utils.db import get_db, format_query_for_db, convert_row_to_dict, format_datetime_fields
+from utils.db import get_db, transaction, write_buffer, stream_rows, format_query_for_db, convert_row_to_dict
+from utils.cache import invalidate_cache
 from utils.log import log as logger
+from utils.tags import save_web_tags
+from utils.images import warm_images
+from utils.verify import start_verify, get_verify_status
+from utils.duplicates import start_phash, get_phash_status, get_duplicate_clusters
+from utils.watch import get_watcher_status
+from utils.scan import start_scan, stop_scan, get_scan_status
 from utils.local import *
 from utils.web import *
 from config import *
@@ -140,9 +147,9 @@ async def file_rename(id_name: str, new_base_name: str, cursor=Depends(get_db)):
         values = (dstcode, dstname, dstfile, id_name,)
         update_query = format_query_for_db(update_query)
         logger.debug(f"update_query: {update_query} values: {values}")
-        await cursor.execute(update_query, values)
-        if DB_ENGINE == "sqlite": cursor.connection.commit()
-        else: await cursor.connection.commit()
+        async with transaction(cursor):
+            await cursor.execute(update_query, values)
+        await invalidate_cache('dav_local')
 
         logger.success(f"File rename successful! id: {id_name}")
         return {
@@ -210,9 +217,9 @@ async def file_webname(id_name: str, cursor=Depends(get_db)):
         logger.debug(f"code_info: {code_info}")
         if code_info is None:
             if code_name.upper().startswith('FC2-'):
-                code_info = get_123av_title(code_name)
+                code_info = await get_123av_title(code_name)
             else:
-                code_info = get_javbus_title(code_name)
+                code_info = await get_javbus_title(code_name)
             logger.debug(f"code_info: {code_info}")
             # insert web
             if code_info is None:
@@ -223,9 +230,12 @@ async def file_webname(id_name: str, cursor=Depends(get_db)):
                 values = (code_info['code'], code_info['name'], code_info['date'], code_info['studio'], code_info['director'], code_info['series'], json.dumps(code_info['genre'], ensure_ascii=False),  json.dumps(code_info['websites']), json.dumps(code_info['actors'], ensure_ascii=False), json.dumps(code_info['images'], ensure_ascii=False), 1, code_info['code'],)
             insert_query = format_query_for_db(insert_query)
             logger.debug(f"insert_query: {insert_query} values: {values}")
-            await cursor.execute(insert_query, values)
-            if DB_ENGINE == "sqlite": cursor.connection.commit()
-            else: await cursor.connection.commit()
+            async with transaction(cursor):
+                await cursor.execute(insert_query, values)
+                await save_web_tags(cursor, code_info)
+            await invalidate_cache('dav_web')
+            if code_info is not None:
+                warm_images(code_info['images'])  # 后台镜像图片
 
             if code_info is None:
                 return {
@@ -235,9 +245,9 @@ async def file_webname(id_name: str, cursor=Depends(get_db)):
                 }
         elif len(code_info['code'])==len(code_info['name']):
             if code_name.upper().startswith('FC2-'):
-                code_info = get_123av_title(code_name)
+                code_info = await get_123av_title(code_name)
             else:
-                code_info = get_javbus_title(code_name)
+                code_info = await get_javbus_title(code_name)
             logger.debug(f"code_info: {code_info}")
             if code_info is None:
                 return {
@@ -247,12 +257,14 @@ async def file_webname(id_name: str, cursor=Depends(get_db)):
                 }
             # update web
             update_query = "UPDATE dav_web set code=%s,name=%s,date=%s,studio=%s,director=%s,series=%s,genre=%s,websites=%s,actors=%s,images=%s,status=%s WHERE code=%s"
-            values = (code_info['code'], code_info['name'], code_info['date'], code_info['studio'], code_info['director'], code_info['series'], json.dumps(code_info['genre'], ensure_ascii=False),  json.dumps(code_info['websites']), json.dumps(code_info['actors'], ensure_ascii=False), json.dumps(code_info['images'], ensure_ascii=False), code_info['code'], 1,)
+            values = (code_info['code'], code_info['name'], code_info['date'], code_info['studio'], code_info['director'], code_info['series'], json.dumps(code_info['genre'], ensure_ascii=False),  json.dumps(code_info['websites']), json.dumps(code_info['actors'], ensure_ascii=False), json.dumps(code_info['images'], ensure_ascii=False), 1, code_info['code'],)
             update_query = format_query_for_db(update_query)
             logger.debug(f"update_query: {update_query} values: {values}")
-            await cursor.execute(update_query, values)
-            if DB_ENGINE == "sqlite": cursor.connection.commit()
-            else: await cursor.connection.commit()
+            async with transaction(cursor):
+                await cursor.execute(update_query, values)
+                await save_web_tags(cursor, code_info)
+            await invalidate_cache('dav_web')
+            warm_images(code_info['images'])  # 后台镜像图片
 
         # ------------------------------------------------------
 
@@ -290,9 +302,9 @@ async def file_webname(id_name: str, cursor=Depends(get_db)):
         values = (dstcode, dstname, dstfile, id_name,)
         update_query = format_query_for_db(update_query)
         logger.debug(f"update_query: {update_query} values: {values}")
-        await cursor.execute(update_query, values)
-        if DB_ENGINE == "sqlite": cursor.connection.commit()
-        else: await cursor.connection.commit()
+        async with transaction(cursor):
+            await cursor.execute(update_query, values)
+        await invalidate_cache('dav_local')
 
         logger.success(f"File webname successful! id: {id_name}")
         return {
@@ -317,16 +329,70 @@ async def file_keyname(old_key: str, new_key: str, cursor=Depends(get_db)):
             logger.warning(f"The number of old_key is greater than 2: {old_key}")
             return HTMLResponse("The number of old_key is greater than 2", status_code=402)
 
-        # 获取匹配的文件列表
+        # 获取匹配的文件列表 (流式读取, 按批重命名并提交)
         check_query = "SELECT id,code,name,path,file FROM dav_local WHERE INSTR(UPPER(file), UPPER(%s))>0"
         values = (old_key,)
-        check_query = format_query_for_db(check_query)
         logger.debug(f"check_query: {check_query} values: {values}")
-        await cursor.execute(check_query, values)
-        local_files = await cursor.fetchall()
-        local_files_len = len(local_files)
-        logger.debug(f"find {old_key} - {local_files_len} {local_files[0] if local_files_len>0 else ''}")
-        if local_files_len == 0:
+        update_query = "UPDATE dav_local SET name=%s,file=%s,updated_time=NOW() WHERE id=%s"
+        update_query = format_query_for_db(update_query)
+
+        match_count = 0  # 匹配的文件计数
+        file_count = 0  # 需要处理的文件计数
+        success_count = 0  # 成功处理的文件计数
+        async for local_files in stream_rows(check_query, values):
+            match_count += len(local_files)
+            logger.debug(f"find {old_key} - {match_count} {local_files[0]}")
+
+            update_values = []
+            for local_file in local_files:
+                logger.debug(f"local_file: {local_file}")
+                
+                id_name = local_file['id']
+                srcfile = local_file['file']
+                srcpath = os.path.join(local_file['path'], srcfile)
+                
+                src_path = Path(srcpath)
+                if not src_path.exists():
+                    logger.warning(f"Video not found: {srcpath}")
+                    continue
+                
+                # 只替换文件名部分，避免替换路径中的匹配项
+                dstfile = srcfile.replace(old_key, new_key)
+                dstpath = os.path.join(local_file['path'], dstfile)
+                dst_path = Path(dstpath)
+                
+                if dst_path.exists():
+                    logger.warning(f"File already exists: {dstpath}")
+                    continue
+
+                # 文件名一样不用修改
+                if srcfile == dstfile:
+                    logger.warning(f"No need to modify: {old_key}")
+                    continue
+                if dstfile == 'null':
+                    logger.warning(f"Target is empty: {old_key}")
+                    continue
+
+                # 修改文件名
+                dstname = os.path.splitext(dstfile)[0]
+                file_count += 1
+                try:
+                    os.rename(src_path, dst_path)
+                    update_values.append((dstname, dstfile, id_name,))
+                    
+                    success_count += 1
+                    logger.success(f"File keyname successful! id: {id_name} - {success_count}/{file_count}")
+                except Exception as e:
+                    logger.error(f"Failed to keyname file {src_path}: {str(e)}")
+            
+            # 按批修改数据库 每批提交一次
+            if update_values:
+                logger.debug(f"update_query: {update_query} values: {len(update_values)}")
+                async with transaction(cursor):
+                    await cursor.executemany(update_query, update_values)
+                await invalidate_cache('dav_local')
+
+        if match_count == 0:
             return {
                 "code": 200,
                 "success": True,
@@ -334,79 +400,6 @@ async def file_keyname(old_key: str, new_key: str, cursor=Depends(get_db)):
                 "data": "No files matched the criteria",
             }
         
-        # logger.debug(f"local_files: {local_files}")
-        if isinstance(local_files, (list, tuple)) and local_files_len > 0: # 转换字典列表
-            converted_list = []
-            for row in local_files: # 将每一行转换为字典
-                row_dict = convert_row_to_dict(row, cursor.description)  # 转换字典
-                formatted_row = format_datetime_fields(row_dict)  # DATETIME转字符串
-                converted_list.append(formatted_row)
-            local_files = converted_list
-        logger.debug(f"local_files: {local_files[0] if len(local_files)>0 else ''}")
-
-        file_count = 0  # 成功处理的文件计数
-        updated_records = []  # 存储需要更新的记录
-        
-        for local_file in local_files:
-            # logger.debug(f"local_file: {local_file}")
-            local_file = convert_row_to_dict(local_file, cursor.description)  # 转换字典
-            logger.debug(f"local_file: {local_file}")
-            
-            id_name = local_file['id']
-            srcfile = local_file['file']
-            srcpath = os.path.join(local_file['path'], srcfile)
-            
-            src_path = Path(srcpath)
-            if not src_path.exists():
-                logger.warning(f"Video not found: {srcpath}")
-                continue
-            
-            # 只替换文件名部分，避免替换路径中的匹配项
-            dstfile = srcfile.replace(old_key, new_key)
-            dstpath = os.path.join(local_file['path'], dstfile)
-            dst_path = Path(dstpath)
-            
-            if dst_path.exists():
-                logger.warning(f"File already exists: {dstpath}")
-                continue
-
-            # 文件名一样不用修改
-            if srcfile == dstfile:
-                logger.warning(f"No need to modify: {old_key}")
-                continue
-            if dstfile == 'null':
-                logger.warning(f"Target is empty: {old_key}")
-                continue
-
-            # 记录需要更新的信息
-            dstname = os.path.splitext(dstfile)[0]
-            updated_records.append((dstname, dstfile, id_name, src_path, dst_path))
-            file_count += 1
-        
-        # 批量更新数据库和文件系统
-        success_count = 0
-        for dstname, dstfile, id_name, src_path, dst_path in updated_records:
-            try:
-                # 修改数据库
-                update_query = "UPDATE dav_local SET name=%s,file=%s,updated_time=NOW() WHERE id=%s"
-                values = (dstname, dstfile, id_name,)
-                update_query = format_query_for_db(update_query)
-                logger.debug(f"update_query: {update_query} values: {values}")
-                await cursor.execute(update_query, values)
-                
-                # 修改文件名
-                os.rename(src_path, dst_path)
-                
-                success_count += 1
-                logger.success(f"File keyname successful! id: {id_name} - {success_count}/{file_count}")
-            except Exception as e:
-                logger.error(f"Failed to keyname file {src_path}: {str(e)}")
-                # 如果需要严格模式，可以在这里回滚或者抛出异常
-        
-        # 统一提交数据库更改
-        if DB_ENGINE == "sqlite": cursor.connection.commit()
-        else: await cursor.connection.commit()
-        
         # 关键字是否存在: 不存在则入库, 存在则将更新次数
         check_query = "SELECT id FROM dav_keyword WHERE `old_key`=%s and status=0 and id>0"
         values = (old_key,)
@@ -416,21 +409,16 @@ async def file_keyname(old_key: str, new_key: str, cursor=Depends(get_db)):
         recoed_keys = await cursor.fetchone()
         logger.debug(f"recoed_keys: {recoed_keys}")
         if recoed_keys:
-            # 更新搜索次数
-            update_query = "UPDATE dav_keyword SET count=(count+1) WHERE `old_key`=%s"
-            values = (old_key,)
-            update_query = format_query_for_db(update_query)
-            logger.debug(f"update_query: {update_query} values: {values}")
-            await cursor.execute(update_query, values)
+            # 更新搜索次数 (写缓冲)
+            write_buffer.incr('dav_keyword', 'old_key', old_key)
         else:
             # 插入搜索记录
             insert_query = "INSERT INTO dav_keyword (`old_key`, `new_key`, count) VALUES (%s, %s, %s)"
             values = (old_key, new_key, 1,)
             insert_query = format_query_for_db(insert_query)
             logger.debug(f"insert_query: {insert_query} values: {values}")
-            await cursor.execute(insert_query, values)
-        if DB_ENGINE == "sqlite": cursor.connection.commit()
-        else: await cursor.connection.commit()
+            async with transaction(cursor):
+                await cursor.execute(insert_query, values)
         
         logger.success(f"Batch file keyname completed! Success: {success_count}/{file_count}")
         return {
@@ -463,7 +451,7 @@ async def file_delete(id_name: str, pwd: str, cursor=Depends(get_db)):
             return {"code": 400, "success": False, "msg": "Password verification failed"}
         
         # 获取path
-        check_query = "SELECT id,code,path,file,status FROM dav_local WHERE id=%s"
+        check_query = "SELECT id,code,path,file,crc,status FROM dav_local WHERE id=%s"
         values = (id_name,)
         check_query = format_query_for_db(check_query)
         logger.debug(f"check_query: {check_query} values: {values}")
@@ -489,9 +477,9 @@ async def file_delete(id_name: str, pwd: str, cursor=Depends(get_db)):
         values = (id_name,)
         update_query = format_query_for_db(update_query)
         logger.debug(f"update_query: {update_query} values: {values}")
-        await cursor.execute(update_query, values)
-        if DB_ENGINE == "sqlite": cursor.connection.commit()
-        else: await cursor.connection.commit()
+        async with transaction(cursor):
+            await cursor.execute(update_query, values)
+        await invalidate_cache('dav_local')
 
         # 删除文件
         try:
@@ -507,22 +495,25 @@ async def file_delete(id_name: str, pwd: str, cursor=Depends(get_db)):
             else:
                 logger.error(f"File remove Error: {e}")
 
-        # 计算hash
-        video_hash = hashlib.sha256(path.encode()).hexdigest()
-        thumbnail_path = f"{TEMP_PATH}/{video_hash}.png"
-        # 删除缩略图
-        try:
-            if not os.path.exists(thumbnail_path):  # 文件不存在
-                logger.warning(f"Thumbnail not found: {thumbnail_path}")
-                return {"code": 400, "success": False, "msg": "File not found"}
-            # 删除文件
-            os.remove(thumbnail_path)
-            logger.info(f"Thumbnail {thumbnail_path} remove successfully.")
-        except OSError as e:
-            if e.errno == 2:  # 文件不存在
-                logger.info(f"Thumbnail already not exists when trying to remove: {thumbnail_path}")
-            else:
-                logger.error(f"Thumbnail remove Error: {e}")
+        # 缩略图 (按指纹命名)
+        thumbnail_path = get_thumbnail_file(path, local_file['crc'])
+        # 重复文件共用同一缩略图, 仍被使用时保留 (无人使用后由 /api/sweepthumbnail 清理)
+        if await thumbnail_shared(cursor, local_file['crc'], id_name):
+            logger.info(f"Thumbnail {thumbnail_path} shared by other files, kept.")
+        else:
+            # 删除缩略图
+            try:
+                if not os.path.exists(thumbnail_path):  # 文件不存在
+                    logger.warning(f"Thumbnail not found: {thumbnail_path}")
+                    return {"code": 400, "success": False, "msg": "File not found"}
+                # 删除文件
+                os.remove(thumbnail_path)
+                logger.info(f"Thumbnail {thumbnail_path} remove successfully.")
+            except OSError as e:
+                if e.errno == 2:  # 文件不存在
+                    logger.info(f"Thumbnail already not exists when trying to remove: {thumbnail_path}")
+                else:
+                    logger.error(f"Thumbnail remove Error: {e}")
 
         logger.success(f"File deleted successful! id: {id_name}")
         return {
@@ -544,7 +535,7 @@ async def file_syncthumbnail(id_name: str, cursor=Depends(get_db)):
 
     try:
         # 获取path
-        check_query = "SELECT id,code,path,file,status FROM dav_local WHERE id=%s"
+        check_query = "SELECT id,code,path,file,crc,status FROM dav_local WHERE id=%s"
         values = (id_name,)
         check_query = format_query_for_db(check_query)
         logger.debug(f"check_query: {check_query} values: {values}")
@@ -560,9 +551,12 @@ async def file_syncthumbnail(id_name: str, cursor=Depends(get_db)):
         path = os.path.join(local_file['path'], local_file['file'])
         logger.debug(f"path: {path}")
         
-        # 计算hash
-        video_hash = hashlib.sha256(path.encode()).hexdigest()
-        thumbnail_path = f"{TEMP_PATH}/{video_hash}.png"
+        # 缩略图 (按指纹命名)
+        thumbnail_path = get_thumbnail_file(path, local_file['crc'])
+        # 重复文件共用同一缩略图, 仍被其他记录使用时不删除
+        if await thumbnail_shared(cursor, local_file['crc'], id_name):
+            logger.warning(f"Thumbnail shared by other files, kept: {thumbnail_path}")
+            return {"code": 400, "success": False, "msg": "Thumbnail shared by other files"}
         # 删除缩略图
         try:
             if not os.path.exists(thumbnail_path):  # 文件不存在
@@ -629,6 +623,7 @@ async def file_cut(id_name: str, second: str, cursor=Depends(get_db)):
         logger.debug(f"check_query: {check_query} values: {values}")
         await cursor.execute(check_query, values)
         exist_mission = await cursor.fetchone()
+        exist_mission = convert_row_to_dict(exist_mission, cursor.description)  # 转换字典
         if exist_mission:
             logger.success(f"File existting! id: {id_name} - {second}")
             return {
@@ -643,9 +638,8 @@ async def file_cut(id_name: str, second: str, cursor=Depends(get_db)):
         values = (id_name, local_file['path'], local_file['file'], 1, int(second), 0,)
         insert_query = format_query_for_db(insert_query)
         logger.debug(f"insert_query: {insert_query} values: {values}")
-        await cursor.execute(insert_query, values)
-        if DB_ENGINE == "sqlite": cursor.connection.commit()
-        else: await cursor.connection.commit()
+        async with transaction(cursor):
+            await cursor.execute(insert_query, values)
         
         logger.success(f"Video cutting in progress! id: {id_name} - {second}")
         return {
@@ -709,9 +703,9 @@ async def file_star(id_name: str, stars: int, cursor=Depends(get_db)):
             values = (code_name, code_name, stars, 0, code_name,)
             insert_query = format_query_for_db(insert_query)
             logger.debug(f"insert_query: {insert_query} values: {values}")
-            await cursor.execute(insert_query, values)
-            if DB_ENGINE == "sqlite": cursor.connection.commit()
-            else: await cursor.connection.commit()
+            async with transaction(cursor):
+                await cursor.execute(insert_query, values)
+            await invalidate_cache('dav_web')
         elif int(code_info['score'])==stars:
             logger.error(f"id: {id_name} - score: {stars}")
             return {
@@ -726,9 +720,9 @@ async def file_star(id_name: str, stars: int, cursor=Depends(get_db)):
             values = (stars, code_info['id'],)
             update_query = format_query_for_db(update_query)
             logger.debug(f"update_query: {update_query} values: {values}")
-            await cursor.execute(update_query, values)
-            if DB_ENGINE == "sqlite": cursor.connection.commit()
-            else: await cursor.connection.commit()
+            async with transaction(cursor):
+                await cursor.execute(update_query, values)
+            await invalidate_cache('dav_web')
 
         # ------------------------------------------------------
         
@@ -783,13 +777,14 @@ async def file_transcode(id_name: str, cursor=Depends(get_db)):
         logger.debug(f"check_query: {check_query} values: {values}")
         await cursor.execute(check_query, values)
         exist_mission = await cursor.fetchone()
+        exist_mission = convert_row_to_dict(exist_mission, cursor.description)  # 转换字典
         if exist_mission:
             logger.success(f"File existting! id: {id_name}")
             return {
                 "code": 200,
                 "success": True,
                 "msg": "Success",
-                "data": "Video transcoding in progress!" if exist_mission[1] == 1 else "Video transcoding completed!"
+                "data": "Video transcoding in progress!" if exist_mission['status'] == 1 else "Video transcoding completed!"
             }
         
         # 插入转码任务
@@ -797,9 +792,8 @@ async def file_transcode(id_name: str, cursor=Depends(get_db)):
         values = (id_name, local_file['path'], local_file['file'], 2,)
         insert_query = format_query_for_db(insert_query)
         logger.debug(f"insert_query: {insert_query} values: {values}")
-        await cursor.execute(insert_query, values)
-        if DB_ENGINE == "sqlite": cursor.connection.commit()
-        else: await cursor.connection.commit()
+        async with transaction(cursor):
+            await cursor.execute(insert_query, values)
         
         logger.success(f"Video transcoding in progress! id: {id_name}")
         return {
@@ -814,44 +808,102 @@ async def file_transcode(id_name: str, cursor=Depends(get_db)):
 
 
 ## scan
+def decode_scan_paths(path: str | None) -> list:
+    """path 参数 (base58) => 扫盘根目录列表, 空或 all 为全部 SCAN_PATH"""
+    if path is None or path == '' or path == 'all':
+        return list(SCAN_PATH)
+    # base58 解密 path
+    path = bytes.decode(base58.b58decode(path))
+    logger.debug(f"path: {path}")
+    return [path]
+
 @router.get("/scan")
-async def folder_scan(background_tasks: BackgroundTasks, path: str | None='all', cursor=Depends(get_db)):
-    """扫盘 更新本地数据库"""
+async def folder_scan(path: str | None='all'):
+    """扫盘 更新本地数据库 (每个根目录一个后台任务, 断点续传)"""
     logger.info(f"/api/scan - path: {path}")
 
     try:
-        if path == '' or path == 'all':
-            localpaths = SCAN_PATH
-        else:
-            # base58 解密 path
-            # logger.debug(f"path: {path}")
-            path_bytes = base58.b58decode(path)
-            # logger.debug(f"path_bytes: {path_bytes}")
-            path = bytes.decode(path_bytes)
-            logger.debug(f"path: {path}")
-            localpaths = [path]
-        
-        # 后台任务 - 扫盘
-        background_tasks.add_task(
-            sync_scan_path,
-            localpaths=localpaths,
-        )
+        localpaths = decode_scan_paths(path)
+        mission_ids = await start_scan(localpaths)
 
-        logger.success(f"Folder scanning! localpaths: {localpaths}")
+        logger.success(f"Folder scanning! localpaths: {localpaths} missions: {mission_ids}")
         return {
             "code": 200,
             "success": True,
             "msg": "Success",
-            "data": "Folder scanning!",
+            "data": {"missions": mission_ids},
         }
     except Exception as e:
         logger.error(f"/api/scan - except ERROR: {str(e)}")
         return {"code": 500, "success": False, "msg": "Server error"}
 
 
+## scan status
+@router.get("/scan/status")
+async def scan_status(path: str | None='all', cursor=Depends(get_db)):
+    """扫盘任务进度: path/progress(目录)/checkpoint/rate(文件/s)/dirs/files/inserted/moved/skipped/errors/vanished"""
+    logger.info(f"/api/scan/status - path: {path}")
+
+    try:
+        missions = await get_scan_status(cursor, decode_scan_paths(path))
+        logger.debug(f"missions: {missions}")
+        if not missions:
+            return {"code": 404, "success": False, "msg": "Mission not found"}
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": missions,
+        }
+    except Exception as e:
+        logger.error(f"/api/scan/status - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## scan stop
+@router.get("/scan/stop")
+async def scan_stop(path: str | None='all'):
+    """停止扫盘任务 (保留断点, 再次 /api/scan 时继续)"""
+    logger.info(f"/api/scan/stop - path: {path}")
+
+    try:
+        await stop_scan(decode_scan_paths(path))
+        logger.success(f"Folder scan stopped!")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": "Folder scan stopped!",
+        }
+    except Exception as e:
+        logger.error(f"/api/scan/stop - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## watch status
+@router.get("/watch/status")
+async def watch_status():
+    """目录监控状态: mode/roots/dirty/pending_deletes/events/batches/inserted/moved/deleted"""
+    logger.info(f"/api/watch/status")
+
+    try:
+        status = get_watcher_status()
+        if status is None:
+            return {"code": 404, "success": False, "msg": "Watcher not running"}
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": status,
+        }
+    except Exception as e:
+        logger.error(f"/api/watch/status - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
 ## sync
 @router.get("/syncthumbnail")
-async def sync_thumbnail(background_tasks: BackgroundTasks, path: str | None='all', cursor=Depends(get_db)):
+async def sync_thumbnail(background_tasks: BackgroundTasks, path: str | None='all'):
     """同步缩略图"""
     logger.info(f"/api/syncthumbnail")
 
@@ -869,29 +921,18 @@ async def sync_thumbnail(background_tasks: BackgroundTasks, path: str | None='al
 
         ## 搜索列表
         if len(localpaths) > 1:
-            check_query = "SELECT id,code,path,file,size,duration,aspectratio,resolution,created FROM dav_local WHERE status=0 and id>0 ORDER BY code ASC"
+            check_query = "SELECT id,code,path,file,size,duration,aspectratio,resolution,created,crc,phash FROM dav_local WHERE status=0 and id>0 ORDER BY code ASC"
             values = ()
         else:
-            check_query = "SELECT id,code,path,file,size,duration,aspectratio,resolution,created FROM dav_local WHERE path=%s and status=0 and id>0 ORDER BY code ASC"
+            check_query = "SELECT id,code,path,file,size,duration,aspectratio,resolution,created,crc,phash FROM dav_local WHERE path=%s and status=0 and id>0 ORDER BY code ASC"
             values = (localpaths[0],)
-        check_query = format_query_for_db(check_query)
         logger.debug(f"check_query: {check_query} values: {values}")
-        await cursor.execute(check_query, values)
-        local_files = await cursor.fetchall()
-        # logger.debug(f"local_files: {local_files}")
-        if isinstance(local_files, (list, tuple)) and len(local_files) > 0: # 转换字典列表
-            converted_list = []
-            for row in local_files: # 将每一行转换为字典
-                row_dict = convert_row_to_dict(row, cursor.description)  # 转换字典
-                formatted_row = format_datetime_fields(row_dict)  # DATETIME转字符串
-                converted_list.append(formatted_row)
-            local_files = converted_list
-        logger.debug(f"local_files: {local_files[0] if len(local_files)>0 else ''}")
-
-        # 后台任务 - 批量生成视频预览图
+
+        # 后台任务 - 批量生成视频预览图 (流式读取)
         background_tasks.add_task(
             sync_generate_thumbnails,
-            local_files=local_files,
+            check_query=check_query,
+            values=values,
         )
 
         logger.success(f"Thumbnail syncing!")
@@ -906,6 +947,132 @@ async def sync_thumbnail(background_tasks: BackgroundTasks, path: str | None='al
         return {"code": 500, "success": False, "msg": "Server error"}
 
 
+## sweep thumbnail
+@router.get("/sweepthumbnail")
+async def sweep_thumbnail(background_tasks: BackgroundTasks):
+    """清理缩略图: 补算缺少的文件指纹, 删除没有被引用的缩略图"""
+    logger.info(f"/api/sweepthumbnail")
+
+    try:
+        # 后台任务 - 清理缩略图
+        background_tasks.add_task(sync_sweep_thumbnails)
+
+        logger.success(f"Thumbnail sweeping!")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": "Thumbnail sweeping!",
+        }
+    except Exception as e:
+        logger.error(f"/api/sweepthumbnail - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## verify
+@router.get("/verify")
+async def verify_start():
+    """全量校验本地文件哈希 (后台任务, 断点续传)"""
+    logger.info(f"/api/verify")
+
+    try:
+        mission_id = await start_verify()
+        logger.success(f"Verify mission started! id: {mission_id}")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": {"mission": mission_id},
+        }
+    except Exception as e:
+        logger.error(f"/api/verify - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## verify status
+@router.get("/verify/status")
+async def verify_status(cursor=Depends(get_db)):
+    """校验任务进度: total/progress/checkpoint/rate(MB/s)/verified/changed/mismatch/missing/errors/bytes"""
+    logger.info(f"/api/verify/status")
+
+    try:
+        mission = await get_verify_status(cursor)
+        logger.debug(f"mission: {mission}")
+        if mission is None:
+            return {"code": 404, "success": False, "msg": "Mission not found"}
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": mission,
+        }
+    except Exception as e:
+        logger.error(f"/api/verify/status - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## phash
+@router.get("/phash")
+async def phash_start():
+    """补算感知哈希 (后台任务, 断点续传)"""
+    logger.info(f"/api/phash")
+
+    try:
+        mission_id = await start_phash()
+        logger.success(f"Phash mission started! id: {mission_id}")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": {"mission": mission_id},
+        }
+    except Exception as e:
+        logger.error(f"/api/phash - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## phash status
+@router.get("/phash/status")
+async def phash_status(cursor=Depends(get_db)):
+    """感知哈希任务进度: total/progress/checkpoint/rate/hashed/blank/missing/errors"""
+    logger.info(f"/api/phash/status")
+
+    try:
+        mission = await get_phash_status(cursor)
+        logger.debug(f"mission: {mission}")
+        if mission is None:
+            return {"code": 404, "success": False, "msg": "Mission not found"}
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": mission,
+        }
+    except Exception as e:
+        logger.error(f"/api/phash/status - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## duplicates
+@router.get("/duplicates")
+async def duplicates(distance: int = PHASH_DISTANCE, page: int = 0, limit: int = APP_PAGE_LIMIT, cursor=Depends(get_db)):
+    """近似重复组 (感知哈希汉明距离 ≤ distance), 按组内总大小降序"""
+    logger.info(f"/api/duplicates - distance: {distance} page: {page} limit: {limit}")
+
+    try:
+        count, clusters = await get_duplicate_clusters(cursor, distance, page, limit)
+        logger.debug(f"count: {count}")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": {"count": count, "clusters": clusters},
+        }
+    except Exception as e:
+        logger.error(f"/api/duplicates - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
 ## clear
 @router.get("/cleardb")
 async def clear_db(pwd: str, cursor=Depends(get_db)):
@@ -925,41 +1092,34 @@ async def clear_db(pwd: str, cursor=Depends(get_db)):
             return {"code": 400, "success": False, "msg": "Password verification failed"}
         
         # 清空数据表
-        if DB_ENGINE == "sqlite": 
-            # 清空表,重置自增主键计数器
-            # dav_local
-            delete_query = "DELETE FROM dav_local"
-            logger.debug(f"delete_query: {delete_query}")
-            await cursor.execute(delete_query)
-            update_query = "UPDATE sqlite_sequence SET seq=0 WHERE name='dav_local'"
-            logger.debug(f"update_query: {update_query}")
-            await cursor.execute(update_query)
-            # dav_missions
-            delete_query = "DELETE FROM dav_missions"
-            logger.debug(f"delete_query: {delete_query}")
-            await cursor.execute(delete_query)
-            update_query = "UPDATE sqlite_sequence SET seq=0 WHERE name='dav_missions'"
-            logger.debug(f"update_query: {update_query}")
-            await cursor.execute(update_query)
-            cursor.connection.commit()
-        else:
-            # dav_local
-            delete_query = "truncate table dav_local"
-            logger.debug(f"delete_query: {delete_query}")
-            await cursor.execute(delete_query)
-            # dav_missions
-            delete_query = "truncate table dav_missions"
-            logger.debug(f"delete_query: {delete_query}")
-            await cursor.execute(delete_query)
-            await cursor.connection.commit()
-        logger.debug(f"TEMP_PATH: {TEMP_PATH}")
-
-        # 删除 TEMP2_PATH
-        if os.path.exists(TEMP2_PATH):
-            shutil.rmtree(TEMP2_PATH)
-        # 备份 TEMP_PATH 到 TEMP2_PATH
-        os.rename(TEMP_PATH, TEMP2_PATH)
-        if not os.path.exists(TEMP_PATH): os.mkdir(TEMP_PATH)
+        async with transaction(cursor):
+            if DB_ENGINE == "sqlite": 
+                # 清空表,重置自增主键计数器
+                # dav_local
+                delete_query = "DELETE FROM dav_local"
+                logger.debug(f"delete_query: {delete_query}")
+                await cursor.execute(delete_query)
+                update_query = "UPDATE sqlite_sequence SET seq=0 WHERE name='dav_local'"
+                logger.debug(f"update_query: {update_query}")
+                await cursor.execute(update_query)
+                # dav_missions
+                delete_query = "DELETE FROM dav_missions"
+                logger.debug(f"delete_query: {delete_query}")
+                await cursor.execute(delete_query)
+                update_query = "UPDATE sqlite_sequence SET seq=0 WHERE name='dav_missions'"
+                logger.debug(f"update_query: {update_query}")
+                await cursor.execute(update_query)
+            else:
+                # dav_local
+                delete_query = "truncate table dav_local"
+                logger.debug(f"delete_query: {delete_query}")
+                await cursor.execute(delete_query)
+                # dav_missions
+                delete_query = "truncate table dav_missions"
+                logger.debug(f"delete_query: {delete_query}")
+                await cursor.execute(delete_query)
+        await invalidate_cache('dav_local', 'dav_missions')
+        # 缩略图按文件指纹命名, 保留在 TEMP_PATH, 重新扫描后直接命中; 不再引用的由 /api/sweepthumbnail 清理
 
         logger.success(f"Database cleanup successful!")
         return {
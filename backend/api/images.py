@@ -0,0 +1,52 @@
+import os
+import asyncio
+
+from fastapi import APIRouter, Request
+from fastapi.responses import Response, FileResponse, RedirectResponse
+
+from utils.images import IMAGE_NAME_RE, blob_file, local_image_url, verify_url, mirror_image, touch_image
+from utils.log import log as logger
+
+
+router = APIRouter()
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+## images
+
+
+## mirror
+@router.get("/images")
+async def image_mirror(url: str, sig: str = ''):
+    """镜像远程图片 (首次访问时下载), 跳转到本地地址; 下载失败跳转回原地址"""
+    logger.info(f"/api/images - url: {url}")
+
+    if not verify_url(url, sig):
+        logger.warning(f"/api/images - invalid sig: {url}")
+        return Response("Forbidden", status_code=403)
+    try:
+        name = await mirror_image(url)
+    except Exception as e:
+        logger.error(f"/api/images - url: {url} - except ERROR: {str(e)}")
+        name = None
+    if name is None:
+        return RedirectResponse(url, status_code=302, headers={"Cache-Control": "no-store"})
+    return RedirectResponse(local_image_url(name), status_code=302, headers={"Cache-Control": "no-cache"})  # 文件可能被淘汰, 跳转不缓存
+
+
+## file
+@router.get("/images/{name}")
+async def image_file(request: Request, name: str):
+    """本地镜像图片, 文件名为内容哈希, 永久缓存"""
+    if not IMAGE_NAME_RE.match(name):
+        return Response("Not found", status_code=404)
+    etag = f'"{name.split(".")[0]}"'
+    path = blob_file(name)
+    if not os.path.exists(path):
+        logger.warning(f"/api/images/{name} - not found")
+        return Response("Not found", status_code=404)
+    await asyncio.to_thread(touch_image, path)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE})
+    return FileResponse(path, headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE})
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends
+
+from utils.db import get_db_read
+from utils.cache import cached_query
+from utils.log import log as logger
+from utils.security import get_current_username
+from utils.local import generate_thumbnails
+from utils.library import LIST_FIELDS, get_count, get_page_after, decorate_files, encode_cursor, decode_cursor
+from config import APP_PAGE_LIMIT
+
+
+router = APIRouter()
+
+LIBRARY_FIELDS = LIST_FIELDS + ('base', 'thumbnail_url')  # base / thumbnail_url 为计算字段
+LIBRARY_MAX_LIMIT = 200
+
+
+## library
+
+
+## list
+@router.get("/library")
+async def library_list(query: str = 'all', fields: str = '', after: str = '', limit: int | None = 0, count: bool = False, username=Depends(get_current_username), cursor=Depends(get_db_read)):
+    """
+    媒体库列表 (JSON), 模式与首页相同: all/all2/all3/repeat/nojapan/score/搜索关键字
+    fields: 逗号分隔的返回字段, 默认全部; 不含 thumbnail_url 时不生成缩略图
+    after: 上一页返回的 next 游标, 为空从头开始
+    count: 是否返回总数
+    """
+    logger.info(f"/api/library - query: {query} fields: {fields} after: {after} limit: {limit}")
+
+    try:
+        selected = [field for field in fields.split(',') if field] or list(LIBRARY_FIELDS)
+        unknown = [field for field in selected if field not in LIBRARY_FIELDS]
+        if unknown:
+            return {"code": 400, "success": False, "msg": f"Unknown fields: {','.join(unknown)}"}
+        if limit < 1: limit = APP_PAGE_LIMIT
+        limit = min(limit, LIBRARY_MAX_LIMIT)
+        try:
+            position = decode_cursor(query, after) if after else None
+        except ValueError:
+            return {"code": 400, "success": False, "msg": "Invalid cursor"}
+
+        # 多取一行判断是否还有下一页 (缓存)
+        local_files = await cached_query('library', ('dav_local', 'dav_web'), (query, after, limit), lambda: get_page_after(cursor, query, position, limit + 1))
+        next_cursor = encode_cursor(query, local_files[limit - 1]) if len(local_files) > limit else ''
+        local_files = decorate_files([dict(local_file) for local_file in local_files[:limit]])
+        if 'thumbnail_url' in selected:
+            await generate_thumbnails(local_files, True) # isShow=True
+
+        data = {
+            "videos": [{field: local_file.get(field) for field in selected} for local_file in local_files],
+            "next": next_cursor,
+            "limit": limit,
+        }
+        if count:
+            data['count'] = await cached_query('count', ('dav_local', 'dav_web'), (query,), lambda: get_count(cursor, query))
+
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": data,
+        }
+    except Exception as e:
+        logger.error(f"/api/library - query: {query} after: {after} - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
@@ -9,8 +9,12 @@ from fastapi import APIRouter, Depends, Request, BackgroundTasks
 from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
 from pydantic import BaseModel
 
-from utils.db import get_db, format_query_for_db, convert_row_to_dict, format_datetime_fields
+from utils.db import get_db, transaction, format_query_for_db, convert_row_to_dict, format_datetime_fields
+from utils.cache import invalidate_cache
 from utils.log import log as logger
+from utils.tags import save_web_tags
+from utils.prefetch import start_prefetch, get_prefetch_status
+from utils.images import image_links, warm_images
 from utils.local import *
 from utils.web import *
 from config import *
@@ -38,9 +42,9 @@ async def get_net_video(code_name: str, cursor=Depends(get_db)):
         code_info = await cursor.fetchone()
         if code_info is None:
             if code_name.upper().startswith('FC2-'):
-                code_info = get_123av_title(code_name)
+                code_info = await get_123av_title(code_name)
             else:
-                code_info = get_javbus_title(code_name)
+                code_info = await get_javbus_title(code_name)
             logger.debug(f"code_info: {code_info}")
             if code_info is None:
                 return {
@@ -53,11 +57,16 @@ async def get_net_video(code_name: str, cursor=Depends(get_db)):
             values = (code_info['code'], code_info['name'], code_info['date'], code_info['studio'], code_info['director'], code_info['series'], json.dumps(code_info['genre'], ensure_ascii=False),  json.dumps(code_info['websites']), json.dumps(code_info['actors'], ensure_ascii=False), json.dumps(code_info['images'], ensure_ascii=False), 1, code_info['code'],)
             insert_query = format_query_for_db(insert_query)
             logger.debug(f"insert_query: {insert_query} values: {values}")
-            await cursor.execute(insert_query, values)
-            if DB_ENGINE == "sqlite": cursor.connection.commit()
-            else: await cursor.connection.commit()
+            async with transaction(cursor):
+                await cursor.execute(insert_query, values)
+                await save_web_tags(cursor, code_info)
+            await invalidate_cache('dav_web')
+            warm_images(code_info['images'])  # 后台镜像图片
         # logger.debug(f"code_info: {code_info}")
         code_info = convert_row_to_dict(code_info, cursor.description)  # 转换字典
+        # 本地镜像图片地址
+        images = json.loads(code_info['images']) if isinstance(code_info.get('images'), str) and code_info['images'] else code_info.get('images') or []
+        code_info['images_local'] = await image_links(images)
         logger.debug(f"code_info: {code_info}")
 
         # # base58 加密
@@ -77,3 +86,45 @@ async def get_net_video(code_name: str, cursor=Depends(get_db)):
         logger.error(f"/api/get_name - code_name: {code_name} - except ERROR: {str(e)}")
         return {"code": 500, "success": False, "msg": "Server error"}
 
+
+
+## prefetch
+@router.get("/prefetch")
+async def prefetch_start():
+    """批量预取 dav_web 中缺少的识别码信息 (后台任务, 断点续传)"""
+    logger.info(f"/api/prefetch")
+
+    try:
+        mission_id = await start_prefetch()
+        logger.success(f"Prefetch mission started! id: {mission_id}")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": {"mission": mission_id},
+        }
+    except Exception as e:
+        logger.error(f"/api/prefetch - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## prefetch status
+@router.get("/prefetch/status")
+async def prefetch_status(cursor=Depends(get_db)):
+    """预取任务进度: total/progress/checkpoint/rate/found/missed/errors"""
+    logger.info(f"/api/prefetch/status")
+
+    try:
+        mission = await get_prefetch_status(cursor)
+        logger.debug(f"mission: {mission}")
+        if mission is None:
+            return {"code": 404, "success": False, "msg": "Mission not found"}
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": mission,
+        }
+    except Exception as e:
+        logger.error(f"/api/prefetch/status - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
@@ -7,6 +7,10 @@ from api.frontend import router as frontend_router
 from api.net import router as net_router
 from api.file import router as file_router
 from api.stream import router as stream_router
+from api.tags import router as tags_router
+from api.cache import router as cache_router
+from api.images import router as images_router
+from api.library import router as library_router
 
 root_router = APIRouter()
 root_router.include_router(frontend_router, prefix="", tags=["frontend"])
@@ -15,3 +19,7 @@ api_router = APIRouter(prefix="/api")
 api_router.include_router(net_router, prefix="", tags=["net"])
 api_router.include_router(file_router, prefix="", tags=["file"])
 api_router.include_router(stream_router, prefix="", tags=["stream"])
+api_router.include_router(tags_router, prefix="", tags=["tags"])
+api_router.include_router(cache_router, prefix="", tags=["cache"])
+api_router.include_router(images_router, prefix="", tags=["images"])
+api_router.include_router(library_router, prefix="", tags=["library"])
@@ -19,6 +19,7 @@ from pydantic import BaseModel
 
 from utils.db import get_db, format_query_for_db, convert_row_to_dict, format_datetime_fields
 from utils.log import log as logger
+from utils.workers import register_pid, unregister_pid, kill_registered
 from utils.local import *
 from config import *
 
@@ -29,7 +30,36 @@ router = APIRouter()
 ## play
 
 
-global_processes=[]
+STREAM_PID_GROUP = "streams"  # 实时转码进程号登记在 RUN_PATH/streams, 多 worker 共享
+
+def kill_stream_processes() -> None:
+    """关闭未结束的实时转码进程 (包括其他 worker 启动的)"""
+    for pid in kill_registered(STREAM_PID_GROUP, 'ffmpeg'):
+        logger.info(f"kill process: {pid}")
+
+async def start_stream_process(command: list):
+    """启动实时转码进程并登记进程号"""
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    register_pid(STREAM_PID_GROUP, process.pid)
+    return process
+
+async def stream_process_output(process):
+    """读取转码输出; 结束 (含客户端断开) 时关闭进程并注销"""
+    try:
+        while True:
+            data = await asyncio.wait_for(process.stdout.read(1024*1024), timeout=10)
+            if not data:
+                break
+            yield data
+    except asyncio.TimeoutError:
+        logger.error("FFmpeg process timed out")
+        yield b""
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGKILL)
+        unregister_pid(STREAM_PID_GROUP, process.pid)
 
 # stream 206
 @router.get("/stream/{id_name}/{base_name}")
@@ -105,7 +135,6 @@ async def convert_video(request: Request, id_name: str, base_name: str):
     """请求转码后的视频流 206"""
     logger.info(f"/api/convert/{id_name}/{base_name[:20]} - id_name: {id_name}")
 
-    global global_process
     try:
         # base58 解密
         # logger.debug(f"base_name: {base_name}")
@@ -124,11 +153,7 @@ async def convert_video(request: Request, id_name: str, base_name: str):
             return HTMLResponse("Video not found for streaming", status_code=404)
 
         # 关闭未结束的进程
-        for process_one in global_processes:
-            if process_one.returncode is None:
-                process_one.send_signal(signal.SIGKILL)
-                logger.info(f"kill process: {process_one.pid}")
-            global_processes.remove(process_one)
+        kill_stream_processes()
 
         start_time=0
         ## 使用 FFmpeg 进行实时转码
@@ -148,24 +173,8 @@ async def convert_video(request: Request, id_name: str, base_name: str):
             '-'
         ]
         # process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        process = await asyncio.create_subprocess_exec(
-            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-        )
-        global_processes.append(process)
-
-        async def generate():
-            try:
-                while True:
-                    data = await asyncio.wait_for(process.stdout.read(1024*1024), timeout=10)
-                    if not data:
-                        break
-                    yield data
-            except asyncio.TimeoutError:
-                logger.error("FFmpeg process timed out")
-                process.send_signal(signal.SIGKILL)
-                yield b""
-
-        return StreamingResponse(generate(), media_type='video/mp4')
+        process = await start_stream_process(command)
+        return StreamingResponse(stream_process_output(process), media_type='video/mp4')
     except Exception as e:
         logger.error(f"/api/convert/{id_name}/{base_name[:20]} - except ERROR: {str(e)}")
         return HTMLResponse("Server error", status_code=500)
@@ -177,7 +186,6 @@ async def stream_and_convert_video(request: Request, id_name: str, base_name: st
     """请求转码后的视频流 206"""
     logger.info(f"/api/stream/convert/{id_name}/{base_name[:20]} - id_name: {id_name}")
 
-    global global_process
     try:
         # base58 解密
         # logger.debug(f"base_name: {base_name}")
@@ -196,11 +204,7 @@ async def stream_and_convert_video(request: Request, id_name: str, base_name: st
             return HTMLResponse("Video not found for streaming", status_code=404)
 
         # 关闭未结束的进程
-        for process_one in global_processes:
-            if process_one.returncode is None:
-                process_one.send_signal(signal.SIGKILL)
-                logger.info(f"kill process: {process_one}")
-            global_processes.remove(process_one)
+        kill_stream_processes()
         
         # 后缀检测
         file_ext = os.path.splitext(path)[1]
@@ -223,24 +227,8 @@ async def stream_and_convert_video(request: Request, id_name: str, base_name: st
                 '-'
             ]
             # process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            process = await asyncio.create_subprocess_exec(
-                *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            global_processes.append(process)
-
-            async def generate():
-                try:
-                    while True:
-                        data = await asyncio.wait_for(process.stdout.read(1024*1024), timeout=10)
-                        if not data:
-                            break
-                        yield data
-                except asyncio.TimeoutError:
-                    logger.error("FFmpeg process timed out")
-                    process.send_signal(signal.SIGKILL)
-                    yield b""
-
-            return StreamingResponse(generate(), media_type='video/mp4')
+            process = await start_stream_process(command)
+            return StreamingResponse(stream_process_output(process), media_type='video/mp4')
         else: # 直接返回文件流
             mime_type, _ = mimetypes.guess_type(video_path)
             mime_type = mime_type or 'application/octet-stream'
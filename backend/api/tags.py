@@ -0,0 +1,133 @@
+from fastapi import APIRouter, Depends
+
+from utils.db import get_db_read, format_query_for_db, convert_row_to_dict, fetchall_dict
+from utils.log import log as logger
+from utils.tags import TAG_TABLES
+from config import APP_PAGE_LIMIT
+
+
+router = APIRouter()
+
+
+## tags
+
+
+## list
+@router.get("/tags/{kind}")
+async def tag_list(kind: str, page: int | None = 1, limit: int | None = 0, cursor=Depends(get_db_read)):
+    """演员/类别/发行商列表"""
+    logger.info(f"/api/tags/{kind} - page: {page}")
+
+    try:
+        if kind not in TAG_TABLES:
+            return {"code": 404, "success": False, "msg": "Unknown tag kind"}
+        table, link_table, field = TAG_TABLES[kind]
+        if page < 1: page = 1
+        if limit < 1: limit = APP_PAGE_LIMIT
+
+        ## 数量
+        check_query = f"SELECT count(*) as len FROM {table}"
+        await cursor.execute(check_query)
+        len_tags = await cursor.fetchone()
+        len_tags = convert_row_to_dict(len_tags, cursor.description)  # 转换字典
+        count = len_tags['len']
+
+        ## 列表 - 按名称唯一索引分页, 只对本页的实体按 ({field}, code) 索引计数
+        check_query = f"""SELECT t.id, t.name, (SELECT count(*) FROM {link_table} lt WHERE lt.{field} = t.id) as count
+                        FROM (
+                            SELECT id, name
+                            FROM {table}
+                            ORDER BY name ASC
+                            LIMIT %s,%s
+                        ) t
+                        ORDER BY t.name ASC
+                        """
+        values = (limit * (page - 1), limit,)
+        check_query = format_query_for_db(check_query)
+        logger.debug(f"check_query: {check_query} values: {values}")
+        await cursor.execute(check_query, values)
+        tags = await fetchall_dict(cursor)
+
+        logger.success(f"Get tags successful! kind: {kind} page: {page}")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": {
+                "list": tags,
+                "count": count,
+                "page": page,
+                "limit": limit,
+            },
+        }
+    except Exception as e:
+        logger.error(f"/api/tags/{kind} - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
+
+
+## videos
+@router.get("/tags/{kind}/{tag_id}")
+async def tag_videos(kind: str, tag_id: int, page: int | None = 1, limit: int | None = 0, cursor=Depends(get_db_read)):
+    """演员/类别/发行商下的视频列表"""
+    logger.info(f"/api/tags/{kind}/{tag_id} - page: {page}")
+
+    try:
+        if kind not in TAG_TABLES:
+            return {"code": 404, "success": False, "msg": "Unknown tag kind"}
+        table, link_table, field = TAG_TABLES[kind]
+        if page < 1: page = 1
+        if limit < 1: limit = APP_PAGE_LIMIT
+
+        ## 实体
+        check_query = f"SELECT id,name FROM {table} WHERE id=%s"
+        values = (tag_id,)
+        check_query = format_query_for_db(check_query)
+        await cursor.execute(check_query, values)
+        tag_info = await cursor.fetchone()
+        if tag_info is None:
+            return {"code": 404, "success": False, "msg": "Tag not found"}
+        tag_info = convert_row_to_dict(tag_info, cursor.description)  # 转换字典
+
+        ## 数量
+        check_query = f"""SELECT count(*) as len
+                        FROM {link_table} lt
+                        INNER JOIN dav_local dl ON dl.code = lt.code
+                        WHERE lt.{field}=%s AND dl.status=0
+                        """
+        check_query = format_query_for_db(check_query)
+        await cursor.execute(check_query, values)
+        len_files = await cursor.fetchone()
+        len_files = convert_row_to_dict(len_files, cursor.description)  # 转换字典
+        count = len_files['len']
+
+        ## 列表
+        check_query = f"""SELECT dl.id,dl.code,dl.path,dl.file,dl.size,dl.duration,dl.aspectratio,dl.resolution,dl.created, COALESCE(dw.score, 0) as score
+                        FROM {link_table} lt
+                        INNER JOIN dav_local dl ON dl.code = lt.code
+                        LEFT JOIN dav_web dw ON dw.code = lt.code
+                        WHERE lt.{field}=%s AND dl.status=0
+                        ORDER BY dl.code ASC
+                        LIMIT %s,%s
+                        """
+        values = (tag_id, limit * (page - 1), limit,)
+        check_query = format_query_for_db(check_query)
+        logger.debug(f"check_query: {check_query} values: {values}")
+        await cursor.execute(check_query, values)
+        converted_list = await fetchall_dict(cursor)  # 转换字典列表, DATETIME转字符串
+
+        logger.success(f"Get tag videos successful! kind: {kind} id: {tag_id} page: {page}")
+        return {
+            "code": 200,
+            "success": True,
+            "msg": "Success",
+            "data": {
+                "tag": tag_info,
+                "list": converted_list,
+                "count": count,
+                "page": page,
+                "limit": limit,
+            },
+        }
+    except Exception as e:
+        logger.error(f"/api/tags/{kind}/{tag_id} - except ERROR: {str(e)}")
+        return {"code": 500, "success": False, "msg": "Server error"}
@@ -13,10 +13,11 @@ from datetime import datetime as dt
 from pathlib import Path
 
 from utils.local import sync_file_cut, sync_file_transcode, check_ffmpeg_processes
-from utils.local import get_file_size, get_file_createtime
+from utils.local import get_file_size, get_file_createtime, release_thumbnail
+from utils.fingerprint import file_fingerprint
 from utils.log import log as logger
-from utils.db import get_db_app, format_query_for_db, convert_row_to_dict, format_datetime_fields
-from config import DB_ENGINE
+from utils.db import get_db_app, transaction, format_query_for_db, convert_row_to_dict, format_datetime_fields
+from utils.cache import invalidate_cache
 
 ## app
 
@@ -27,8 +28,10 @@ from config import DB_ENGINE
 """
 
 async def fetch_next_mission(cursor):
-    query = "SELECT * FROM dav_missions WHERE status<2 limit 1"
-    values = ()
+    # 只处理剪切/转码任务, 预取等任务由 Web 进程执行
+    query = "SELECT * FROM dav_missions WHERE status<2 and type in (%s, %s) limit 1"
+    query = format_query_for_db(query)
+    values = (1, 2,)
     await cursor.execute(query, values)
     mission_info = await cursor.fetchone()
     # logger.debug(f"mission_info: {mission_info}")
@@ -41,9 +44,8 @@ async def update_mission_status(cursor, mission_id, status):
     values = (status, mission_id,)
     update_query = format_query_for_db(update_query)
     logger.debug(f"update_query: {update_query} values: {values}")
-    await cursor.execute(update_query, values)
-    if DB_ENGINE == "sqlite": cursor.connection.commit()
-    else: await cursor.connection.commit()
+    async with transaction(cursor):
+        await cursor.execute(update_query, values)
 
 async def update_local_file(cursor, local_id, local_file):
     # 获取文件大小 MB
@@ -58,14 +60,24 @@ async def update_local_file(cursor, local_id, local_file):
     logger.debug(f"file: {local_file} / size: {file_size} MB / create_time: {file_createtime}")
     # 获取文件名
     file_name = local_file.split('/')[-1]
+    # 内容已变化, 重新计算指纹 (缩略图按指纹重新生成)
+    file_crc = file_fingerprint(local_file)
+    check_query = format_query_for_db("SELECT crc FROM dav_local WHERE id=%s")
+    values = (local_id,)
+    logger.debug(f"check_query: {check_query} values: {values}")
+    await cursor.execute(check_query, values)
+    old_file = convert_row_to_dict(await cursor.fetchone(), cursor.description)
 
-    update_query = "UPDATE dav_local SET file=%s,size=%s,created=%s,updated_time=NOW() WHERE id=%s"
-    values = (file_name, file_size, file_createtime, local_id,)
+    update_query = "UPDATE dav_local SET file=%s,size=%s,created=%s,crc=%s,updated_time=NOW() WHERE id=%s"
+    values = (file_name, file_size, file_createtime, file_crc, local_id,)
     update_query = format_query_for_db(update_query)
     logger.debug(f"update_query: {update_query} values: {values}")
-    await cursor.execute(update_query, values)
-    if DB_ENGINE == "sqlite": cursor.connection.commit()
-    else: await cursor.connection.commit()
+    async with transaction(cursor):
+        await cursor.execute(update_query, values)
+    await invalidate_cache('dav_local')
+    # 旧指纹的缩略图 (重复文件仍在使用时保留)
+    if old_file and old_file['crc'] != file_crc:
+        await release_thumbnail(cursor, old_file['crc'], local_id)
 
 async def process_mission(cursor, mission_info):
     type = mission_info['type']
@@ -79,6 +91,8 @@ async def process_mission(cursor, mission_info):
         start_second = mission_info['start']
         end_second = mission_info['end']
         sync_file_cut(int(start_second), int(end_second), frompath, topath, id_name)
+        if os.path.exists(frompath):
+            await update_local_file(cursor, id_name, frompath)
     elif type == 2:
         topath = to_name + '-transcode.mp4'  # topath = to_name + '-transcode' + to_extend
         sync_file_transcode(frompath, topath, id_name)
@@ -0,0 +1,64 @@
+# -*- coding: UTF8 -*-
+"""
+缓存值序列化对比: 旧方式 (json.dumps / is_json 试探解析 + json.loads) 与 dumps_value/loads_value
+
+数据为一页列表 (与 read_root 分页结果字段相同), 不需要 Redis
+用法:
+    PYTHONPATH=backend python backend/benchmarks/cache_serialization.py --items 60 --repeat 2000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.redis.serialization_tools import dumps_value, loads_value, is_json, msgpack
+
+
+def build_page(items: int) -> list:
+    return [{
+        "id": i,
+        "code": f"ABC-{i:05d}",
+        "path": "/nfs/hd01/movies",
+        "file": f"ABC-{i:05d} title.mp4",
+        "size": 4312.25 + i,
+        "duration": 7200.5,
+        "aspectratio": 0.5625,
+        "resolution": "1080p",
+        "created": "2024-01-01 00:00:00",
+        "score": i % 5,
+    } for i in range(items)]
+
+def legacy_dumps(value):
+    return json.dumps(value).encode("utf-8")
+
+def legacy_loads(data):
+    data = data.decode("utf-8")  # decode_responses=True
+    return json.loads(data) if is_json(data) else data
+
+def measure(name: str, dumps, loads, value, repeat: int) -> None:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        data = dumps(value)
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        loads(data)
+    decode = time.perf_counter() - start
+    print(f"  {name:<10} size: {len(data):6d} B  encode: {encode / repeat * 1e6:8.1f} us  decode: {decode / repeat * 1e6:8.1f} us")
+
+def main(items: int, repeat: int) -> None:
+    page = build_page(items)
+    print(f"items: {items} / repeat: {repeat} / msgpack: {'yes' if msgpack else 'no (JSON fallback)'}")
+    measure("legacy", legacy_dumps, legacy_loads, page, repeat)
+    measure("envelope", dumps_value, loads_value, page, repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+    main(args.items, args.repeat)
@@ -0,0 +1,116 @@
+# -*- coding: UTF8 -*-
+"""
+read_root 各模式查询计划与耗时 (迁移前 / 迁移后)
+
+在临时 SQLite 库中生成模拟数据, 对 read_root 每个模式的计数/列表查询
+以及扫盘、任务轮询、搜索记录等热点查询输出 EXPLAIN QUERY PLAN 与耗时,
+然后执行 utils/migrate.py 中的迁移再测一遍
+
+用法 (在 .env 所在目录执行):
+    PYTHONPATH=backend python backend/benchmarks/read_root_plans.py --rows 50000
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+import aiosqlite
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import SQLiteDatabase, format_query_for_db
+from utils.migrate import run_migrations
+
+
+FIELDS = "dl.id,dl.code,dl.path,dl.file,dl.size,dl.duration,dl.aspectratio,dl.resolution,dl.created, COALESCE(dw.score, 0) as score"
+KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをんアイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲン"
+
+# (名称, 查询, 参数)
+QUERIES = [
+    ("all count", "SELECT count(*) as len FROM dav_local WHERE status=0 and id>0", ()),
+    ("all list", f"SELECT {FIELDS} FROM dav_local dl LEFT JOIN dav_web dw ON dl.code = dw.code WHERE dl.status=0 and dl.id>0 ORDER BY dl.code ASC LIMIT %s,%s", (120, 12,)),
+    ("all2 list", f"SELECT {FIELDS} FROM dav_local dl LEFT JOIN dav_web dw ON dl.code = dw.code WHERE dl.status=0 and dl.id>0 ORDER BY dl.created ASC LIMIT %s,%s", (120, 12,)),
+    ("all3 list", f"SELECT {FIELDS} FROM dav_local dl LEFT JOIN dav_web dw ON dl.code = dw.code WHERE dl.status=0 and dl.id>0 ORDER BY dl.id ASC LIMIT %s,%s", (120, 12,)),
+    ("repeat count", "SELECT count(*) as len FROM dav_local dl INNER JOIN (SELECT code FROM dav_local WHERE status = 0 GROUP BY code HAVING COUNT(*) > 1) dup ON dl.code = dup.code WHERE dl.status = 0", ()),
+    ("repeat list", f"SELECT {FIELDS} FROM dav_local dl LEFT JOIN dav_web dw ON dl.code = dw.code INNER JOIN (SELECT code FROM dav_local WHERE status = 0 GROUP BY code HAVING COUNT(*) > 1) dup ON dl.code = dup.code WHERE dl.status = 0 ORDER BY dl.code ASC, dl.file ASC LIMIT %s,%s", (0, 12,)),
+    ("nojapan list", f"SELECT {FIELDS} FROM dav_local dl LEFT JOIN dav_web dw ON dl.code = dw.code WHERE dl.status=0 AND dl.file NOT GLOB '*[{KANA}]*' ORDER BY dl.file ASC LIMIT %s,%s", (0, 12,)),
+    ("score count", "SELECT count(dl.file) as len FROM dav_web dw INNER JOIN dav_local dl ON dw.code = dl.code WHERE dl.status=0 AND dw.score > 0", ()),
+    ("score list", f"SELECT {FIELDS} FROM dav_web dw INNER JOIN dav_local dl ON dw.code = dl.code WHERE dl.status=0 AND dw.score > 0 ORDER BY dl.file ASC LIMIT %s,%s", (0, 12,)),
+    ("search list", f"SELECT {FIELDS} FROM dav_local dl LEFT JOIN dav_web dw ON dl.code = dw.code WHERE dl.status=0 and INSTR(UPPER(dl.file), UPPER(%s))>0 ORDER BY dl.code ASC LIMIT %s,%s", ("ABC", 0, 12,)),
+    ("search keys", "SELECT `key` FROM dav_search WHERE parid!=0 and status=0 order by `parid`,`key` asc", ()),
+    ("search record", "SELECT id FROM dav_search WHERE `key`=%s and parid!=0 and status=0", ("key100",)),
+    ("scan exist", "SELECT id FROM dav_local WHERE path=%s and file=%s and status=0", ("/nfs/hd03", "ABC-00100 title.mp4",)),
+    ("web by code", "SELECT score FROM dav_web WHERE `code`=%s and status=0", ("ABC-00100",)),
+    ("mission poll", "SELECT * FROM dav_missions WHERE status<2 limit 1", ()),
+]
+
+
+async def populate(conn, rows: int) -> None:
+    """生成模拟数据"""
+    random.seed(42)
+    prefixes = ["ABC", "DEF", "GHI", "JKL", "MNO", "PQR"]
+    local_rows = []
+    for i in range(rows):
+        code = f"{random.choice(prefixes)}-{random.randint(1, rows // 2):05d}"
+        title = "タイトル" if i % 5 == 0 else "title"
+        local_rows.append((code, f"{code} {title}", f"/nfs/hd{i % 8:02d}", f"{code} {title}.mp4", random.uniform(100, 8000), f"2024-01-{1 + i % 28:02d} 00:00:00", random.uniform(600, 7200), 0.5625, "1080p", "", 30.0, 1 if i % 50 == 0 else 0,))
+    await conn.executemany("INSERT INTO dav_local (code, name, path, file, size, created, duration, aspectratio, resolution, format, fps, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", local_rows)
+    web_rows = [(code, code, random.randint(-2, 10) if random.random() < 0.3 else 0, 1,) for code in {row[0] for row in local_rows[::2]}]
+    await conn.executemany("INSERT INTO dav_web (code, name, score, status) VALUES (?, ?, ?, ?)", web_rows)
+    await conn.executemany("INSERT INTO dav_search (parid, `key`, type, count) VALUES (?, ?, ?, ?)", [(i % 3, f"key{i}", 1, 1,) for i in range(500)])
+    await conn.executemany("INSERT INTO dav_missions (localid, path, file, type, status) VALUES (?, ?, ?, ?, ?)", [(i, "/nfs", f"{i}.mp4", 1, 2,) for i in range(2000)])
+    await conn.commit()
+
+async def measure(cursor, repeat: int) -> dict:
+    """输出查询计划, 返回各查询耗时中位数 (ms)"""
+    results = {}
+    for name, query, values in QUERIES:
+        query = format_query_for_db(query)
+        await cursor.execute(f"EXPLAIN QUERY PLAN {query}", values)
+        plan = [row[3] for row in await cursor.fetchall()]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await cursor.execute(query, values)
+            await cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+        print(f"  {name:<14} {results[name]:8.2f} ms | {' / '.join(plan)}")
+    return results
+
+async def main(rows: int, repeat: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "read_root_bench.sqlite")
+    database = SQLiteDatabase(f"sqlite://{path}")
+    conn = await aiosqlite.connect(path)
+    try:
+        await database.create_tables(conn)
+        await conn.commit()
+        await populate(conn, rows)
+        cursor = await conn.cursor()
+
+        print(f"rows: {rows} / repeat: {repeat} / db: {path}")
+        print("before:")
+        before = await measure(cursor, repeat)
+        applied = await run_migrations(cursor)
+        print(f"migrations applied: {applied}")
+        print("after:")
+        after = await measure(cursor, repeat)
+
+        print("speedup:")
+        for name, _, _ in QUERIES:
+            ratio = before[name] / after[name] if after[name] else 0
+            print(f"  {name:<14} {before[name]:8.2f} -> {after[name]:8.2f} ms  x{ratio:.1f}")
+    finally:
+        await conn.close()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,78 @@
+# -*- coding: UTF8 -*-
+"""
+Redis 每次新建连接 / 共享连接池 吞吐对比 (ops/sec)
+
+ - per-call: 每次操作新建客户端 + PING + 关闭 (原 get_redis 的行为)
+ - pooled  : 复用 init_redis 创建的共享客户端
+
+需要本地 redis-server (按 .env 中的 REDIS_* 配置连接)
+用法 (在 .env 所在目录执行):
+    PYTHONPATH=backend python backend/benchmarks/redis_pool.py --ops 5000 --concurrency 50
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.redis.init import RedisMixin, init_redis, close_redis
+
+KEY_PREFIX = "bench:pool:"
+
+
+async def per_call_op(i: int) -> None:
+    """每次操作新建连接"""
+    cache = await RedisMixin().connect_redis
+    try:
+        await cache.set(f"{KEY_PREFIX}{i % 100}", i)
+        await cache.get(f"{KEY_PREFIX}{i % 100}")
+    finally:
+        await cache.aclose()
+
+async def pooled_op(cache, i: int) -> None:
+    """复用共享连接池"""
+    await cache.set(f"{KEY_PREFIX}{i % 100}", i)
+    await cache.get(f"{KEY_PREFIX}{i % 100}")
+
+async def run(name: str, op, ops: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(i: int):
+        async with semaphore:
+            await op(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(ops)))
+    elapsed = time.perf_counter() - start
+    rate = ops / elapsed
+    print(f"  {name:<9} {ops} ops in {elapsed:6.2f}s  {rate:10.0f} ops/sec")
+    return rate
+
+async def main(ops: int, concurrency: int) -> None:
+    cache = await init_redis()
+    try:
+        await cache.ping()
+    except Exception as e:
+        print(f"Redis unavailable: {e}")
+        await close_redis()
+        return
+    print(f"ops: {ops} / concurrency: {concurrency} (each op = SET + GET)")
+    try:
+        before = await run("per-call", per_call_op, ops, concurrency)
+        after = await run("pooled", lambda i: pooled_op(cache, i), ops, concurrency)
+        print(f"  speedup   x{after / before:.1f}")
+        keys = [key async for key in cache.scan_iter(match=f"{KEY_PREFIX}*")]
+        if keys:
+            await cache.delete(*keys)
+    finally:
+        await close_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ops', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.ops, args.concurrency))
@@ -0,0 +1,108 @@
+# -*- coding: UTF8 -*-
+"""
+刮削页面解析: 旧实现 (每字段 re.findall 扫描整页) 与 utils/extractors.py 对比
+
+ - fixtures/{站点}_{识别码}.html 为保存的页面, fixtures/{同名}.json 为期望的解析结果 (null 为不存在)
+ - 先校验新解析器结果与期望一致, 再输出每秒页面数
+用法:
+    PYTHONPATH=backend python backend/benchmarks/scrape_extract.py --repeat 500
+    PYTHONPATH=backend python backend/benchmarks/scrape_extract.py --update   # 用旧实现重新生成期望结果
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from utils.extractors import SITE_EXTRACTORS, extract_code_info
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_parse(site: str, code_name: str, code_url: str, response: str):
+    """旧实现: 每个字段一次 re.findall 扫描整页"""
+    extractor = SITE_EXTRACTORS[site]
+    host = "www.javbus.com" if site == "javbus" else "www.123av.com"
+    if response.find('Page Not Found') > 0:
+        return None
+    titles = re.findall('<h3>(.+)</h3>' if site == "javbus" else '<h1>(.+)</h1>', response)
+    if len(titles) == 0:
+        return None
+    code_title = extractor.clean_title(titles[0])
+    if code_title.lower().find(code_name.lower()) == -1:
+        return None
+    date = re.findall('發行日期:</span>(.+)</p>' if site == "javbus" else 'リリース日:</span>(.+)</p>', response)
+    studio = re.findall(rf'<a href="https://{host}/studio/\w+">(.*?)</a>', response)
+    director = re.findall(rf'<a href="https://{host}/director/\w+">(.*?)</a>', response)
+    series = re.findall(rf'<a href="https://{host}/series/\w+">(.*?)</a>', response)
+    genre = re.findall(rf'<a href="https://{host}/genre/\w+">(.*?)</a></label></span>', response)
+    actors = re.findall(rf'<a href="https://{host}/star/\w+">([^<]+)</a>', response)
+    images = re.findall(r'<a class="sample-box" href="([^"]+)">', response)
+    prefix = extractor.baseurl.rstrip('/')
+    images = [image if image.startswith(('https://', 'http://')) else f"{prefix}{image}" for image in images]
+    return {
+        "code": code_name,
+        "name": code_title,
+        "date": date[0].strip() if len(date) > 0 else '',
+        "studio": studio[0].strip() if len(studio) > 0 else '',
+        "director": director[0].strip() if len(director) > 0 else '',
+        "series": series[0].strip() if len(series) > 0 else '',
+        "genre": genre,
+        "websites": [code_url],
+        "actors": actors,
+        "images": images,
+        "score": 0,
+    }
+
+def load_fixtures() -> list:
+    fixtures = []
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith(".html"):
+            continue
+        site, code_name = name[:-5].split("_", 1)
+        code_name = code_name.upper() if code_name.find('-') > 0 else code_name.lower()
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            html = f.read()
+        fixtures.append((name[:-5], site, code_name, SITE_EXTRACTORS[site].baseurl + code_name, html))
+    return fixtures
+
+def main(repeat: int, update: bool) -> int:
+    logger.remove()  # 不输出解析日志
+    fixtures = load_fixtures()
+    failed = 0
+    for name, site, code_name, code_url, html in fixtures:
+        expected_path = os.path.join(FIXTURES, f"{name}.json")
+        if update:
+            with open(expected_path, "w", encoding="utf-8") as f:
+                json.dump(legacy_parse(site, code_name, code_url, html), f, ensure_ascii=False, indent=2)
+        with open(expected_path, encoding="utf-8") as f:
+            expected = json.load(f)
+        result = extract_code_info(SITE_EXTRACTORS[site], code_name, code_url, html)
+        status = "ok" if result == expected else "MISMATCH"
+        failed += status != "ok"
+        print(f"  {name:<28} {len(html) // 1024:4d} KB  {status}")
+
+    print(f"pages: {len(fixtures)} / repeat: {repeat}")
+    for label, parse in (
+        ("legacy", lambda site, code_name, code_url, html: legacy_parse(site, code_name, code_url, html)),
+        ("extractor", lambda site, code_name, code_url, html: extract_code_info(SITE_EXTRACTORS[site], code_name, code_url, html)),
+    ):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _, site, code_name, code_url, html in fixtures:
+                parse(site, code_name, code_url, html)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<10} {repeat * len(fixtures) / elapsed:10.0f} pages/sec")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--update', action='store_true')
+    args = parser.parse_args()
+    sys.exit(1 if main(args.repeat, args.update) else 0)
@@ -0,0 +1,119 @@
+# -*- coding: UTF8 -*-
+"""
+首页吞吐量与 worker 数 (UVICORN_WORKERS)
+
+在临时 SQLite 库中生成模拟数据, 依次以 --workers 中的每个进程数启动 backend/main.py,
+用 --concurrency 个并发连接持续请求首页 (/?query=all, 随机页码) --duration 秒,
+输出 RPS 与延迟分位数; 服务端多核时 RPS 应随 worker 数近似线性增长
+
+用法 (在 .env 所在目录执行):
+    PYTHONPATH=backend python backend/benchmarks/workers_load.py --workers 1,2,4 --rows 20000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+import aiosqlite
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import SQLiteDatabase
+from benchmarks.read_root_plans import populate
+from config import BASIC_USERNAME, BASIC_PASSWORD
+
+
+async def create_database(path: str, rows: int) -> None:
+    database = SQLiteDatabase(f"sqlite://{path}")
+    conn = await aiosqlite.connect(path)
+    try:
+        await database.create_tables(conn)
+        await conn.commit()
+        await populate(conn, rows)
+    finally:
+        await conn.close()
+
+def start_server(workers: int, port: int, db_path: str, run_path: str, cache: bool) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        UVICORN_HOST='127.0.0.1', UVICORN_PORT=str(port), UVICORN_WORKERS=str(workers),
+        DB_ENGINE='sqlite', SQLITE_URL=f"sqlite://{db_path}", RUN_PATH=run_path,
+        CACHE_ENABLE=str(cache), WATCH_ENABLE='False', SCAN_CODE='False',
+    )
+    main_py = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+    return subprocess.Popen([sys.executable, main_py, '--log', 'error'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/?query=all")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("server not ready")
+
+async def load(client: httpx.AsyncClient, concurrency: int, duration: float, pages: int) -> tuple:
+    """return (请求数, 失败数, 延迟列表 ms)"""
+    latencies = []
+    failed = 0
+    deadline = time.monotonic() + duration
+
+    async def user():
+        nonlocal failed
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get("/", params={"query": "all", "page": random.randint(1, pages)})
+                if response.status_code != 200:
+                    failed += 1
+            except httpx.HTTPError:
+                failed += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return len(latencies), failed, latencies
+
+async def main(workers_list: list, rows: int, concurrency: int, duration: float, port: int, cache: bool) -> None:
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "workers_bench.sqlite")
+    await create_database(db_path, rows)
+    print(f"rows: {rows} / concurrency: {concurrency} / duration: {duration}s / cache: {cache} / cpus: {os.cpu_count()}")
+    baseline = None
+    try:
+        for workers in workers_list:
+            server = start_server(workers, port, db_path, os.path.join(workdir, f"run{workers}"), cache)
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            try:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", auth=(BASIC_USERNAME, BASIC_PASSWORD), limits=limits, timeout=30) as client:
+                    await wait_ready(client)
+                    await load(client, concurrency, min(duration, 3), 50)  # 预热
+                    count, failed, latencies = await load(client, concurrency, duration, rows // 12)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            rps = count / duration
+            baseline = baseline or rps
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(f"  workers {workers:>2}  {rps:8.1f} req/s  x{rps / baseline:.2f}  p50 {quantiles[49]:7.1f} ms  p99 {quantiles[98]:7.1f} ms  failed {failed}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=str, default="1,2,4")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=18765)
+    parser.add_argument('--cache', type=bool, default=False, action=argparse.BooleanOptionalAction)
+    args = parser.parse_args()
+    asyncio.run(main([int(workers) for workers in args.workers.split(',')], args.rows, args.concurrency, args.duration, args.port, args.cache))
@@ -63,6 +63,11 @@ FASTAPI_STATIC_FILES: bool = False
 # UVICORN
 UVICORN_HOST = os.getenv('UVICORN_HOST', default='127.0.0.1')
 UVICORN_PORT = int(os.getenv('UVICORN_PORT', default=8000))
+UVICORN_WORKERS = int(os.getenv('UVICORN_WORKERS', default=1))  # worker 进程数, 0 为 CPU 核数
+if UVICORN_WORKERS <= 0: UVICORN_WORKERS = os.cpu_count() or 1
+RUN_PATH = os.getenv("RUN_PATH", default="./.run")  # 多 worker 共享的进程锁 / 转码进程号 / 缓存版本号 (不对外提供访问)
+MISSION_LEASE = int(os.getenv('MISSION_LEASE', default=60))  # 后台任务归属租约秒数, 超时未续约的任务可被其他 worker 接管
+STATIC_PRECOMPRESS = bool(os.getenv('STATIC_PRECOMPRESS', 'True') == 'True')  # 启动时生成静态文件的 .gz/.br 预压缩版本
 SSL_KEYFILE = os.getenv('SSL_KEYFILE', default='')
 SSL_CERTFILE = os.getenv('SSL_CERTFILE', default='')
 
@@ -77,6 +82,12 @@ DB_ENGINE = os.getenv('DB_ENGINE', default='sqlite')
 SQLITE_URL = os.getenv('SQLITE_URL', default='dav_db.sqlite')
 MYSQL_URL = os.getenv('MYSQL_URL', default='')
 DB_MAXCONNECT = int(os.getenv('DB_MAXCONNECT', default=100))
+SQLITE_READERS = int(os.getenv('SQLITE_READERS', default=4))  # 只读连接数
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', default='NORMAL')  # OFF NORMAL FULL
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', default=268435456))  # 内存映射 256MB
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', default=-65536))  # 页缓存 负数为KiB 64MB
+SQLITE_STATEMENT_CACHE = int(os.getenv('SQLITE_STATEMENT_CACHE', default=256))  # 预编译语句缓存
+DB_FETCH_BATCH = int(os.getenv('DB_FETCH_BATCH', default=500))  # 流式读取每批行数
 
 # REDIS配置
 REDIS_MODE = os.getenv('REDIS_MODE', default='standalone')
@@ -85,6 +96,10 @@ REDIS_USERNAME = os.getenv('REDIS_USERNAME', default=None)
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', default=None)
 REDIS_DB = int(os.getenv('REDIS_DB', default=0))
 REDIS_TIMEOUT = int(os.getenv('REDIS_TIMEOUT', default=5))
+REDIS_SENTINEL_NAME = os.getenv('REDIS_SENTINEL_NAME', default='mymaster')  # 哨兵模式主节点名
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', default=50))  # 连接池上限
+REDIS_HEALTH_CHECK = int(os.getenv('REDIS_HEALTH_CHECK', default=30))  # 空闲连接健康检查间隔秒数
+REDIS_RETRIES = int(os.getenv('REDIS_RETRIES', default=3))  # 断线重试次数 (指数退避)
 REDIS_CONFIG = {
     'mode': REDIS_MODE,
     'host': REDIS_ADDRESS,
@@ -92,7 +107,16 @@ REDIS_CONFIG = {
     'password': REDIS_PASSWORD,
     'db': REDIS_DB,
     'timeout': REDIS_TIMEOUT,
+    'sentinel_name': REDIS_SENTINEL_NAME,
+    'max_connections': REDIS_MAX_CONNECTIONS,
+    'health_check': REDIS_HEALTH_CHECK,
+    'retries': REDIS_RETRIES,
 }
+# 查询缓存
+CACHE_ENABLE = bool(os.getenv('CACHE_ENABLE', 'True') == 'True')
+CACHE_TTL = int(os.getenv('CACHE_TTL', default=300))  # 缓存秒数
+CACHE_LOCAL_SIZE = int(os.getenv('CACHE_LOCAL_SIZE', default=1024))  # Redis不可用时本地LRU条数
+CACHE_RETRY = int(os.getenv('CACHE_RETRY', default=30))  # Redis不可用后重试间隔秒数
 
 # PATH
 SCAN_PATH = get_envsion('SCAN_PATH')
@@ -100,11 +124,30 @@ SCAN_CODE = bool(os.getenv('SCAN_CODE', 'False') == 'True')
 SCAN_EXT_LIST = get_envsion('SCAN_EXT_LIST')
 PATH_FILTER_LIST = get_envsion('PATH_FILTER_LIST')
 
+# 目录监控 (新文件自动入库)
+WATCH_ENABLE = bool(os.getenv('WATCH_ENABLE', 'False') == 'True')
+WATCH_MODE = os.getenv('WATCH_MODE', default='auto')  # auto / inotify / poll (NFS/SMB 挂载使用 poll)
+WATCH_INTERVAL = int(os.getenv('WATCH_INTERVAL', default=10))  # poll 模式检查目录间隔秒数
+WATCH_DEBOUNCE = float(os.getenv('WATCH_DEBOUNCE', default=2))  # 事件停止多少秒后开始扫描
+WATCH_SETTLE = int(os.getenv('WATCH_SETTLE', default=5))  # 修改时间在多少秒内的文件视为正在写入
+WATCH_DELETE = bool(os.getenv('WATCH_DELETE', 'True') == 'True')  # 文件删除后数据库标记删除
+WATCH_DELETE_DELAY = int(os.getenv('WATCH_DELETE_DELAY', default=300))  # 删除等待秒数 (期间出现相同指纹的文件视为移动)
+
 # THUMBNAIL
 THUMBNAIL_TIME = int(os.getenv('THUMBNAIL_TIME', default=30))
 THUMBNAIL_COMPRESSION = int(os.getenv('THUMBNAIL_COMPRESSION', default=1))
 THUMBNAIL_CLEAR = bool(os.getenv('THUMBNAIL_CLEAR', 'False') == 'True')
 
+# FINGERPRINT
+FINGERPRINT_WORKERS = int(os.getenv('FINGERPRINT_WORKERS', default=8))  # 扫盘时并发读取/解析文件数
+FINGERPRINT_MMAP = bool(os.getenv('FINGERPRINT_MMAP', 'False') == 'True')  # 采样指纹使用 mmap 读取
+VERIFY_CHUNK_MB = int(os.getenv('VERIFY_CHUNK_MB', default=8))  # 全量校验每次读取 MB
+VERIFY_CONCURRENCY = int(os.getenv('VERIFY_CONCURRENCY', default=2))  # 全量校验同时读取文件数
+
+# 近似重复 (感知哈希)
+PHASH_FRAMES = int(os.getenv('PHASH_FRAMES', default=5))  # 每个视频取帧数
+PHASH_DISTANCE = int(os.getenv('PHASH_DISTANCE', default=6))  # 汉明距离阈值 (0-7)
+
 # TEMP_PATH
 TEMP_PATH = os.getenv("TEMP_PATH", default="./.temp")  # os.path.join(os.path.dirname(os.path.dirname(__file__)), "./.temp"))
 TEMP2_PATH = os.getenv("TEMP2_PATH", default="./.temp2")  # os.path.join(os.path.dirname(os.path.dirname(__file__)), "./.temp2"))
@@ -122,3 +165,20 @@ web_proxies={
 web_headers = {
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
 }
+HTTP_TIMEOUT = int(os.getenv('HTTP_TIMEOUT', default=10))  # 抓取超时秒数
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', default=20))  # 连接池上限
+HTTP_HOST_CONCURRENCY = int(os.getenv('HTTP_HOST_CONCURRENCY', default=2))  # 每个站点并发请求数
+HTTP_HOST_RATE = float(os.getenv('HTTP_HOST_RATE', default=2))  # 每个站点每秒请求数, 0 不限制
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', default=1))  # 重试退避基数秒数
+# 元数据预取
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', default=4))  # 同时抓取数
+PREFETCH_BATCH = int(os.getenv('PREFETCH_BATCH', default=20))  # 每批识别码数 (每批提交一次并记录断点)
+PREFETCH_RETRIES = int(os.getenv('PREFETCH_RETRIES', default=3))  # 连接错误重试次数
+PREFETCH_MISS_DAYS = int(os.getenv('PREFETCH_MISS_DAYS', default=30))  # 未找到的识别码多少天后再重试
+# 图片镜像
+IMAGE_CACHE_ENABLE = bool(os.getenv('IMAGE_CACHE_ENABLE', 'True') == 'True')
+IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH", default="./.images")  # 按内容哈希存储, 不随 TEMP_PATH 清理
+IMAGE_CACHE_SIZE = int(os.getenv('IMAGE_CACHE_SIZE', default=2048))  # 缓存上限 MB, 超出按最近访问时间淘汰
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', default=10 * 1024 * 1024))  # 单张图片上限字节数
+IMAGE_CONCURRENCY = int(os.getenv('IMAGE_CONCURRENCY', default=4))  # 预热同时下载数
+IMAGE_PREFETCH = bool(os.getenv('IMAGE_PREFETCH', 'True') == 'True')  # 元数据预取后预热图片
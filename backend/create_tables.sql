@@ -41,7 +41,10 @@ CREATE TABLE `dav_local`
     `resolution`            varchar(16)   DEFAULT ''    COMMENT '分辨率',   -- 1080 720
     `format`                varchar(32)   DEFAULT ''    COMMENT '格式',     -- mp4
     `fps`                   float(16)     DEFAULT 0.0   COMMENT '帧率',     -- 30 60
-    `crc`                   varchar(32)   DEFAULT ''    COMMENT 'crc',     -- 3d91035d
+    `crc`                   varchar(32)   DEFAULT ''    COMMENT '采样指纹', -- blake2b-128 (大小+首/中/尾块)
+    `hash`                  varchar(64)   DEFAULT ''    COMMENT '全量哈希', -- blake2b-256 (校验任务)
+    `verified`              datetime      DEFAULT NULL  COMMENT '校验时间',
+    `phash`                 bigint        DEFAULT NULL  COMMENT '感知哈希', -- 64 bit, 0 为无可用帧
     -- 标记信息
     `subtitle`              varchar(8)    DEFAULT NULL  COMMENT '字幕',    --  NULL/CN/JP/EN
     `grade`                 int(4)        DEFAULT 0     COMMENT '等级',    --  -2 luan2 / -1 luan / 0 ai / 1 youma / 2 aima / 11 wuma / 99 good
@@ -52,7 +55,10 @@ CREATE TABLE `dav_local`
     `status`                int           DEFAULT 0     COMMENT '状态',    -- 0 exist / 1 delete
     `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
     `updated_time`          datetime      DEFAULT NULL  COMMENT '更新时间',
-    PRIMARY KEY (`id`)  USING BTREE
+    PRIMARY KEY (`id`)  USING BTREE,
+    INDEX idx_dav_local_path_file (`path`, `file`(255), `status`),
+    INDEX idx_dav_local_status_code (`status`, `code`),
+    INDEX idx_dav_local_status_created (`status`, `created`)
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 -- ALTER TABLE dav_local ADD format varchar(32) DEFAULT '' COMMENT '格式' AFTER resolution;
 
@@ -70,7 +76,8 @@ CREATE TABLE `dav_search`
     `status`                int           DEFAULT 0     COMMENT '状态',    -- 0 exist / 1 delete
     `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
     `updated_time`          datetime      DEFAULT NULL  COMMENT '更新时间',
-    PRIMARY KEY (`id`)  USING BTREE
+    PRIMARY KEY (`id`)  USING BTREE,
+    INDEX idx_dav_search_key (`key`)
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
 -- 关键字替换表: keyword table
@@ -102,7 +109,7 @@ CREATE TABLE `dav_missions`
     `path`                  varchar(512)  DEFAULT ''    COMMENT '路径',    -- /nfs/hd01/
     `file`                  varchar(512)  DEFAULT ''    COMMENT '文件',    -- XXX-000 xxxxxx.mp4
     -- 任务信息
-    `type`                  int           DEFAULT 0     COMMENT '任务类型',  -- 0 null / 1 cut / 2 transcode / 3 scan_path / 4 clear_local_db
+    `type`                  int           DEFAULT 0     COMMENT '任务类型',  -- 0 null / 1 cut / 2 transcode / 3 scan_path / 4 clear_local_db / 5 prefetch / 6 verify / 7 phash
     -- 1 cut
     `start`                 int           DEFAULT 0     COMMENT '开始秒数', 
     `end`                   int           DEFAULT 0     COMMENT '结束秒数', 
@@ -111,11 +118,21 @@ CREATE TABLE `dav_missions`
     `crf`                   int           DEFAULT 15     COMMENT '质量',    -- 0无损 23默认 51最差
     -- -- 3 scan
     -- `paths`                 varchar(512)  DEFAULT ''    COMMENT '路径',
+    -- 进度 (5 prefetch)
+    `total`                 int           DEFAULT 0     COMMENT '总数',
+    `progress`              int           DEFAULT 0     COMMENT '已处理数',
+    `checkpoint`            varchar(512)  DEFAULT ''    COMMENT '断点',
+    `rate`                  float         DEFAULT 0     COMMENT '速度 (个/秒)',
+    `counters`              varchar(1024) DEFAULT ''    COMMENT '计数',    -- JSON
+    -- 归属 (多 worker)
+    `owner`                 varchar(128)  DEFAULT ''    COMMENT '执行进程', -- 主机名:进程号, 空为未认领, stop 为请求停止
     
     `status`                int           DEFAULT 0     COMMENT '状态',    -- 0 create / 1 doing / 2 done / -1 failed
     `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
     `updated_time`          datetime      DEFAULT NULL  COMMENT '更新时间',
-    PRIMARY KEY (`id`)  USING BTREE
+    PRIMARY KEY (`id`)  USING BTREE,
+    INDEX idx_dav_missions_status (`status`),
+    INDEX idx_dav_missions_type_status (`type`, `status`)
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
 -- ntsc 720x480 / pal 720x576 / sntsc 640x480 / spal 768x576 / cif 352x288 / vga 640x480 / hd480 852x480 / hd720 1280x720 / hd1080 1920x1080 / 2k 2048x1080 / 4k 4096x2160
@@ -148,7 +165,22 @@ CREATE TABLE `dav_web`
     `status`                int           DEFAULT 0     COMMENT '状态',    -- 0 exist / 1 delete
     `created_time`         datetime      DEFAULT NOW() COMMENT '创建时间',
     `updated_time`         datetime      DEFAULT NULL  COMMENT '更新时间',
-    PRIMARY KEY (`id`)  USING BTREE
+    PRIMARY KEY (`id`)  USING BTREE,
+    INDEX idx_dav_web_code (`code`),
+    INDEX idx_dav_web_score_code (`score`, `code`)
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+-- 未找到的识别码: 预取负缓存 (PREFETCH_MISS_DAYS 天内不再查询)
+DROP TABLE IF EXISTS `dav_web_miss`;
+CREATE TABLE `dav_web_miss`
+(
+    `id`                    int           NOT NULL AUTO_INCREMENT COMMENT 'id',
+    `code`                  varchar(48)   NOT NULL      COMMENT '识别码',
+    `attempts`              int           DEFAULT 1     COMMENT '未找到次数',
+    `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
+    `updated_time`          datetime      DEFAULT NOW() COMMENT '最后查询时间',
+    PRIMARY KEY (`id`)  USING BTREE,
+    INDEX idx_dav_web_miss_code (`code`, `updated_time`)
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
 -- ------------------------------------------------------------------------
@@ -159,7 +191,7 @@ CREATE TABLE `dav_actor`
 (
     `id`                    int           NOT NULL AUTO_INCREMENT COMMENT 'id',
 
-    `name`                  varchar(48)   NOT NULL      COMMENT '演员', 
+    `name`                  varchar(128)  NOT NULL      COMMENT '演员', 
     `explain`               varchar(256)  DEFAULT ''    COMMENT '说明', 
 
     -- 演员信息
@@ -173,28 +205,77 @@ CREATE TABLE `dav_actor`
 
     `created_time`         datetime      DEFAULT NOW() COMMENT '创建时间',
     `updated_time`         datetime      DEFAULT NULL  COMMENT '更新时间',
-    PRIMARY KEY (`id`)  USING BTREE
+    PRIMARY KEY (`id`)  USING BTREE,
+    UNIQUE INDEX idx_dav_actor_name (`name`)
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
 -- 类别表
-DROP TABLE IF EXISTS `dav_category`;
-CREATE TABLE `dav_category`
+DROP TABLE IF EXISTS `dav_genre`;
+CREATE TABLE `dav_genre`
 (
     `id`                    int           NOT NULL AUTO_INCREMENT COMMENT 'id',
 
-    `name`                  varchar(48)   NOT NULL      COMMENT '类别', 
-    `explain`               varchar(256)  DEFAULT ''    COMMENT '说明', 
+    `name`                  varchar(128)  NOT NULL      COMMENT '类别', 
 
-    -- 类别信息
-    `website`               varchar(512)  DEFAULT ''    COMMENT '网站',   -- [ "https://", ]
+    `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
+    PRIMARY KEY (`id`)  USING BTREE,
+    UNIQUE INDEX idx_dav_genre_name (`name`)
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
-    -- CC
-    `comment`               varchar(256)  DEFAULT ''    COMMENT '评论', 
-    `score`                 int(4)        DEFAULT 0     COMMENT '评分', 
+-- 发行商表
+DROP TABLE IF EXISTS `dav_studio`;
+CREATE TABLE `dav_studio`
+(
+    `id`                    int           NOT NULL AUTO_INCREMENT COMMENT 'id',
 
-    `created_time`         datetime      DEFAULT NOW() COMMENT '创建时间',
-    `updated_time`         datetime      DEFAULT NULL  COMMENT '更新时间',
-    PRIMARY KEY (`id`)  USING BTREE
+    `name`                  varchar(128)  NOT NULL      COMMENT '发行商', 
+
+    `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
+    PRIMARY KEY (`id`)  USING BTREE,
+    UNIQUE INDEX idx_dav_studio_name (`name`)
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+-- 识别码-演员 关联表
+DROP TABLE IF EXISTS `dav_web_actor`;
+CREATE TABLE `dav_web_actor`
+(
+    `code`                  varchar(48)   NOT NULL      COMMENT '识别码',
+    `actor_id`              int           NOT NULL      COMMENT '演员id',
+    PRIMARY KEY (`code`, `actor_id`)  USING BTREE,
+    INDEX idx_dav_web_actor_actor_id (`actor_id`, `code`),
+    INDEX idx_dav_web_actor_code (`code`)
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+-- 识别码-类别 关联表
+DROP TABLE IF EXISTS `dav_web_genre`;
+CREATE TABLE `dav_web_genre`
+(
+    `code`                  varchar(48)   NOT NULL      COMMENT '识别码',
+    `genre_id`              int           NOT NULL      COMMENT '类别id',
+    PRIMARY KEY (`code`, `genre_id`)  USING BTREE,
+    INDEX idx_dav_web_genre_genre_id (`genre_id`, `code`),
+    INDEX idx_dav_web_genre_code (`code`)
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+-- 识别码-发行商 关联表
+DROP TABLE IF EXISTS `dav_web_studio`;
+CREATE TABLE `dav_web_studio`
+(
+    `code`                  varchar(48)   NOT NULL      COMMENT '识别码',
+    `studio_id`             int           NOT NULL      COMMENT '发行商id',
+    PRIMARY KEY (`code`, `studio_id`)  USING BTREE,
+    INDEX idx_dav_web_studio_studio_id (`studio_id`, `code`),
+    INDEX idx_dav_web_studio_code (`code`)
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+
+-- 数据库版本表: schema version (utils/migrate.py)
+DROP TABLE IF EXISTS `dav_schema`;
+CREATE TABLE `dav_schema`
+(
+    `version`               int           NOT NULL      COMMENT '版本',
+    `name`                  varchar(128)  DEFAULT ''    COMMENT '说明',
+    `applied_time`          datetime      DEFAULT NOW() COMMENT '执行时间',
+    PRIMARY KEY (`version`)  USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
 -- 识别码表
@@ -4,15 +4,25 @@ import uvicorn
 from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 
 from api.router import api_router
 from api.router import root_router
-from utils.db import database
+from utils.db import database, write_buffer
+from utils.redis.init import register_redis, close_redis
+from utils.web import close_http_client
 from utils.log import loggers, log as logger
 from utils.local import check_ssl_files
+from utils.migrate import migrate_schema
+from utils.prefetch import start_prefetch, stop_prefetch
+from utils.verify import start_verify, stop_verify
+from utils.duplicates import start_phash, stop_phash
+from utils.watch import start_watcher, stop_watcher
+from utils.scan import stop_scan
+from utils.images import stop_image_mirror
+from utils.workers import PROCESS_LOCK_ENABLE, process_lock, try_lock
+from utils.compress import CompressMiddleware, precompress_static
+from utils.static import FingerprintedStaticFiles, ThumbnailStaticFiles, static_url, STATIC_DIR
 from config import *
 
 
@@ -37,8 +47,20 @@ async def lifespan(app: FastAPI):
     # 启动逻辑
     logger.info("Application starting up...")
     try:
-        await database.connect()
-        logger.info("Database connected successfully")
+        # 多 worker 时建表/迁移依次执行
+        async with process_lock("startup"):
+            await database.connect()
+            logger.info("Database connected successfully")
+            await migrate_schema()
+            if STATIC_PRECOMPRESS:
+                await asyncio.to_thread(precompress_static, STATIC_DIR)  # 静态文件 .gz/.br
+        await register_redis(app)  # 共享 Redis 连接池
+        write_buffer.start()
+        await start_prefetch(create=False)  # 继续未完成的预取任务
+        await start_verify(create=False)  # 继续未完成的校验任务
+        await start_phash(create=False)  # 继续未完成的感知哈希任务
+        if WATCH_ENABLE and try_lock("watch"):
+            await start_watcher()  # 目录监控 (只在一个 worker 运行)
         yield
     except Exception as e:
         logger.error(f"Error during application startup: {e}")
@@ -47,6 +69,15 @@ async def lifespan(app: FastAPI):
         # 关闭逻辑
         logger.info("Application shutting down...")
         try:
+            await stop_watcher()
+            await stop_scan()  # 保留断点
+            await stop_prefetch()  # 保留断点
+            await stop_verify()
+            await stop_phash()
+            await stop_image_mirror()
+            await write_buffer.stop()  # 刷新写缓冲
+            await close_redis()
+            await close_http_client()
             await database.disconnect()
             logger.info("Database disconnected successfully")
         except Exception as e:
@@ -72,15 +103,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-# 添加GZip压缩中间件以减少传输大小
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# 压缩中间件: 只压缩文本类型, 视频/图片/206 原样返回
+app.add_middleware(CompressMiddleware, minimum_size=1000)
 ## 路由
 app.include_router(api_router)
 app.include_router(root_router)
 
-# 静态文件服务
-app.mount("/frontend/static", StaticFiles(directory="./frontend/static"), name="static")
-app.mount("/.temp", StaticFiles(directory=TEMP_PATH), name="temp")
+# 静态文件服务 (带内容哈希的地址长期缓存, 见 utils/static.py)
+app.mount("/frontend/static", FingerprintedStaticFiles(directory=STATIC_DIR), name="static")
+app.mount("/.temp", ThumbnailStaticFiles(directory=TEMP_PATH), name="temp")
+templates.env.globals["static_url"] = static_url
 
 
 if __name__ == "__main__":
@@ -93,9 +125,13 @@ if __name__ == "__main__":
     else:
         logger.info("SSL disabled - Cert or key file not found")
     
-    # 根据是否调试模式确定工作进程数
-    cpu_count = 1 if run_debug else max(1, os.cpu_count() or 1)
-    logger.info(f"cpu_count: {cpu_count}")
+    # 调试模式 (reload) 只支持单进程
+    workers = 1 if run_debug else UVICORN_WORKERS
+    # 没有文件锁 (Windows) 时迁移/目录监控无法互斥, 只支持单进程
+    if workers > 1 and not PROCESS_LOCK_ENABLE:
+        logger.warning(f"File locks (fcntl) unavailable on this platform, UVICORN_WORKERS={UVICORN_WORKERS} ignored, running 1 worker")
+        workers = 1
+    logger.info(f"workers: {workers}")
 
     try:
         uvicorn.run(
@@ -103,7 +139,7 @@ if __name__ == "__main__":
                 host=UVICORN_HOST,
                 port=UVICORN_PORT,
                 reload=run_debug,
-                workers=1,  # 禁用多进程
+                workers=workers,  # 共享状态见 utils/workers.py
                 limit_concurrency=2000,
                 ssl_keyfile=SSL_KEYFILE if SSL_KEYFILE else None,
                 ssl_certfile=SSL_CERTFILE if SSL_CERTFILE else None,
@@ -0,0 +1,72 @@
+# -*- coding: UTF8 -*-
+"""
+语句方言转换 (utils/db.py)
+ - glob_to_regexp: 转换后的正则与 SQLite 原生 GLOB 的匹配结果一致
+ - compile_query: SQLite 占位符 / MySQL 的 GLOB => REGEXP (反斜杠转义)
+
+用法 (在 .env 所在目录执行):
+    python -m unittest discover -s backend/tests -v
+"""
+import os
+import re
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import glob_to_regexp, compile_query
+from utils.library import JAPANESE_GLOB
+
+PATTERNS = ('*', 'abc', 'a*c', 'a?c', '*.mp4', '[abc]*', '[a-c]?x', '[^abc]*', '*[0-9]', 'a.b', 'a+b(1)', 'x$^|{2}', JAPANESE_GLOB.strip("'"))
+TEXTS = ('', 'abc', 'ac', 'abbc', 'a.c', 'aXc', 'movie.mp4', 'movie.mkv', 'bx', 'ccx', 'dx', 'a.b', 'aXb', 'a+b(1)', 'aab(1)',
+         '[abc', 'abc9', 'x$^|{2}', 'xx', 'みるく.mp4', 'ミルク', 'movie 漢字.mp4')
+
+
+class GlobToRegexpTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect(":memory:")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def test_matches_sqlite_glob(self):
+        for pattern in PATTERNS:
+            regexp = re.compile(glob_to_regexp(pattern), re.DOTALL)
+            for text in TEXTS:
+                with self.subTest(pattern=pattern, text=text):
+                    expected = self.conn.execute("SELECT ? GLOB ?", (text, pattern)).fetchone()[0] == 1
+                    self.assertEqual(regexp.search(text) is not None, expected)
+
+    def test_anchored(self):
+        self.assertEqual(glob_to_regexp('a*'), '^a.*$')
+        self.assertEqual(glob_to_regexp('?'), '^.$')
+
+    def test_unclosed_bracket_literal(self):
+        """未闭合的 '[' 按字面转义 (SQLite GLOB 中此模式不匹配任何字符串, 语句中不使用)"""
+        self.assertEqual(glob_to_regexp('[ab'), '^\\[ab$')
+
+
+class CompileQueryTest(unittest.TestCase):
+    def test_sqlite(self):
+        query = "SELECT id FROM dav_local WHERE code=%s AND updated_time<NOW() AND name COLLATE utf8mb4_general_ci LIKE %s"
+        self.assertEqual(compile_query(query, "sqlite"), "SELECT id FROM dav_local WHERE code=? AND updated_time<CURRENT_TIMESTAMP AND name COLLATE NOCASE LIKE ?")
+
+    def test_sqlite_keeps_glob(self):
+        query = "SELECT id FROM dav_local WHERE file NOT GLOB '*.mp4'"
+        self.assertEqual(compile_query(query, "sqlite"), query)
+
+    def test_mysql_glob(self):
+        """GLOB => REGEXP, 正则中的反斜杠在 SQL 字符串内加倍"""
+        query = "SELECT id FROM dav_local WHERE file NOT GLOB '*.mp4' AND code GLOB 'AB?-[0-9]*'"
+        self.assertEqual(compile_query(query, "mysql"), "SELECT id FROM dav_local WHERE file NOT REGEXP '^.*\\\\.mp4$' AND code REGEXP '^AB.\\\\-[0-9].*$'")
+
+    def test_mysql_placeholders_unchanged(self):
+        query = "SELECT id FROM dav_local WHERE code=%s LIMIT %s,%s"
+        self.assertEqual(compile_query(query, "mysql"), query)
+
+
+if __name__ == "__main__":
+    unittest.main()
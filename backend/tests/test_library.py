@@ -0,0 +1,132 @@
+# -*- coding: UTF8 -*-
+"""
+媒体库游标分页 (utils/library.py), 内存 SQLite 执行
+ - 每个模式逐页按游标翻到底, 结果与一次性按页码查询的完整列表相同 (不重复不遗漏)
+   排序字段含 NULL / 重复值, SCAN_CODE 开关两种排序都覆盖
+ - keyset_condition: NULL 游标值的展开
+ - decode_cursor: 非法游标 / 与模式不匹配的游标抛出 ValueError
+
+用法 (在 .env 所在目录执行, DB_ENGINE=sqlite):
+    python -m unittest discover -s backend/tests -v
+"""
+import os
+import sys
+import sqlite3
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.library as library
+from utils.db import format_query_for_db
+
+MODES = ('all', 'all2', 'all3', 'repeat', 'nojapan', 'score', 'abc', 'x*1')
+PAGE_SIZES = (1, 3, 7)
+
+
+def create_library() -> sqlite3.Connection:
+    """dav_local / dav_web 中列表查询用到的字段, 排序字段含 NULL 和重复值"""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("""CREATE TABLE dav_local (id INTEGER PRIMARY KEY, code TEXT, path TEXT, file TEXT, size REAL, duration REAL,
+                    aspectratio REAL, resolution TEXT, created DATETIME, crc TEXT, status INTEGER DEFAULT 0)""")
+    conn.execute("CREATE TABLE dav_web (id INTEGER PRIMARY KEY, code TEXT, score INTEGER DEFAULT 0)")
+    codes = ['ABC-001', 'ABC-002', None, '', 'XYZ-100', 'ABC-001']
+    files = ['abc 1.mp4', 'x1.mp4', 'みるく.mp4', 'abc 2.mp4', 'zz.mp4', None]
+    createds = ['2024-01-02 00:00:00', None, '2023-12-31 23:59:59', '2024-01-02 00:00:00']
+    for i in range(1, 61):
+        conn.execute(
+            "INSERT INTO dav_local (id, code, path, file, size, duration, aspectratio, resolution, created, crc, status) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+            (i, codes[i % len(codes)], '/media', files[i % len(files)], 100.0, 60.0, 0.5625, '1080p', createds[i % len(createds)], f"{i:032x}", 1 if i % 11 == 0 else 0),
+        )
+    for code, score in (('ABC-001', 5), ('XYZ-100', 3), ('ABC-002', 0)):
+        conn.execute("INSERT INTO dav_web (code, score) VALUES (?,?)", (code, score))
+    return conn
+
+
+class CursorPagingTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_library()
+        self.scan_code = library.SCAN_CODE
+
+    def tearDown(self):
+        library.SCAN_CODE = self.scan_code
+        self.conn.close()
+
+    def fetch(self, check_query: str, values: tuple) -> list:
+        return [dict(row) for row in self.conn.execute(format_query_for_db(check_query), values).fetchall()]
+
+    def page_all(self, query: str, limit: int) -> list:
+        """按游标翻到最后一页 (游标经 encode/decode 往返)"""
+        rows, after = [], None
+        for _ in range(1000):
+            page = self.fetch(*library.build_cursor_query(query, after, limit))
+            rows += page
+            if len(page) < limit:
+                return rows
+            after = library.decode_cursor(query, library.encode_cursor(query, page[-1]))
+        self.fail(f"paging did not finish: {query}")
+
+    def test_every_mode(self):
+        for scan_code in (True, False):
+            library.SCAN_CODE = scan_code
+            for query in MODES:
+                expected = [row['id'] for row in self.fetch(*library.build_list_query(query, 1, 0, 10000))]
+                self.assertGreater(len(expected), 1, query)
+                for limit in PAGE_SIZES:
+                    with self.subTest(scan_code=scan_code, query=query, limit=limit):
+                        self.assertEqual([row['id'] for row in self.page_all(query, limit)], expected)
+
+    def test_null_sort_values(self):
+        """NULL 排在最前, 游标停在 NULL 行时继续翻页"""
+        library.SCAN_CODE = True
+        rows = self.fetch(*library.build_cursor_query('all2', None, 3))
+        self.assertIsNone(rows[-1]['created'])
+        after = library.decode_cursor('all2', library.encode_cursor('all2', rows[-1]))
+        self.assertEqual(after, [None, rows[-1]['id']])
+        page = self.fetch(*library.build_cursor_query('all2', after, 3))
+        self.assertTrue(all(row['id'] > rows[-1]['id'] for row in page if row['created'] is None))
+
+    def test_empty_search(self):
+        self.assertEqual(self.page_all('nothing-matches', 5), [])
+
+
+class KeysetConditionTest(unittest.TestCase):
+    def test_expand(self):
+        condition, values = library.keyset_condition(('code', 'file', 'id'), ['A', 'b', 3])
+        self.assertEqual(condition, "(dl.code > %s OR (dl.code = %s AND (dl.file > %s OR (dl.file = %s AND dl.id > %s))))")
+        self.assertEqual(values, ('A', 'A', 'b', 'b', 3))
+
+    def test_null_value(self):
+        """NULL 之后: 非 NULL 的全部在后, NULL 的比较下一字段"""
+        condition, values = library.keyset_condition(('created', 'id'), [None, 9])
+        self.assertEqual(condition, "(dl.created IS NOT NULL OR (dl.created IS NULL AND dl.id > %s))")
+        self.assertEqual(values, (9,))
+
+    def test_id_only(self):
+        self.assertEqual(library.keyset_condition(('id',), [5]), ("dl.id > %s", (5,)))
+
+
+class DecodeCursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        row = {'id': 4, 'code': None, 'file': 'a.mp4', 'created': '2024-01-02 00:00:00'}
+        for query in MODES:
+            with self.subTest(query=query):
+                cursor = library.encode_cursor(query, row)
+                self.assertEqual(library.decode_cursor(query, cursor), [row[column] for column in library.list_mode(query)[3]])
+
+    def test_invalid(self):
+        library_cursor = library.encode_cursor('all2', {'id': 4, 'created': None})
+        for query, cursor in (('all2', 'not-base58-0OIl'), ('all2', '3mJr7AoUXx2Wqd'), ('all3', library_cursor)):
+            with self.subTest(query=query, cursor=cursor):
+                with self.assertRaises(ValueError):
+                    library.decode_cursor(query, cursor)
+
+    def test_null_id(self):
+        """最后一个字段 (id) 不能为 NULL"""
+        cursor = library.encode_cursor('all3', {'id': None})
+        with self.assertRaises(ValueError):
+            library.decode_cursor('all3', cursor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: UTF8 -*-
+"""
+近似重复查找 (utils/phash.py), 与逐对暴力比较的结果一致
+ - find_near_pairs: 多索引查找得到的 (i, j, 距离) 与全部两两汉明距离 ≤ distance 的对完全相同
+ - cluster_pairs: 与按相似对做连通分量的结果相同
+ - find_duplicate_clusters: 有符号存储值 (to_db_phash) 还原后结果不变
+
+用法 (在 .env 所在目录执行):
+    python -m unittest discover -s backend/tests -v
+"""
+import os
+import sys
+import random
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.phash import PHASH_BITS, PHASH_MAX_DISTANCE, find_near_pairs, cluster_pairs, find_duplicate_clusters, to_db_phash
+
+
+def make_hashes(seed: int, count: int = 300) -> list:
+    """随机哈希 + 每个哈希附近 (翻转 0..8 位) 的变体 + 完全相同的哈希"""
+    rng = random.Random(seed)
+    hashes = [rng.getrandbits(PHASH_BITS) for _ in range(count)]
+    for value in list(hashes):
+        if rng.random() < 0.5:
+            variant = value
+            for bit in rng.sample(range(PHASH_BITS), rng.randint(0, 8)):
+                variant ^= 1 << bit
+            hashes.append(variant)
+    hashes += hashes[:5]
+    rng.shuffle(hashes)
+    return hashes
+
+def brute_pairs(hashes: list, distance: int) -> set:
+    return {
+        (i, j, bin(hashes[i] ^ hashes[j]).count('1'))
+        for i in range(len(hashes))
+        for j in range(i + 1, len(hashes))
+        if bin(hashes[i] ^ hashes[j]).count('1') <= distance
+    }
+
+def brute_clusters(pairs: set) -> list:
+    """连通分量 (深度优先), 组内升序"""
+    graph = {}
+    for i, j, _ in pairs:
+        graph.setdefault(i, set()).add(j)
+        graph.setdefault(j, set()).add(i)
+    seen, clusters = set(), []
+    for start in graph:
+        if start in seen:
+            continue
+        stack, members = [start], []
+        seen.add(start)
+        while stack:
+            node = stack.pop()
+            members.append(node)
+            for other in graph[node] - seen:
+                seen.add(other)
+                stack.append(other)
+        clusters.append(sorted(members))
+    return clusters
+
+
+class NearPairsTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        """每个距离 (0..PHASH_MAX_DISTANCE) 的结果与暴力比较相同"""
+        for seed in range(3):
+            hashes = make_hashes(seed)
+            array = np.array(hashes, dtype=np.uint64)
+            for distance in range(PHASH_MAX_DISTANCE + 1):
+                with self.subTest(seed=seed, distance=distance):
+                    first, second, distances = find_near_pairs(array, distance)
+                    found = list(zip(first.tolist(), second.tolist(), distances.tolist()))
+                    self.assertEqual(len(found), len(set(found)))  # 每对只出现一次
+                    self.assertEqual(set(found), brute_pairs(hashes, distance))
+
+    def test_distance_clamped(self):
+        """超过 PHASH_MAX_DISTANCE 按上限查找"""
+        hashes = make_hashes(7)
+        array = np.array(hashes, dtype=np.uint64)
+        first, second, _ = find_near_pairs(array, PHASH_MAX_DISTANCE + 10)
+        self.assertEqual(set(zip(first.tolist(), second.tolist())), {(i, j) for i, j, _ in brute_pairs(hashes, PHASH_MAX_DISTANCE)})
+
+    def test_no_pairs(self):
+        first, second, distances = find_near_pairs(np.array([0, (1 << 64) - 1], dtype=np.uint64), 3)
+        self.assertEqual((len(first), len(second), len(distances)), (0, 0, 0))
+
+
+class ClusterTest(unittest.TestCase):
+    def test_matches_connected_components(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                hashes = make_hashes(seed)
+                first, second, _ = find_near_pairs(np.array(hashes, dtype=np.uint64), 5)
+                self.assertEqual(sorted(cluster_pairs(first, second)), sorted(brute_clusters(brute_pairs(hashes, 5))))
+
+    def test_chain(self):
+        """传递合并: 0-1, 1-2, 3-4 => [0, 1, 2], [3, 4]"""
+        clusters = cluster_pairs(np.array([1, 0, 3]), np.array([2, 1, 4]))
+        self.assertEqual(sorted(clusters), [[0, 1, 2], [3, 4]])
+
+    def test_signed_values(self):
+        """数据库中的有符号值与无符号哈希结果相同, 返回 id"""
+        hashes = make_hashes(11, 100)
+        ids = [1000 + i for i in range(len(hashes))]
+        clusters = find_duplicate_clusters(ids, [to_db_phash(value) for value in hashes], 4)
+        expected = [[ids[i] for i in members] for members in brute_clusters(brute_pairs(hashes, 4))]
+        self.assertEqual(sorted(clusters), sorted(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: UTF8 -*-
+"""
+扫盘断点 (utils/scan.py)
+ - walk_key: 沿 sorted_walk 的遍历顺序严格递增, 断点之后的目录 = walk_key 大于断点的目录
+   名称含排在路径分隔符之前的字符 (空格 / '-' / '.') 、大小写、中文、多层嵌套
+
+用法 (在 .env 所在目录执行):
+    python -m unittest discover -s backend/tests -v
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.scan import walk_key, sorted_walk
+
+TREE = ('a/b/c', 'a/b2', 'a/b-1', 'a b/x', 'a-b', 'a.b/y/z', 'A', 'b', '中文/子目录', 'a0')
+
+
+class WalkKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.root = self.temp.name
+        for path in TREE:
+            os.makedirs(os.path.join(self.root, *path.split('/')))
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def walk(self, root: str) -> list:
+        return [fpathe for fpathe, _, _ in sorted_walk(root)]
+
+    def test_increasing_along_walk(self):
+        walked = self.walk(self.root)
+        keys = [walk_key(self.root, fpathe) for fpathe in walked]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+    def test_resume_after_checkpoint(self):
+        """任一断点恢复: 跳过断点及之前的目录, 之后的目录一个不少"""
+        walked = self.walk(self.root)
+        for index, checkpoint in enumerate(walked):
+            with self.subTest(checkpoint=checkpoint):
+                key = walk_key(self.root, checkpoint)
+                self.assertEqual([fpathe for fpathe in walked if walk_key(self.root, fpathe) > key], walked[index + 1:])
+
+    def test_separator_order(self):
+        """逐级比较: 'a/b-1' 在 'a/b/c' 之后, 'a b' 在 'a/b2' 之后 (按整串比较时 ' ' / '-' 排在 '/' 之前, 顺序相反)"""
+        walked = [os.path.relpath(fpathe, self.root) for fpathe in self.walk(self.root)]
+        position = {path: index for index, path in enumerate(walked)}
+        self.assertLess(position[os.path.join('a', 'b', 'c')], position[os.path.join('a', 'b-1')])
+        self.assertLess(position[os.path.join('a', 'b2')], position['a b'])
+        self.assertLess(position[os.path.join('a.b', 'y', 'z')], position['a0'])
+
+    def test_root(self):
+        self.assertEqual(walk_key(self.root, self.root), ())
+        self.assertEqual(walk_key(self.root + os.sep, os.path.join(self.root, 'a', 'b')), ('a', 'b'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+# -*- coding: UTF8 -*-
+"""
+共享 HTTP 客户端与刮削 (utils/web.py), 离线执行
+
+本地 http.server 提供 benchmarks/fixtures 中保存的页面, 不访问外网:
+ - fetch_text: 每个站点并发数不超过 HTTP_HOST_CONCURRENCY, 超时 / 重试用尽时抛出异常
+ - fetch_bytes: 超过大小上限时中止 (Content-Length 或流式读取)
+ - get_javbus_title / get_123av_title: 经共享 httpx.AsyncClient 抓取并解析, 与 fixtures/*.json 一致
+
+用法 (在 .env 所在目录执行):
+    python -m unittest discover -s backend/tests -v
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["NO_PROXY"] = "127.0.0.1,localhost"  # 本地服务不走环境变量中的代理
+
+import utils.web as web
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+SLOW_SECONDS = 0.2
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+def load_expected(name: str):
+    with open(os.path.join(FIXTURES, name), encoding='UTF-8') as f:
+        return json.load(f)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    /javbus/<识别码>  /123av/<识别码> : fixtures 页面 (不存在的识别码返回 javbus_not_found.html)
+    /slow/<n> : 延迟 SLOW_SECONDS 秒, 记录同时处理的请求数
+    /flaky/<key>/<n> : 前 n 次返回 503
+    /hang : 延迟 1 秒 (超过测试客户端的超时)
+    /bytes/<n> : n 字节 (带 Content-Length)
+    /chunked/<n> : n 字节 (分块传输, 无 Content-Length)
+    """
+    server_version = "StubServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.state
+        parts = self.path.strip('/').split('/')
+        if parts[0] in ('javbus', '123av') and len(parts) == 2:
+            name = f"{parts[0]}_{parts[1]}.html"
+            if not os.path.exists(os.path.join(FIXTURES, name)):
+                name = "javbus_not_found.html"
+            self.reply(200, read_fixture(name))
+        elif parts[0] == 'slow':
+            with state['lock']:
+                state['active'] += 1
+                state['max_active'] = max(state['max_active'], state['active'])
+            time.sleep(SLOW_SECONDS)
+            with state['lock']:
+                state['active'] -= 1
+            self.reply(200, f"slow {parts[1]}".encode())
+        elif parts[0] == 'flaky':
+            with state['lock']:
+                state['hits'][parts[1]] = hits = state['hits'].get(parts[1], 0) + 1
+            if hits <= int(parts[2]):
+                self.reply(503, b"busy")
+            else:
+                self.reply(200, b"ok")
+        elif parts[0] == 'hang':
+            time.sleep(1)
+            self.reply(200, b"late")
+        elif parts[0] == 'bytes':
+            self.reply(200, b"x" * int(parts[1]))
+        elif parts[0] == 'chunked':
+            self.protocol_version = "HTTP/1.1"
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                for start in range(0, int(parts[1]), 1024):
+                    chunk = b"x" * min(1024, int(parts[1]) - start)
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客户端超出上限后中止
+        else:
+            self.reply(404, b"not found")
+
+
+class WebClientTest(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server.daemon_threads = True
+        cls.server.state = {'lock': threading.Lock(), 'active': 0, 'max_active': 0, 'hits': {}}
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    async def asyncSetUp(self):
+        # 每个测试独立的事件循环: 重建共享客户端与站点信号量, 不限制频率, 缩短重试等待
+        self.patched = {name: getattr(web, name) for name in ('web_proxies', 'HTTP_HOST_RATE', 'HTTP_RETRY_BACKOFF', 'JAVBUS_URL', 'AV123_URL')}
+        web.web_proxies = {}
+        web.HTTP_HOST_RATE = 0
+        web.HTTP_RETRY_BACKOFF = 0.01
+        web.JAVBUS_URL = f"{self.base_url}/javbus/"
+        web.AV123_URL = f"{self.base_url}/123av/"
+        web.host_semaphores.clear()
+        web.host_next_time.clear()
+        await web.close_http_client()
+
+    async def asyncTearDown(self):
+        await web.close_http_client()
+        for name, value in self.patched.items():
+            setattr(web, name, value)
+
+    async def test_host_concurrency(self):
+        """同一站点同时进行的请求不超过 HTTP_HOST_CONCURRENCY"""
+        self.server.state['max_active'] = 0
+        count = web.HTTP_HOST_CONCURRENCY * 3
+        texts = await asyncio.gather(*(web.fetch_text(f"{self.base_url}/slow/{i}") for i in range(count)))
+        self.assertEqual(texts, [f"slow {i}" for i in range(count)])
+        self.assertEqual(self.server.state['max_active'], web.HTTP_HOST_CONCURRENCY)
+
+    async def test_shared_client(self):
+        """多次请求复用同一个客户端"""
+        await web.fetch_text(f"{self.base_url}/slow/a")
+        client = web.http_client
+        await web.fetch_text(f"{self.base_url}/slow/b")
+        self.assertIs(web.http_client, client)
+
+    async def test_timeout_raises(self):
+        """超时抛出 httpx.TimeoutException"""
+        web.http_client = httpx.AsyncClient(timeout=0.2)
+        with self.assertRaises(httpx.TimeoutException):
+            await web.fetch_text(f"{self.base_url}/hang")
+
+    async def test_retry_then_success(self):
+        """5xx 按重试次数重试, 之后成功"""
+        self.assertEqual(await web.fetch_text(f"{self.base_url}/flaky/ok/2", retries=2), "ok")
+        self.assertEqual(self.server.state['hits']['ok'], 3)
+
+    async def test_retry_exhausted_raises(self):
+        """重试用尽后抛出 httpx.HTTPStatusError"""
+        with self.assertRaises(httpx.HTTPStatusError):
+            await web.fetch_text(f"{self.base_url}/flaky/fail/5", retries=1)
+        self.assertEqual(self.server.state['hits']['fail'], 2)
+
+    async def test_bytes_within_limit(self):
+        response, data = await web.fetch_bytes(f"{self.base_url}/chunked/3000", 3000)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data, b"x" * 3000)
+
+    async def test_bytes_content_length_too_large(self):
+        """Content-Length 超出上限时不读取响应体"""
+        with self.assertRaisesRegex(ValueError, "too large: 5000 bytes"):
+            await web.fetch_bytes(f"{self.base_url}/bytes/5000", 4096)
+
+    async def test_bytes_stream_too_large(self):
+        """无 Content-Length 时读取超过上限即中止"""
+        with self.assertRaisesRegex(ValueError, "too large: > 4096 bytes"):
+            await web.fetch_bytes(f"{self.base_url}/chunked/100000", 4096)
+
+    async def test_javbus_title(self):
+        expected = load_expected("javbus_ABC-123.json")
+        expected['websites'] = [f"{self.base_url}/javbus/ABC-123"]
+        self.assertEqual(await web.get_javbus_title("abc-123"), expected)
+
+    async def test_javbus_not_found(self):
+        self.assertIsNone(await web.get_javbus_title("XYZ-999"))
+
+    async def test_123av_title(self):
+        expected = load_expected("123av_FC2-PPV-1234567.json")
+        expected['websites'] = [f"{self.base_url}/123av/FC2-PPV-1234567"]
+        self.assertEqual(await web.get_123av_title("fc2-ppv-1234567"), expected)
+
+    async def test_title_connection_error(self):
+        """站点不可达时返回 None (不抛出)"""
+        web.JAVBUS_URL = "http://127.0.0.1:1/javbus/"
+        self.assertIsNone(await web.get_javbus_title("ABC-123"))
+
+
+if __name__ == "__main__":
+    unittest.main()
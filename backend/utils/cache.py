@@ -1,32 +1,90 @@
 import asyncio
 import json
-from builtins import anext
+import time
+import hashlib
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from loguru import logger
+from redis import asyncio as aioredis
 
-from utils.redis.init import get_redis
-from utils.redis.serialization_tools import is_json, get_dict_target_value
+from utils.redis.init import get_redis_client, get_redis_raw_client
+from utils.redis.serialization_tools import dumps_value, loads_value, get_dict_target_value
+from utils.workers import SHARED_STATE, read_generation, bump_generation
+from config import CACHE_ENABLE, CACHE_TTL, CACHE_LOCAL_SIZE, CACHE_RETRY
 
 
 @asynccontextmanager
 async def get_redis_connection():
-    _c = get_redis()
-    if _c is None:
-        raise RuntimeError("Unable to connect to Redis: _c")
-    cache = await anext(_c)
+    """复用应用级共享客户端 (连接池)"""
+    cache = await get_redis_client()
     if cache is None:
         raise RuntimeError("Unable to connect to Redis: cache")  # 请先安装redis以来
-    try:
-        yield cache
-    finally:
-        # 如果需要，这里可以添加连接清理代码
-        pass
+    yield cache
+
+
+@asynccontextmanager
+async def get_redis_raw_connection():
+    """二进制客户端: 值按 dumps_value/loads_value 序列化"""
+    cache = await get_redis_raw_client()
+    if cache is None:
+        raise RuntimeError("Unable to connect to Redis: cache")
+    yield cache
+
+
+SCAN_COUNT = 1000  # SCAN 每批键数 / 每个流水线命令数
+
+
+def is_cluster(cache) -> bool:
+    return isinstance(cache, aioredis.RedisCluster)
+
+
+async def scan_prefix(cache, prefix: str, count: int = SCAN_COUNT):
+    """
+    按前缀增量扫描键, 每次返回一批 (不使用 KEYS, 不阻塞服务端)
+    集群模式逐个主节点扫描
+    """
+    match = f"{prefix}*"
+    nodes = cache.get_primaries() if is_cluster(cache) else [None]
+    for node in nodes:
+        cursor = 0
+        while True:
+            if node is None:
+                cursor, keys = await cache.scan(cursor=cursor, match=match, count=count)
+            else:
+                cursors, keys = await cache.scan(cursor=cursor, match=match, count=count, target_nodes=node)
+                cursor = cursors[node.name]
+            if keys:
+                yield keys
+            if cursor == 0:
+                break
+
+
+def pipeline_unlink(cache, pipe, keys: list) -> None:
+    """UNLINK 后台释放内存; 集群中多键命令需同槽位, 按键逐个发送"""
+    if is_cluster(cache):
+        for key in keys:
+            pipe.unlink(key)
+    else:
+        pipe.unlink(*keys)
+
+
+def pipeline_expire(pipe, keys: list, ex=None, px=None, exat=None, pxat=None, **kwargs) -> None:
+    """按 set() 的过期参数设置 TTL, 无过期参数时移除 TTL"""
+    for key in keys:
+        if ex is not None:
+            pipe.expire(key, ex)
+        elif px is not None:
+            pipe.pexpire(key, px)
+        elif exat is not None:
+            pipe.expireat(key, exat)
+        elif pxat is not None:
+            pipe.pexpireat(key, pxat)
+        else:
+            pipe.persist(key)
 
 
 async def validate_key_and_data(cache, key: str):
-    """验证键值对是否存在且有效"""
-    if not await cache.exists(key):
-        return None
+    """验证键值对是否存在且有效 (一次 GET, 空值视为不存在)"""
     data = await cache.get(key)
     if not data:
         return None
@@ -39,7 +97,7 @@ async def redis_exists_key(key: str) -> bool:
     key : redis中的key 判断key是否存在，空视为不存在
     """
     try:
-        async with get_redis_connection() as cache:
+        async with get_redis_raw_connection() as cache:
             data = await validate_key_and_data(cache, key)
             if not data:
                 return False
@@ -55,10 +113,12 @@ async def redis_count_key(prefix: str) -> int:
     prefix : redis中的key的前缀
     """
     try:
+        count = 0
         async with get_redis_connection() as cache:
-            keys = await cache.keys(f"{prefix}*")
-            # print(f"count: {len(keys)}")
-            return len(keys)
+            async for keys in scan_prefix(cache, prefix):
+                count += len(keys)
+            # print(f"count: {count}")
+            return count
     except Exception as e:
         logger.error(f"redis_count_key Exception: {str(e)}")
         return 0
@@ -80,21 +140,19 @@ async def redis_count(key, amount=1):
 async def increment_redis_data(key: str, value_key: str = None, **kwargs) -> bool:
     """
     key : redis中的key
-    value_key : 如果是个json可直接查找json里的字段
+    value_key : 如果是个dict可直接查找dict里的字段
     """
     try:
-        async with get_redis_connection() as cache:
-            data = await validate_key_and_data(cache, key)
+        async with get_redis_raw_connection() as cache:
+            data = loads_value(await validate_key_and_data(cache, key))
             if not data:
                 return False
             # print(f"increment_redis_data key: {key} data: {data}")
-            if is_json(data):
-                data = json.loads(data)
+            if isinstance(data, dict):
                 if value_key and int(get_dict_target_value(data, value_key)) >= 0:
                     data['count'] += 1
-                    data_json = json.dumps(data)
-                    # print(f"increment_redis_data key: {key} data_json: {data_json}")
-                    await cache.set(key, data_json, **kwargs)
+                    # print(f"increment_redis_data key: {key} data: {data}")
+                    await cache.set(key, dumps_value(data), **kwargs)
             return True
     except Exception as e:
         logger.error(f"increment_redis_data Exception: {str(e)}")
@@ -105,18 +163,16 @@ async def increment_redis_data(key: str, value_key: str = None, **kwargs) -> boo
 async def get_redis_data(key: str, value_key: str = None):
     """
     key : redis中的key
-    value_key : 如果是个json可直接查找json里的字段
+    value_key : 如果是个dict可直接查找dict里的字段
     """
     try:
-        async with get_redis_connection() as cache:
-            data = await validate_key_and_data(cache, key)
+        async with get_redis_raw_connection() as cache:
+            data = loads_value(await validate_key_and_data(cache, key))
             if not data:
                 return None
             # print(f"get_redis_data {key} data: {data}")
-            if is_json(data):
-                data = json.loads(data)
-                if value_key:
-                    return get_dict_target_value(data, value_key)
+            if value_key and isinstance(data, dict):
+                return get_dict_target_value(data, value_key)
             return data
     except Exception as e:
         logger.error(f"get_redis_data Exception: {str(e)}")
@@ -130,16 +186,46 @@ async def set_redis_data(key: str, value=None, **kwargs):
     value : 要存的数据
     """
     try:
-        async with get_redis_connection() as cache:
-            if isinstance(value, dict):
-                value = json.dumps(value)
+        async with get_redis_raw_connection() as cache:
             # print(f"set_redis_data {key} value: {value}")
-            await cache.set(key, value, **kwargs)
+            await cache.set(key, dumps_value(value), **kwargs)
     except Exception as e:
         logger.error(f"set_redis_data Exception: {str(e)}")
         return None
 
 
+# 批量读取 (一次 MGET)
+async def cache_get_many(cache, keys: list) -> list:
+    """
+    按顺序返回反序列化后的值, 不存在为 None
+    集群模式按槽位拆分 MGET
+    """
+    if not keys:
+        return []
+    if is_cluster(cache):
+        values = await cache.mget_nonatomic(keys)
+    else:
+        values = await cache.mget(keys)
+    return [loads_value(value) for value in values]
+
+
+# 批量写入 (流水线 SET, 每 batch_size 条一次往返)
+async def cache_set_many(cache, key_value_pairs: dict, batch_size: int = SCAN_COUNT, **kwargs) -> None:
+    """
+    kwargs : set() 的过期参数, 如 ex=300
+    """
+    pipe = cache.pipeline(transaction=False)  # 设置transaction=False提高性能
+    pending_operations = 0
+    for key, value in key_value_pairs.items():
+        pipe.set(key, dumps_value(value), **kwargs)
+        pending_operations += 1
+        if pending_operations >= batch_size:
+            await pipe.execute()
+            pending_operations = 0
+    if pending_operations > 0:
+        await pipe.execute()  # 处理剩余操作
+
+
 # 批量获取多个键值数据
 async def batch_get_redis_data(keys: list, value_key: str = None):
     """批量获取多个键值数据"""
@@ -147,20 +233,15 @@ async def batch_get_redis_data(keys: list, value_key: str = None):
     try:
         if len(keys) == 0:
             return results
-        async with get_redis_connection() as cache:
-            for key in keys:
-                data = await validate_key_and_data(cache, key)
-                if not data:
-                    results[key] = None
-                    continue
-                if is_json(data):
-                    data = json.loads(data)
-                    if value_key:
-                        results[key] = get_dict_target_value(data, value_key)
-                    else:
-                        results[key] = data
-                else:
-                    results[key] = data
+        async with get_redis_raw_connection() as cache:
+            values = await cache_get_many(cache, keys)
+        for key, data in zip(keys, values):
+            if not data:
+                results[key] = None
+            elif value_key and isinstance(data, dict):
+                results[key] = get_dict_target_value(data, value_key)
+            else:
+                results[key] = data
     except Exception as e:
         logger.error(f"batch_get_redis_data Exception: {str(e)}")
     return results
@@ -172,26 +253,8 @@ async def batch_set_redis_data(key_value_pairs: dict, batch_size: int = 1000, **
     try:
         if len(key_value_pairs) == 0:
             return key_value_pairs
-        async with get_redis_connection() as cache:
-            pipe = cache.pipeline(transaction=False)  # 设置transaction=False提高性能
-            pending_operations = 0
-
-            async def execute_batch():
-                nonlocal pending_operations
-                if pending_operations > 0:
-                    await pipe.execute()
-                    pending_operations = 0
-
-            for key, value in key_value_pairs.items():
-                if isinstance(value, dict):
-                    value = json.dumps(value)
-                pipe.set(key, value, **kwargs)
-                pending_operations += 1
-
-                if pending_operations >= batch_size:
-                    await execute_batch()
-
-            await execute_batch()  # 处理剩余操作
+        async with get_redis_raw_connection() as cache:
+            await cache_set_many(cache, key_value_pairs, batch_size, **kwargs)
     except Exception as e:
         logger.error(f"batch_set_redis_data Exception: {str(e)}")
         return None
@@ -217,12 +280,11 @@ async def set_redis_ttl(key: str, **kwargs) -> bool:
     """
     try:
         async with get_redis_connection() as cache:
-            data = await validate_key_and_data(cache, key)
-            if not data:
-                return False
-            value = await cache.get(key)
-            await cache.set(key, value, **kwargs)
-            return True
+            # 直接 EXPIRE, 不读取/重写值
+            pipe = cache.pipeline(transaction=False)
+            pipeline_expire(pipe, [key], **kwargs)
+            result = await pipe.execute()
+            return bool(result[0])
     except Exception as e:
         logger.error(f"set_redis_ttl Exception: {str(e)}")
         return False
@@ -235,16 +297,11 @@ async def batch_set_redis_ttl(prefix: str, **kwargs) -> bool:
     """
     try:
         async with get_redis_connection() as cache:
-            pipe = cache.pipeline(transaction=False)  # 设置transaction=False提高性能
-            cursor = b'0'
-            while cursor:
-                cursor, keys = await cache.scan(cursor=cursor, match=f"{prefix}*", count=1000)
-                if keys:
-                    values = await cache.mget(keys)
-                    for key, value in zip(keys, values):
-                        if value:
-                            pipe.set(key, value, **kwargs)
-            await pipe.execute()
+            # 每批 SCAN 结果一次流水线 EXPIRE, 不读取/重写值
+            async for keys in scan_prefix(cache, prefix):
+                pipe = cache.pipeline(transaction=False)  # 设置transaction=False提高性能
+                pipeline_expire(pipe, keys, **kwargs)
+                await pipe.execute()
             return True
     except Exception as e:
         logger.error(f"batch_set_redis_ttl Exception: {str(e)}")
@@ -257,7 +314,7 @@ async def del_redis_data(key: str) -> bool:
     key : redis中的key
     """
     try:
-        async with get_redis_connection() as cache:
+        async with get_redis_raw_connection() as cache:
             data = await validate_key_and_data(cache, key)
             if not data:
                 return False
@@ -275,10 +332,10 @@ async def batch_del_redis_data(prefix: str) -> bool:
     """
     try:
         async with get_redis_connection() as cache:
-            pipe = cache.pipeline(transaction=False)  # 设置transaction=False提高性能
-            keys = await cache.keys(f"{prefix}*")
-            if keys:
-                pipe.delete(*keys)
+            # 每批 SCAN 结果一次流水线 UNLINK
+            async for keys in scan_prefix(cache, prefix):
+                pipe = cache.pipeline(transaction=False)  # 设置transaction=False提高性能
+                pipeline_unlink(cache, pipe, keys)
                 await pipe.execute()
             return True
     except Exception as e:
@@ -286,5 +343,159 @@ async def batch_del_redis_data(prefix: str) -> bool:
         return False
 
 
+
+# ------------------------------------------------------------------------
+# 查询缓存: 读穿透 + 按表版本号失效
+#  - 键: cache:{namespace}:{表版本号}:{参数哈希}
+#  - 写接口调用 invalidate_cache(表) 递增版本号, 旧键随 TTL 过期
+#    表名之外可用子键 (如 dav_local.phash) 只失效依赖某一列的缓存
+#  - Redis 不可用时使用进程内 LRU, CACHE_RETRY 秒后重试 Redis
+#    多 worker 时版本号记录在 RUN_PATH (utils/workers.py), 任一 worker 的写入使所有 worker 的本地缓存失效
+# ------------------------------------------------------------------------
+CACHE_PREFIX = "cache"
+cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "fallbacks": 0}
+
+
+class LocalCache:
+    """进程内 LRU (带过期时间)"""
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()  # key -> (expire_at, value)
+
+    def get(self, key: str):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        expire_at, value = item
+        if expire_at < time.monotonic():
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ex: int) -> None:
+        self.data[key] = (time.monotonic() + ex, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self) -> None:
+        self.data.clear()
+
+
+local_cache = LocalCache(CACHE_LOCAL_SIZE)
+local_generations = {}  # 表 -> 版本号
+redis_retry_at = 0.0  # Redis 不可用时, 下次重试时间
+pending_tables = set()  # Redis 不可用期间失效的表, 恢复后补递增版本号
+
+
+def redis_available() -> bool:
+    return time.monotonic() >= redis_retry_at
+
+def mark_redis_down(e: Exception) -> None:
+    global redis_retry_at
+    redis_retry_at = time.monotonic() + CACHE_RETRY
+    cache_stats["fallbacks"] += 1
+    logger.warning(f"Redis unavailable, using local cache for {CACHE_RETRY}s: {str(e)}")
+
+async def bump_generations(cache, tables) -> None:
+    """递增 Redis 中的表版本号"""
+    pipe = cache.pipeline(transaction=False)
+    for table in tables:
+        pipe.incr(f"{CACHE_PREFIX}:gen:{table}")
+    await pipe.execute()
+
+async def get_generations(cache, tables: tuple) -> list:
+    """获取表版本号"""
+    if cache is None:
+        if SHARED_STATE:
+            return [read_generation(table) for table in tables]
+        return [local_generations.get(table, 0) for table in tables]
+    values = await cache.mget([f"{CACHE_PREFIX}:gen:{table}" for table in tables])
+    return [int(value or 0) for value in values]
+
+def build_cache_key(namespace: str, generations: list, params: tuple) -> str:
+    digest = hashlib.sha1(json.dumps(params, ensure_ascii=False, default=str).encode()).hexdigest()[:20]
+    return f"{CACHE_PREFIX}:{namespace}:{'.'.join(str(g) for g in generations)}:{digest}"
+
+async def cached_query(namespace: str, tables: tuple, params: tuple, loader, ttl: int = CACHE_TTL):
+    """
+    读穿透缓存
+    namespace : 缓存类别 (page/count/video...)
+    tables : 结果依赖的表, 任一表失效则缓存失效
+    params : 查询参数 (query/mode/page...)
+    loader : 未命中时执行的协程函数, 返回值需可 JSON 序列化
+    """
+    if not CACHE_ENABLE:
+        return await loader()
+
+    if redis_available():
+        try:
+            async with get_redis_raw_connection() as cache:
+                if pending_tables:
+                    tables_pending = set(pending_tables)
+                    await bump_generations(cache, tables_pending)
+                    pending_tables.difference_update(tables_pending)
+                generations = await get_generations(cache, tables)
+                key = build_cache_key(namespace, generations, params)
+                data = await cache.get(key)
+        except Exception as e:
+            mark_redis_down(e)
+        else:
+            if data is not None:
+                cache_stats["hits"] += 1
+                return loads_value(data)
+            cache_stats["misses"] += 1
+            value = await loader()  # 查询异常直接抛出, 不视为 Redis 故障
+            try:
+                async with get_redis_raw_connection() as cache:
+                    await cache.set(key, dumps_value(value), ex=ttl)
+            except Exception as e:
+                mark_redis_down(e)
+            return value
+
+    # 本地 LRU: 存序列化后的值, 每次返回新对象, 调用方修改不影响缓存
+    key = build_cache_key(namespace, await get_generations(None, tables), params)
+    data = local_cache.get(key)
+    if data is not None:
+        cache_stats["hits"] += 1
+        return loads_value(data)
+    cache_stats["misses"] += 1
+    value = await loader()
+    local_cache.set(key, dumps_value(value), ex=ttl)
+    return value
+
+async def invalidate_cache(*tables: str) -> None:
+    """写接口调用: 递增表版本号, 使依赖这些表的缓存失效"""
+    if not CACHE_ENABLE:
+        return
+    cache_stats["invalidations"] += 1
+    for table in tables:
+        local_generations[table] = local_generations.get(table, 0) + 1
+        if SHARED_STATE:
+            bump_generation(table)
+    pending_tables.update(tables)
+    if redis_available():
+        try:
+            tables_pending = set(pending_tables)
+            async with get_redis_connection() as cache:
+                await bump_generations(cache, tables_pending)
+            pending_tables.difference_update(tables_pending)
+        except Exception as e:
+            mark_redis_down(e)
+    logger.debug(f"Cache invalidated: {tables}")
+
+def get_cache_stats() -> dict:
+    """命中/未命中/失效计数"""
+    total = cache_stats["hits"] + cache_stats["misses"]
+    return {
+        **cache_stats,
+        "hit_rate": round(cache_stats["hits"] / total, 4) if total else 0,
+        "backend": "redis" if redis_available() else "local",
+        "local_size": len(local_cache.data),
+        "generations": dict(local_generations),
+    }
+
+
 if __name__ == '__main__':
     asyncio.run(get_redis_data('sys:settings'))
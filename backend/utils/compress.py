@@ -0,0 +1,198 @@
+# -*- coding: UTF8 -*-
+import os
+import gzip
+import stat
+import zlib
+import anyio
+from loguru import logger
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli  # 可选: 预压缩 .br
+    BROTLI_ENABLE = True
+except ImportError:
+    BROTLI_ENABLE = False
+
+"""
+响应压缩
+ - CompressMiddleware: 只压缩文本类型 (HTML/JSON/CSS/JS...), 视频/图片等已压缩的媒体、206 分段响应、
+   带 Range 的请求、已设置 Content-Encoding 的响应 (预压缩静态文件) 原样透传
+ - PrecompressedStaticFiles: 静态文件存在 .br / .gz 预压缩版本 (不旧于源文件) 时按 Accept-Encoding 直接返回
+ - precompress_static(): 启动时 (或构建时 python utils/compress.py) 生成预压缩文件, 源文件未变化时跳过
+"""
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/x-javascript", "application/xml", "application/manifest+json")
+PRECOMPRESS_EXTENSIONS = (".html", ".css", ".js", ".map", ".json", ".svg", ".txt", ".xml", ".ttf", ".eot")
+PRECOMPRESS_MIN_SIZE = 1024
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))  # 按优先级
+
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    """文本类型的完整响应"""
+    if status < 200 or status in (204, 206, 304) or "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+class CompressResponder:
+    """单个响应: 首个 body 到达后决定是否压缩 (gzip)"""
+    def __init__(self, app, minimum_size: int, compresslevel: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.send = None
+        self.initial_message = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def __call__(self, scope, receive, send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.initial_message = message
+            self.passthrough = not is_compressible(message["status"], Headers(raw=message["headers"]))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if len(body) < self.minimum_size and not more_body:
+                # 小响应不压缩
+                await self.send(self.initial_message)
+                await self.send(message)
+                self.passthrough = True
+                return
+            self.compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip 格式
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = "gzip"
+            headers.add_vary_header("Accept-Encoding")
+            data = self.compressor.compress(body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                data += self.compressor.flush()
+                headers["Content-Length"] = str(len(data))
+            await self.send(self.initial_message)
+        else:
+            data = self.compressor.compress(body)
+            if not more_body:
+                data += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+
+class CompressMiddleware:
+    """替代 GZipMiddleware: 只压缩文本类型"""
+    def __init__(self, app, minimum_size: int = 1000, compresslevel: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if "range" not in headers and "gzip" in headers.get("accept-encoding", ""):
+                await CompressResponder(self.app, self.minimum_size, self.compresslevel)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """优先返回预压缩文件 (Content-Encoding: br / gzip)"""
+    async def get_response(self, path: str, scope):
+        headers = Headers(scope=scope)
+        accept = headers.get("accept-encoding", "")
+        if "range" not in headers and path.endswith(PRECOMPRESS_EXTENSIONS):
+            for encoding, suffix in PRECOMPRESSED:
+                if encoding not in accept:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                    continue
+                _, source_stat = await anyio.to_thread.run_sync(self.lookup_path, path)
+                if source_stat is None or source_stat.st_mtime > stat_result.st_mtime:
+                    continue  # 源文件已更新, 预压缩文件过期
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["Content-Encoding"] = encoding
+                response.headers.add_vary_header("Accept-Encoding")
+                return response
+        response = await super().get_response(path, scope)
+        if path.endswith(PRECOMPRESS_EXTENSIONS):
+            response.headers.add_vary_header("Accept-Encoding")
+        return response
+
+
+def write_variant(path: str, data: bytes, mtime: float) -> None:
+    """原子写入预压缩文件, 修改时间与源文件一致"""
+    temp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.utime(temp, (mtime, mtime))
+        os.replace(temp, path)
+    except OSError:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+def precompress_file(source: str, encoders: list) -> int:
+    """为单个文件生成预压缩版本, return 生成的文件数"""
+    source_stat = os.stat(source)
+    if source_stat.st_size < PRECOMPRESS_MIN_SIZE:
+        return 0
+    written = 0
+    data = None
+    for suffix, encode in encoders:
+        target = source + suffix
+        if os.path.exists(target) and os.stat(target).st_mtime >= source_stat.st_mtime:
+            continue
+        if data is None:
+            with open(source, 'rb') as f:
+                data = f.read()
+        compressed = encode(data)
+        if len(compressed) >= len(data) * 0.9:
+            continue
+        write_variant(target, compressed, source_stat.st_mtime)
+        written += 1
+    return written
+
+def precompress_static(directory: str) -> int:
+    """
+    为静态目录下的文本文件生成 .gz (及 .br, 需安装 brotli)
+    压缩后不小于源文件 90% 的跳过; 预压缩文件不旧于源文件时不重复生成
+    无法读写的文件 (如只读部署) 记录警告后跳过
+    return 生成的文件数
+    """
+    encoders = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if BROTLI_ENABLE:
+        encoders.append((".br", lambda data: brotli.compress(data, quality=11)))
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            try:
+                written += precompress_file(source, encoders)
+            except OSError as e:
+                # 只读部署等无法写入时跳过, 不影响启动 (直接返回源文件)
+                logger.warning(f"Static precompress skipped: {source} - {str(e)}")
+    logger.info(f"Static precompressed: {directory} - {written} files (brotli: {BROTLI_ENABLE})")
+    return written
+
+
+if __name__ == '__main__':
+    # 构建时生成: python backend/utils/compress.py [目录]
+    import sys
+    precompress_static(sys.argv[1] if len(sys.argv) > 1 else "./frontend/static")
@@ -1,8 +1,12 @@
 import os
 import re
 import urllib
+import asyncio
+import functools
+import contextvars
 import aiosqlite
 import aiomysql
+from pymysql.constants import CLIENT
 import datetime
 from datetime import datetime as dt
 from decimal import Decimal
@@ -12,6 +16,7 @@ from typing import AsyncGenerator
 from loguru import logger
 
 from config import BASE_DIR, DB_ENGINE, SQLITE_URL, MYSQL_URL, DB_MAXCONNECT
+from config import SQLITE_READERS, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE, SQLITE_STATEMENT_CACHE, DB_FETCH_BATCH
 
 class Database(ABC):
     """数据库抽象基类"""
@@ -19,6 +24,7 @@ class Database(ABC):
         self.url = url
         self.pool = None
         self.is_connected = False
+        self.write_lock = None
 
     @abstractmethod
     async def connect(self) -> None:
@@ -30,7 +36,7 @@ class Database(ABC):
 
     @abstractmethod
     @asynccontextmanager
-    async def get_connection(self) -> AsyncGenerator:
+    async def get_connection(self, readonly: bool = False) -> AsyncGenerator:
         pass
 
     async def health_check(self) -> bool:
@@ -47,7 +53,7 @@ class Database(ABC):
             return False
 
 class SQLiteDatabase(Database):
-    """SQLite数据库实现"""
+    """SQLite数据库实现: 单写连接 + 只读连接池 (WAL)"""
     def __init__(self, url: str):
         super().__init__(url)
         db_path = url.split("://")[1]
@@ -55,6 +61,10 @@ class SQLiteDatabase(Database):
             self.url = os.path.join(BASE_DIR, db_path.replace('./', ''))
         else:
             self.url = db_path
+        self.readers = None
+        self.reader_connections = []
+        self.max_readers = max(0, SQLITE_READERS)
+        self.write_lock = asyncio.Lock()  # 写连接共享, 事务串行
         logger.info(f"SQLite URL: {self.url}")
 
     async def connect(self) -> None:
@@ -64,17 +74,39 @@ class SQLiteDatabase(Database):
             if not os.path.exists(self.url):
                 await self._initialize_database()
             
-            # 创建连接池
-            self.pool = await aiosqlite.connect(self.url, uri=True, check_same_thread=False)
+            # 写连接
+            self.pool = await self._open_connection()
             if self.pool:
                 self.is_connected = True
                 logger.info(f"Connected to SQLite database: {self.url}")
                 # 检查并创建表
                 await self.create_tables()
+                # 只读连接池
+                self.readers = asyncio.Queue()
+                for _ in range(self.max_readers):
+                    conn = await self._open_connection(readonly=True)
+                    self.reader_connections.append(conn)
+                    self.readers.put_nowait(conn)
+                logger.info(f"SQLite reader pool: {self.max_readers}")
         except Exception as e:
             logger.error(f"Failed to connect to SQLite database: {e}")
             raise RuntimeError(f"Failed to connect to SQLite database: {str(e)}") from e
 
+    async def _open_connection(self, readonly: bool = False) -> aiosqlite.Connection:
+        """打开连接并设置 PRAGMA"""
+        conn = await aiosqlite.connect(self.url, uri=True, check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE)
+        conn.row_factory = aiosqlite.Row  # 支持按字段名/下标访问
+        if not readonly:
+            await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        await conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        await conn.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        await conn.execute("PRAGMA busy_timeout=5000")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            await conn.execute("PRAGMA query_only=1")
+        return conn
+
     async def _initialize_database(self) -> None:
         """初始化新的数据库文件"""
         conn = await aiosqlite.connect(self.url, uri=True)
@@ -195,7 +227,30 @@ class SQLiteDatabase(Database):
                     created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
                     updated_time DATETIME DEFAULT NULL
                 )""")
-            
+
+            # 创建表 dav_actor / dav_genre / dav_studio
+            for table in ('dav_actor', 'dav_genre', 'dav_studio'):
+                await conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name         TEXT     NOT NULL,
+                        created_time DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )""")
+                await conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_name ON {table} (name)")
+
+            # 创建关联表 dav_web_actor / dav_web_genre / dav_web_studio
+            for table, field in (('dav_web_actor', 'actor_id'), ('dav_web_genre', 'genre_id'), ('dav_web_studio', 'studio_id')):
+                await conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        code         TEXT     NOT NULL,
+                        {field}      INTEGER  NOT NULL,
+                        PRIMARY KEY (code, {field})
+                    )""")
+                await conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{field} ON {table} ({field}, code)")
+
+            # 按识别码关联 dav_local
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_dav_local_code ON dav_local (code)")
+
             if should_commit:
                 await conn.commit()
         except Exception as e:
@@ -208,24 +263,36 @@ class SQLiteDatabase(Database):
                 await conn.close()
 
     async def disconnect(self) -> None:
+        for conn in self.reader_connections:
+            await conn.close()
+        self.reader_connections = []
+        self.readers = None
         if self.pool:
+            await self.pool.commit()  # 关闭前提交未完成的写入
             await self.pool.close()
             self.is_connected = False
             logger.info("Disconnected from SQLite database")
 
     @asynccontextmanager
-    async def get_connection(self) -> AsyncGenerator[aiosqlite.Connection, None]:
+    async def get_connection(self, readonly: bool = False) -> AsyncGenerator[aiosqlite.Connection, None]:
         if not self.is_connected:
             await self.connect()
         if not self.pool:
             logger.error("Failed to establish database connection")
             raise RuntimeError("Failed to establish database connection")
         
+        # 只读请求从连接池取连接, 写请求统一走写连接
+        conn = None
+        if readonly and self.readers is not None and self.max_readers > 0:
+            conn = await self.readers.get()
         try:
-            yield self.pool
+            yield conn or self.pool
         except Exception as e:
             logger.error(f"Error during database operation: {e}")
             raise RuntimeError(f"Error during database operation: {str(e)}") from e
+        finally:
+            if conn is not None and self.readers is not None:
+                self.readers.put_nowait(conn)
 
 class MySQLDatabase(Database):
     """MySQL数据库实现"""
@@ -250,7 +317,9 @@ class MySQLDatabase(Database):
                 user=self.username,
                 password=self.password,
                 db=self.db,
-                maxsize=self.max_connection
+                maxsize=self.max_connection,
+                cursorclass=aiomysql.DictCursor,
+                client_flag=CLIENT.FOUND_ROWS  # rowcount 为匹配行数 (任务认领/续约依赖)
             )
             
             # 创建连接池
@@ -277,7 +346,9 @@ class MySQLDatabase(Database):
                         password=self.password,
                         db=self.db,
                         minsize=1,
-                        maxsize=self.max_connection
+                        maxsize=self.max_connection,
+                        cursorclass=aiomysql.DictCursor,
+                        client_flag=CLIENT.FOUND_ROWS
                     )
                     if self.pool:
                         self.is_connected = True
@@ -432,7 +503,30 @@ class MySQLDatabase(Database):
                                 PRIMARY KEY (`id`)  USING BTREE
                             ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
                         """)
-                    
+
+                    # 创建表 dav_actor / dav_genre / dav_studio
+                    for table, comment in (('dav_actor', '演员'), ('dav_genre', '类别'), ('dav_studio', '发行商')):
+                        await cursor.execute(f"""
+                                CREATE TABLE IF NOT EXISTS {table} (
+                                    `id`                    int           NOT NULL AUTO_INCREMENT COMMENT 'id',
+                                    `name`                  varchar(128)  NOT NULL      COMMENT '{comment}',
+                                    `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
+                                    PRIMARY KEY (`id`)  USING BTREE,
+                                    UNIQUE INDEX idx_{table}_name (`name`)
+                                ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+                            """)
+
+                    # 创建关联表 dav_web_actor / dav_web_genre / dav_web_studio
+                    for table, field in (('dav_web_actor', 'actor_id'), ('dav_web_genre', 'genre_id'), ('dav_web_studio', 'studio_id')):
+                        await cursor.execute(f"""
+                                CREATE TABLE IF NOT EXISTS {table} (
+                                    `code`                  varchar(48)   NOT NULL      COMMENT '识别码',
+                                    `{field}`               int           NOT NULL      COMMENT 'id',
+                                    PRIMARY KEY (`code`, `{field}`)  USING BTREE,
+                                    INDEX idx_{table}_{field} (`{field}`, `code`)
+                                ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+                            """)
+
                     await conn.commit()
         except aiomysql.Error as e:
             logger.error(f"Failed to create tables in MySQL: {e}")
@@ -446,7 +540,7 @@ class MySQLDatabase(Database):
             logger.info("Disconnected from MySQL database")
 
     @asynccontextmanager
-    async def get_connection(self) -> AsyncGenerator[aiomysql.Connection, None]:
+    async def get_connection(self, readonly: bool = False) -> AsyncGenerator[aiomysql.Connection, None]:
         if not self.is_connected:
             await self.connect()
         if not self.pool:
@@ -485,6 +579,19 @@ async def get_db() -> AsyncGenerator:
         logger.error(f"Failed to get_db: {str(e)} | Engine: {DB_ENGINE} | URL: {database.url}")
         raise RuntimeError(f"Failed to get_db: {str(e)}") from e
 
+async def get_db_read() -> AsyncGenerator:
+    """只读游标: SQLite 走只读连接池, MySQL 与 get_db 相同"""
+    try:
+        async with database.get_connection(readonly=True) as conn:
+            cursor = await conn.cursor()
+            try:
+                yield cursor
+            finally:
+                await cursor.close()
+    except Exception as e:
+        logger.error(f"Failed to get_db_read: {str(e)} | Engine: {DB_ENGINE} | URL: {database.url}")
+        raise RuntimeError(f"Failed to get_db_read: {str(e)}") from e
+
 @asynccontextmanager
 async def get_db_app():
     try:
@@ -495,35 +602,252 @@ async def get_db_app():
         logger.error(f"Failed to get_db_app: {str(e)} | Engine: {DB_ENGINE} | URL: {database.url}")
         raise RuntimeError(f"Failed to get_db_app: {str(e)}") from e
 
-def format_query_for_db(query: str) -> str:
-    """根据数据库类型格式化查询语句"""
+def write_connection(cursor):
+    """
+    游标所在的写连接
+    SQLite: 写操作只走 database.pool (单写连接), MySQL: aiomysql 游标的 connection
+    """
     if DB_ENGINE == "sqlite":
+        return database.pool
+    return cursor.connection
+
+async def commit(cursor) -> None:
+    """提交游标所在连接的事务"""
+    await write_connection(cursor).commit()
+
+async def rollback(cursor) -> None:
+    """回滚游标所在连接的事务"""
+    await write_connection(cursor).rollback()
+
+# 当前任务所在的事务 (task, cursor), 嵌套调用时加入外层事务
+tx_owner = contextvars.ContextVar('tx_owner', default=None)
+
+@asynccontextmanager
+async def transaction(cursor=None):
+    """
+    事务: 块内的写操作只提交一次, 异常时回滚
+    cursor 为空时使用写连接
+    同一任务内嵌套调用 (同一写连接) 加入外层事务: 不再加写锁, 由外层提交/回滚
+    """
+    owner = tx_owner.get()
+    if owner is not None and owner[0] is asyncio.current_task():
+        outer_cursor = owner[1]
+        if cursor is None or write_connection(cursor) is write_connection(outer_cursor):
+            yield cursor or outer_cursor
+            return
+    if cursor is None:
+        async with get_db_app() as app_cursor:
+            async with transaction(app_cursor) as tx_cursor:
+                yield tx_cursor
+        return
+    lock = database.write_lock
+    if lock is not None:
+        await lock.acquire()
+    token = tx_owner.set((asyncio.current_task(), cursor))
+    try:
+        yield cursor
+        await commit(cursor)
+    except BaseException:
+        await rollback(cursor)
+        raise
+    finally:
+        tx_owner.reset(token)
+        if lock is not None:
+            lock.release()
+
+class WriteBuffer:
+    """
+    高频计数写缓冲
+    合并 `count=count+N` 更新, 定时批量提交, 关闭时全部刷新
+    """
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.pending = {}  # (table, field, key_field, key) -> amount
+        self.task = None
+
+    def incr(self, table: str, key_field: str, key, field: str = 'count', amount: int = 1) -> None:
+        index = (table, field, key_field, key)
+        self.pending[index] = self.pending.get(index, 0) + amount
+
+    async def flush(self) -> int:
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+        groups = {}
+        for (table, field, key_field, key), amount in pending.items():
+            groups.setdefault((table, field, key_field), []).append((amount, key))
+        try:
+            async with transaction() as cursor:
+                for (table, field, key_field), values in groups.items():
+                    update_query = f"UPDATE {table} SET {field}=({field}+%s) WHERE `{key_field}`=%s"
+                    update_query = format_query_for_db(update_query)
+                    await cursor.executemany(update_query, values)
+        except Exception as e:
+            # 写入失败, 放回缓冲等待下次刷新
+            for index, amount in pending.items():
+                self.pending[index] = self.pending.get(index, 0) + amount
+            logger.error(f"WriteBuffer flush failed: {e}")
+            return 0
+        logger.debug(f"WriteBuffer flushed: {len(pending)}")
+        return len(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        count = await self.flush()
+        if self.pending:
+            logger.error(f"WriteBuffer not flushed: {len(self.pending)}")
+        else:
+            logger.info(f"WriteBuffer flushed on shutdown: {count}")
+write_buffer = WriteBuffer()
+
+# 方言转换正则 (预编译)
+UNIX_TIMESTAMP_PATTERN = re.compile(r'unix_timestamp\(([^)]+)\)')
+COLLATE_PATTERN = re.compile(r'\bCOLLATE\s+utf8mb4_general_ci\b', flags=re.IGNORECASE)
+GLOB_PATTERN = re.compile(r"\bGLOB\s+'((?:[^']|'')*)'", flags=re.IGNORECASE)
+
+def glob_to_regexp(pattern: str) -> str:
+    """GLOB 通配 转 REGEXP: * -> .*  ? -> .  [...] 原样"""
+    regexp = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '*':
+            regexp.append('.*')
+        elif char == '?':
+            regexp.append('.')
+        elif char == '[':
+            end = pattern.find(']', index + 1)
+            if end < 0:
+                regexp.append(re.escape(char))
+            else:
+                regexp.append(pattern[index:end + 1])
+                index = end
+        else:
+            regexp.append(re.escape(char))
+        index += 1
+    return '^' + ''.join(regexp) + '$'
+
+@functools.lru_cache(maxsize=1024)
+def compile_query(query: str, engine: str) -> str:
+    """按数据库类型转换语句, 每个模板每种引擎只转换一次"""
+    if engine == "sqlite":
         # 将 %s 替换为 ?
         query = query.replace('%s', '?')
         query = query.replace('NOW()', 'CURRENT_TIMESTAMP')
-        
         # 处理 unix_timestamp 语法
-        # query = re.sub(r'unix_timestamp\(([^)]+)\)', r'strftime(\1)', query)
-        query = re.sub(r'unix_timestamp\(([^)]+)\)', r'strftime(\'%s\', \1)', query)
-        
+        query = UNIX_TIMESTAMP_PATTERN.sub(r"strftime('%s', \1)", query)
         # 处理 COLLATE utf8mb4_general_ci 语法
-        query = re.sub(r'\bCOLLATE\s+utf8mb4_general_ci\b', 'COLLATE NOCASE', query, flags=re.IGNORECASE)
-        # query = re.sub(r'([a-zA-Z_][a-zA-Z0-9_]*)\s+COLLATE\s+utf8mb4_general_ci\s+=\s+(%s)', r'LOWER(\1) = LOWER(\2)', query, flags=re.IGNORECASE)
-        
-        return query
+        query = COLLATE_PATTERN.sub('COLLATE NOCASE', query)
+        # 反引号 / LIMIT m,n / GLOB SQLite 原生支持
     else:  # MySQL
-        return query
+        # GLOB 转 REGEXP
+        query = GLOB_PATTERN.sub(lambda match: "REGEXP '{}'".format(glob_to_regexp(match.group(1)).replace('\\', '\\\\')), query)
+    return query
+
+def format_query_for_db(query: str) -> str:
+    """根据数据库类型格式化查询语句 (带缓存)"""
+    return compile_query(query, DB_ENGINE)
+
+# 结果映射: 每种结果集只生成一次 字段名 + 转换计划
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+MYSQL_DATETIME_TYPES = {7, 10, 12}  # TIMESTAMP / DATE / DATETIME
+MYSQL_DECIMAL_TYPES = {0, 246}  # DECIMAL / NEWDECIMAL
+
+def format_datetime_value(value):
+    return value.strftime(DATETIME_FORMAT)
+
+@functools.lru_cache(maxsize=256)
+def row_plan(cursor_description: tuple) -> tuple:
+    """
+    按 cursor.description 生成 (字段名, 转换计划)
+    SQLite 返回文本日期无需转换; MySQL 按字段类型转换 datetime/Decimal
+    """
+    columns = tuple(desc[0] for desc in cursor_description)
+    converters = []
+    for desc in cursor_description:
+        type_code = desc[1]
+        if type_code in MYSQL_DATETIME_TYPES:
+            converters.append((desc[0], format_datetime_value))
+        elif type_code in MYSQL_DECIMAL_TYPES:
+            converters.append((desc[0], float))
+    return columns, tuple(converters)
+
+def map_rows(rows, cursor_description) -> list:
+    """批量转换字典并格式化 datetime/Decimal 字段, 单次遍历"""
+    if not rows:
+        return []
+    columns, converters = row_plan(tuple(cursor_description))
+    if isinstance(rows[0], dict):  # MySQL DictCursor
+        results = rows
+    else:  # aiosqlite.Row / tuple
+        results = [dict(zip(columns, row)) for row in rows]
+    if converters:
+        for result in results:
+            for column, converter in converters:
+                value = result[column]
+                if value is not None:
+                    result[column] = converter(value)
+    return results
+
+async def fetchall_dict(cursor) -> list:
+    """fetchall 并转换为字典列表"""
+    rows = await cursor.fetchall()
+    return map_rows(rows, cursor.description)
+
+async def fetchone_dict(cursor):
+    """fetchone 并转换为字典"""
+    row = await cursor.fetchone()
+    if row is None:
+        return None
+    return map_rows([row], cursor.description)[0]
+
+async def stream_rows(query: str, values: tuple = (), batch_size: int = DB_FETCH_BATCH) -> AsyncGenerator[list, None]:
+    """
+    流式读取: 按批 yield 字典列表, 内存占用与结果集大小无关
+    SQLite 只读连接 fetchmany, MySQL 服务端游标 SSDictCursor
+    """
+    query = format_query_for_db(query)
+    async with database.get_connection(readonly=True) as conn:
+        if DB_ENGINE == "sqlite":
+            cursor = await conn.cursor()
+        else:
+            cursor = await conn.cursor(aiomysql.SSDictCursor)
+        try:
+            await cursor.execute(query, values)
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield map_rows(rows, cursor.description)
+        finally:
+            await cursor.close()  # SSCursor 关闭时读完剩余结果, 连接可复用
 
 def convert_row_to_dict(row, cursor_description=None):
     """将数据库查询结果行转换为字典"""
     if row is None:
         return None
     
-    if isinstance(row, tuple) and cursor_description:
-        return dict(zip([desc[0] for desc in cursor_description], row))
-    elif hasattr(row, 'items'):  # 字典类型
-        return dict(row)
-    elif hasattr(row, 'keys'):  # 映射类型
+    if isinstance(row, dict):  # MySQL DictCursor
+        return row
+    if cursor_description:
+        columns, _ = row_plan(tuple(cursor_description))
+        return dict(zip(columns, row))
+    elif hasattr(row, 'keys'):  # aiosqlite.Row
         return dict(row)
     return row
 
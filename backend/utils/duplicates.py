@@ -0,0 +1,123 @@
+# -*- coding: UTF8 -*-
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+from utils.db import transaction, format_query_for_db, fetchone_dict, fetchall_dict, stream_rows
+from utils.missions import BackgroundMission
+from utils.cache import cached_query, invalidate_cache
+from utils.local import PHASH_UPDATE_QUERY, PHASH_CACHE_TABLE
+from utils.phash import file_phash, to_db_phash, find_duplicate_clusters
+
+"""
+近似重复检测
+ - 感知哈希任务 (任务类型 7): 按 id 顺序为 phash 为 NULL 的记录计算感知哈希, 断点续传
+   批量生成缩略图时已顺带计算 (共用解码), 任务只补算其余记录
+ - 重复组: 读取全部 phash 到 NumPy 数组做多索引汉明距离查找, 结果按 dav_local 及 phash 版本缓存
+"""
+
+MISSION_TYPE_PHASH = 7
+PHASH_BATCH = 50
+
+PHASH_COUNT_QUERY = format_query_for_db("SELECT count(*) as len FROM dav_local WHERE status=0 and phash is NULL and id > %s")
+PHASH_ROWS_QUERY = format_query_for_db("SELECT id,path,file FROM dav_local WHERE status=0 and phash is NULL and id > %s ORDER BY id ASC LIMIT %s")
+PHASH_INDEX_QUERY = "SELECT id,phash FROM dav_local WHERE status=0 and phash is not NULL and phash<>0"
+DUPLICATE_FIELDS = "id,code,path,file,size,duration,resolution,created,crc"
+
+# 解码为 CPU 密集 (cv2 释放 GIL), 与扫盘的 IO 线程池分开
+phash_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="phash")
+
+
+def phash_task(local_file: dict) -> int | None:
+    """单个文件感知哈希, 文件不存在返回 None"""
+    video_name = os.path.join(local_file['path'], local_file['file'])
+    if not os.path.isfile(video_name):
+        return None
+    return file_phash(video_name)
+
+async def run_phash(cursor, mission: dict, state: dict) -> None:
+    """执行感知哈希任务, 从任务断点继续"""
+    await cursor.execute(PHASH_COUNT_QUERY, (int(mission['checkpoint'] or 0),))
+    mission['total'] = mission['progress'] + (await fetchone_dict(cursor))['len']
+    logger.info(f"Phash mission {mission['id']} starting - total: {mission['total']} progress: {mission['progress']} checkpoint: {mission['checkpoint']}")
+
+    loop = asyncio.get_running_loop()
+    await phash_mission.save(cursor, mission, 1)
+    while True:
+        await cursor.execute(PHASH_ROWS_QUERY, (int(mission['checkpoint'] or 0), PHASH_BATCH,))
+        local_files = await fetchall_dict(cursor)
+        if not local_files:
+            break
+        results = await asyncio.gather(*(
+            loop.run_in_executor(phash_executor, phash_task, local_file) for local_file in local_files
+        ), return_exceptions=True)
+
+        updates = []
+        for local_file, phash in zip(local_files, results):
+            if isinstance(phash, Exception):
+                state["errors"] += 1
+                logger.error(f"Phash error: {local_file['id']} - {str(phash)}")
+            elif phash is None:
+                state["missing"] += 1
+            else:
+                state["hashed" if phash else "blank"] += 1
+                updates.append((to_db_phash(phash), local_file['id'],))
+
+        mission.update(checkpoint=str(local_files[-1]['id']), progress=mission['progress'] + len(local_files), rate=phash_mission.rate(state["hashed"] + state["blank"]))
+        async with transaction(cursor):
+            if updates:
+                await cursor.executemany(PHASH_UPDATE_QUERY, updates)
+            await phash_mission.save(cursor, mission, 1, tx=False)
+        if updates:
+            await invalidate_cache(PHASH_CACHE_TABLE)  # 列表/计数等缓存不含 phash, 不失效
+        logger.info(f"Phash {mission['progress']}/{mission['total']} - checkpoint: {mission['checkpoint']} rate: {mission['rate']}/s")
+
+
+phash_mission = BackgroundMission(MISSION_TYPE_PHASH, "Phash", run_phash, ("hashed", "blank", "missing", "errors"))
+
+async def start_phash(create: bool = True) -> int:
+    """启动感知哈希任务 (同一时间只运行一个), 存在未完成的任务则从断点继续"""
+    return await phash_mission.start(create)
+
+async def stop_phash() -> None:
+    """停止当前进程内的感知哈希任务 (保留断点)"""
+    await phash_mission.stop()
+
+async def get_phash_status(cursor) -> dict | None:
+    """最近一次感知哈希任务的进度"""
+    return await phash_mission.status(cursor)
+
+async def load_duplicate_clusters(distance: int) -> list:
+    """全部已计算的感知哈希做一次近似查找, return [[id, ...], ...]"""
+    ids, values = [], []
+    async for rows in stream_rows(PHASH_INDEX_QUERY):
+        for row in rows:
+            ids.append(row['id'])
+            values.append(row['phash'])
+    clusters = await asyncio.to_thread(find_duplicate_clusters, ids, values, distance)
+    logger.debug(f"duplicates: {len(values)} hashes => {len(clusters)} clusters (distance: {distance})")
+    return clusters
+
+async def get_duplicate_clusters(cursor, distance: int, page: int, limit: int) -> tuple:
+    """
+    近似重复组, 按组内文件总大小降序分页
+    return (组数, [[文件信息, ...], ...]) 组内按大小降序
+    """
+    clusters = await cached_query('duplicates', ('dav_local', PHASH_CACHE_TABLE), (distance,), lambda: load_duplicate_clusters(distance))
+    if not clusters:
+        return 0, []
+    ids = [id for cluster in clusters for id in cluster]
+    local_files = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        check_query = format_query_for_db(f"SELECT {DUPLICATE_FIELDS} FROM dav_local WHERE id in ({','.join(['%s'] * len(chunk))})")
+        await cursor.execute(check_query, tuple(chunk))
+        local_files.update((local_file['id'], local_file) for local_file in await fetchall_dict(cursor))
+    groups = []
+    for cluster in clusters:
+        group = sorted((local_files[id] for id in cluster if id in local_files), key=lambda local_file: -(local_file['size'] or 0))
+        if len(group) > 1:
+            groups.append(group)
+    groups.sort(key=lambda group: -sum(local_file['size'] or 0 for local_file in group))
+    return len(groups), groups[page * limit:(page + 1) * limit]
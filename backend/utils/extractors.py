@@ -0,0 +1,121 @@
+# -*- coding: UTF8 -*-
+import re
+from loguru import logger
+
+"""
+刮削页面解析: 每个站点一个解析器
+ - 字段正则在导入时预编译
+ - 只在信息区域 (起始标记 ~ 结束标记) 内匹配, 跳过页头脚本和推荐列表; 找不到标记时匹配整页
+"""
+
+
+class PageExtractor:
+    """单个站点的页面解析器"""
+    def __init__(self, name: str, baseurl: str, start_marker: str, end_markers: tuple, fields: dict, title_replace: tuple = ()):
+        self.name = name
+        self.baseurl = baseurl
+        self.start_marker = start_marker
+        self.end_markers = end_markers
+        self.fields = {field: re.compile(pattern) for field, pattern in fields.items()}
+        self.title_replace = title_replace
+
+    def region(self, html: str) -> str:
+        """信息区域"""
+        start = html.find(self.start_marker)
+        if start < 0:
+            start = 0
+        for marker in self.end_markers:
+            end = html.find(marker, start)
+            if end > 0:
+                return html[start:end]
+        return html[start:]
+
+    def extract(self, html: str) -> dict:
+        """所有字段的匹配列表"""
+        region = self.region(html)
+        return {field: pattern.findall(region) for field, pattern in self.fields.items()}
+
+    def clean_title(self, title: str) -> str:
+        title = title.strip()
+        for old, new in self.title_replace:
+            title = title.replace(old, new)
+        return title
+
+
+JAVBUS = PageExtractor(
+    name="javbus",
+    baseurl="https://www.javbus.com/",
+    start_marker="<h3>",
+    end_markers=('id="related-waterfall"',),
+    fields={
+        "title": r'<h3>(.+)</h3>',
+        "date": r'發行日期:</span>(.+)</p>',
+        "studio": r'<a href="https://www\.javbus\.com/studio/\w+">(.*?)</a>',
+        "director": r'<a href="https://www\.javbus\.com/director/\w+">(.*?)</a>',
+        "series": r'<a href="https://www\.javbus\.com/series/\w+">(.*?)</a>',
+        "genre": r'<a href="https://www\.javbus\.com/genre/\w+">(.*?)</a></label></span>',
+        "actors": r'<a href="https://www\.javbus\.com/star/\w+">([^<]+)</a>',
+        "images": r'<a class="sample-box" href="([^"]+)">',
+    },
+)
+
+AV123 = PageExtractor(
+    name="123av",
+    baseurl="https://123av.com/ja/v/",
+    start_marker="<h1>",
+    end_markers=(),
+    fields={
+        "title": r'<h1>(.+)</h1>',
+        "date": r'リリース日:</span>(.+)</p>',
+        "studio": r'<a href="https://www\.123av\.com/studio/\w+">(.*?)</a>',
+        "director": r'<a href="https://www\.123av\.com/director/\w+">(.*?)</a>',
+        "series": r'<a href="https://www\.123av\.com/series/\w+">(.*?)</a>',
+        "genre": r'<a href="https://www\.123av\.com/genre/\w+">(.*?)</a></label></span>',
+        "actors": r'<a href="https://www\.123av\.com/star/\w+">([^<]+)</a>',
+        "images": r'<a class="sample-box" href="([^"]+)">',
+    },
+    title_replace=((' - 123AV', ''), ('オンライン視聴, , ', ''), ('オンライン視聴, ', '')),
+)
+
+SITE_EXTRACTORS = {extractor.name: extractor for extractor in (JAVBUS, AV123)}
+
+
+def replace_images_url(old_list, prefix):
+    """替换图片URL前缀: 相对路径加上站点前缀, 完整URL保持不变"""
+    prefix = prefix.rstrip('/')
+    return [image if image.startswith(('https://', 'http://')) else f"{prefix}{image}" for image in old_list]
+
+def extract_code_info(extractor: PageExtractor, code_name: str, code_url: str, response: str):
+    """
+    解析识别码页面
+    return code_info, 页面不存在或标题不含识别码时返回 None
+    """
+    if response.find('Page Not Found') > 0:
+        logger.error(f"404 Page Not Found")
+        return None
+
+    fields = extractor.extract(response)
+    if len(fields['title']) == 0:
+        logger.error(f"title not found: {code_url}")
+        return None
+    code_title = extractor.clean_title(fields['title'][0])
+    if code_title.lower().find(code_name.lower()) == -1:
+        logger.error(f"title is None: {code_title}")
+        return None
+
+    images = replace_images_url(fields['images'], extractor.baseurl)
+    code_info = {
+        "code": code_name,
+        "name": code_title,
+        "date": fields['date'][0].strip() if len(fields['date']) > 0 else '',
+        "studio": fields['studio'][0].strip() if len(fields['studio']) > 0 else '',
+        "director": fields['director'][0].strip() if len(fields['director']) > 0 else '',
+        "series": fields['series'][0].strip() if len(fields['series']) > 0 else '',
+        "genre": fields['genre'],
+        "websites": [code_url],
+        "actors": fields['actors'],
+        "images": images,
+        "score": 0,
+    }
+    logger.debug(f"{extractor.name}: {code_name} - actors: {len(code_info['actors'])} genre: {len(code_info['genre'])} images: {len(images)}")
+    return code_info
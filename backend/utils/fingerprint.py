@@ -0,0 +1,84 @@
+# -*- coding: UTF8 -*-
+import os
+import mmap
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from config import FINGERPRINT_WORKERS, FINGERPRINT_MMAP, VERIFY_CHUNK_MB
+
+"""
+文件内容指纹
+ - 采样指纹: 文件大小 + 开头/中间/结尾 3 个固定大小块的 blake2b (128 bit, 32 位十六进制, 存入 dav_local.crc)
+   只读取 3 × FINGERPRINT_BLOCK 字节, 与文件大小无关; 重命名/移动后指纹不变
+   中间块偏移按块大小对齐; 不足 3 块的小文件整个读取
+   每块一次 pread (不经过缓冲区预读), FINGERPRINT_MMAP 时改用 mmap 切片, 结果相同
+ - 全量哈希: 按 VERIFY_CHUNK_MB 大块 readinto 复用缓冲区顺序读取整个文件 (校验任务使用)
+ - 算法或块大小变化会使已有指纹 (及按指纹命名的缩略图) 全部失效, 修改时需同步修改 FINGERPRINT_VERSION
+"""
+
+FINGERPRINT_VERSION = b"fp1"
+FINGERPRINT_BLOCK = 64 * 1024
+
+# 扫盘 / 补算指纹共用的线程池 (NFS 等高延迟存储上并发读取)
+fingerprint_executor = ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS, thread_name_prefix="fingerprint")
+
+
+def block_offsets(size: int, block: int = FINGERPRINT_BLOCK) -> list:
+    """采样块偏移: 开头 / 中间 (对齐) / 结尾"""
+    if size <= block * 3:
+        return [0]
+    middle = (size // 2) // block * block
+    return [0, middle, size - block]
+
+def read_blocks(fd: int, size: int, offsets: list, length: int, use_mmap: bool) -> list:
+    """读取采样块"""
+    if use_mmap and size > 0:
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+            return [mm[offset:offset + length] for offset in offsets]
+    if hasattr(os, 'pread'):
+        return [os.pread(fd, length, offset) for offset in offsets]
+    blocks = []  # Windows 无 pread
+    for offset in offsets:
+        os.lseek(fd, offset, os.SEEK_SET)
+        blocks.append(os.read(fd, length))
+    return blocks
+
+def file_fingerprint(filepath: str, use_mmap: bool = FINGERPRINT_MMAP) -> str:
+    """
+    文件指纹 (32位十六进制)
+    """
+    fd = os.open(filepath, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(fd).st_size
+        offsets = block_offsets(size)
+        length = size if offsets == [0] else FINGERPRINT_BLOCK
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(FINGERPRINT_VERSION)
+        digest.update(size.to_bytes(8, 'little'))
+        for data in read_blocks(fd, size, offsets, length, use_mmap):
+            digest.update(data)
+        return digest.hexdigest()
+    finally:
+        os.close(fd)
+
+def file_hash(filepath: str, chunk_mb: int = VERIFY_CHUNK_MB) -> tuple:
+    """
+    全量哈希 (blake2b 256 bit)
+    return (64位十六进制, 字节数, 耗时秒)
+    """
+    start = time.monotonic()
+    digest = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(chunk_mb * 1024 * 1024)
+    view = memoryview(buffer)
+    total = 0
+    with open(filepath, "rb", buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+            total += n
+    return digest.hexdigest(), total, time.monotonic() - start
@@ -0,0 +1,254 @@
+# -*- coding: UTF8 -*-
+import os
+import re
+import hmac
+import time
+import uuid
+import asyncio
+import hashlib
+from urllib.parse import quote
+from loguru import logger
+
+from utils.web import fetch_bytes
+from config import IMAGE_CACHE_ENABLE, IMAGE_CACHE_PATH, IMAGE_CACHE_SIZE, IMAGE_MAX_BYTES, IMAGE_CONCURRENCY, BASIC_PASSWORD, APP_ACTION_PASSWD
+
+"""
+图片镜像
+ - 远程封面/预览图只下载一次, 按内容 sha256 存储: blobs/ab/ab....jpg (多个URL指向同一图片时只存一份)
+ - urls/ 下按 URL 的 sha1 记录对应的文件名
+ - 本地地址 /api/images/{文件名} 内容不变, 浏览器永久缓存 (immutable)
+ - 未下载的图片返回签名地址 /api/images?url=&sig=, 首次访问时下载 (只镜像本服务返回过的URL)
+ - 总大小超过 IMAGE_CACHE_SIZE 时按文件修改时间淘汰 (访问时更新, 每小时最多一次), 降到上限的 90%
+"""
+
+IMAGE_URL_PREFIX = "/api/images"
+IMAGE_NAME_RE = re.compile(r'^[0-9a-f]{64}\.(jpg|png|gif|webp)$')
+IMAGE_MAGIC = ((b'\xff\xd8\xff', '.jpg'), (b'\x89PNG\r\n\x1a\n', '.png'), (b'GIF8', '.gif'))
+BLOB_PATH = os.path.join(IMAGE_CACHE_PATH, "blobs")
+URL_PATH = os.path.join(IMAGE_CACHE_PATH, "urls")
+TOUCH_INTERVAL = 3600  # 访问时间更新间隔秒数
+EVICT_RATIO = 0.9
+SIGN_KEY = hashlib.sha256(f"{BASIC_PASSWORD}:{APP_ACTION_PASSWD}:images".encode('UTF-8')).digest()
+
+image_stats = {"bytes": None, "files": 0, "hits": 0, "downloads": 0, "errors": 0, "evicted": 0}
+pending_images = {}  # url -> asyncio.Future, 同一URL并发请求只下载一次
+evict_lock = asyncio.Lock()
+warm_tasks = set()
+warm_semaphore: asyncio.Semaphore | None = None
+
+
+def image_ext(data: bytes) -> str | None:
+    """按文件头判断图片类型, 非图片 (如错误页) 返回 None"""
+    for magic, ext in IMAGE_MAGIC:
+        if data.startswith(magic):
+            return ext
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+def blob_file(name: str) -> str:
+    return os.path.join(BLOB_PATH, name[:2], name)
+
+def url_file(url: str) -> str:
+    key = hashlib.sha1(url.encode('UTF-8')).hexdigest()
+    return os.path.join(URL_PATH, key[:2], key)
+
+def sign_url(url: str) -> str:
+    return hmac.new(SIGN_KEY, url.encode('UTF-8'), hashlib.sha256).hexdigest()[:32]
+
+def verify_url(url: str, sig: str) -> bool:
+    return hmac.compare_digest(sign_url(url), sig or '')
+
+def local_image_url(name: str) -> str:
+    return f"{IMAGE_URL_PREFIX}/{name}"
+
+def mirror_image_url(url: str) -> str:
+    return f"{IMAGE_URL_PREFIX}?url={quote(url, safe='')}&sig={sign_url(url)}"
+
+def write_atomic(path: str, data: bytes) -> None:
+    """先写临时文件再替换, 并发读取不会读到半个文件 (内容相同的图片共用同一路径, 临时文件名每次唯一)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+def lookup_image(url: str) -> str | None:
+    """已镜像的文件名, 未下载或已淘汰返回 None"""
+    try:
+        with open(url_file(url), encoding='UTF-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return name if IMAGE_NAME_RE.match(name) and os.path.exists(blob_file(name)) else None
+
+def store_image(url: str, data: bytes, ext: str) -> tuple:
+    """
+    保存图片并记录URL
+    return (文件名, 新增字节数)
+    """
+    name = hashlib.sha256(data).hexdigest() + ext
+    path = blob_file(name)
+    added = 0
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        write_atomic(path, data)
+        added = len(data)
+    write_atomic(url_file(url), name.encode('UTF-8'))
+    return name, added
+
+def scan_images() -> list:
+    """所有图片 (修改时间, 大小, 路径)"""
+    images = []
+    if not os.path.isdir(BLOB_PATH):
+        return images
+    for entry in os.scandir(BLOB_PATH):
+        if not entry.is_dir():
+            continue
+        for blob in os.scandir(entry.path):
+            if blob.is_file() and not blob.name.endswith('.tmp'):
+                stat = blob.stat()
+                images.append((stat.st_mtime, stat.st_size, blob.path))
+    return images
+
+def evict_images_sync(limit: int) -> tuple:
+    """
+    按修改时间从旧到新删除, 直到总大小不超过 limit * EVICT_RATIO
+    return (总字节数, 文件数, 删除数)
+    URL记录保留, 查询时发现文件不存在会重新下载
+    """
+    images = scan_images()
+    total = sum(size for _, size, _ in images)
+    target = limit * EVICT_RATIO
+    removed = 0
+    if total > limit:
+        images.sort()
+        for _, size, path in images:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+    return total, len(images) - removed, removed
+
+async def evict_images() -> None:
+    """统计缓存大小, 超出上限时淘汰 (同一时间只执行一次)"""
+    if evict_lock.locked():
+        return
+    async with evict_lock:
+        total, files, removed = await asyncio.to_thread(evict_images_sync, IMAGE_CACHE_SIZE * 1024 * 1024)
+        image_stats.update(bytes=total, files=files)
+        image_stats["evicted"] += removed
+        if removed:
+            logger.info(f"Image cache evicted: {removed} files, size: {total // 1024 // 1024} MB")
+
+async def download_image(url: str) -> str | None:
+    """下载并保存图片, 失败返回 None"""
+    try:
+        response, data = await fetch_bytes(url, IMAGE_MAX_BYTES, retries=1)  # 超过 IMAGE_MAX_BYTES 时中止下载
+        if response.status_code != 200:
+            raise ValueError(f"status {response.status_code}")
+        ext = image_ext(data)
+        if ext is None:
+            raise ValueError(f"not an image: {response.headers.get('content-type', '')}")
+        name, added = await asyncio.to_thread(store_image, url, data, ext)
+    except Exception as e:
+        image_stats["errors"] += 1
+        logger.warning(f"image mirror error: {url} - {str(e)}")
+        return None
+    image_stats["downloads"] += 1
+    if image_stats["bytes"] is None or image_stats["bytes"] + added > IMAGE_CACHE_SIZE * 1024 * 1024:
+        await evict_images()
+    elif added:
+        image_stats["bytes"] += added
+        image_stats["files"] += 1
+    return name
+
+async def mirror_image(url: str) -> str | None:
+    """
+    镜像单张图片
+    return 本地文件名, 未启用 / 非 http(s) 地址 / 下载失败返回 None
+    """
+    if not IMAGE_CACHE_ENABLE or not url.startswith(('https://', 'http://')):
+        return None
+    name = await asyncio.to_thread(lookup_image, url)
+    if name is not None:
+        image_stats["hits"] += 1
+        return name
+    future = pending_images.get(url)
+    if future is not None:
+        return await asyncio.shield(future)
+    future = pending_images[url] = asyncio.get_running_loop().create_future()
+    name = None
+    try:
+        name = await download_image(url)
+        return name
+    finally:
+        pending_images.pop(url, None)
+        future.set_result(name)  # 下载被取消时等待方得到 None
+
+def touch_image(path: str) -> None:
+    """更新访问时间 (LRU), 每小时最多一次"""
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+def image_links_sync(urls: list) -> list:
+    """已镜像返回本地地址, 否则返回签名的镜像地址"""
+    links = []
+    for url in urls:
+        if not isinstance(url, str) or not url.startswith(('https://', 'http://')):
+            links.append(url)
+            continue
+        name = lookup_image(url)
+        links.append(local_image_url(name) if name else mirror_image_url(url))
+    return links
+
+async def image_links(urls: list) -> list:
+    """接口返回的图片地址替换为本地镜像地址"""
+    if not IMAGE_CACHE_ENABLE or not urls:
+        return urls
+    return await asyncio.to_thread(image_links_sync, urls)
+
+async def warm_images_task(urls: list) -> None:
+    global warm_semaphore
+    if warm_semaphore is None:
+        warm_semaphore = asyncio.Semaphore(IMAGE_CONCURRENCY)
+
+    async def warm(url):
+        async with warm_semaphore:
+            await mirror_image(url)
+
+    await asyncio.gather(*(warm(url) for url in urls))
+
+def warm_images(urls: list) -> None:
+    """后台预热图片, 不等待下载完成"""
+    if not IMAGE_CACHE_ENABLE or not urls:
+        return
+    task = asyncio.create_task(warm_images_task(urls))
+    warm_tasks.add(task)
+    task.add_done_callback(warm_tasks.discard)
+
+async def stop_image_mirror() -> None:
+    """取消未完成的预热"""
+    tasks = list(warm_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def get_image_stats() -> dict:
+    """镜像缓存统计"""
+    if image_stats["bytes"] is None:
+        await evict_images()
+    return {
+        **image_stats,
+        "limit": IMAGE_CACHE_SIZE * 1024 * 1024,
+        "pending": len(pending_images),
+        "warming": len(warm_tasks),
+    }
@@ -0,0 +1,216 @@
+# -*- coding: UTF8 -*-
+import os
+import json
+import base58
+from loguru import logger
+
+from utils.db import format_query_for_db, convert_row_to_dict, map_rows
+from config import SCAN_CODE
+
+"""
+媒体库列表查询 (首页 read_root 与 /api/library 共用)
+ - 每个模式 (all/all2/all3/repeat/nojapan/score/搜索) 一份查询定义: FROM / WHERE / 排序字段
+   排序字段末尾固定追加 dl.id, 顺序唯一, 翻页不重复不遗漏
+ - build_list_query: 页码分页 (LIMIT offset), 首页跳页使用
+ - build_cursor_query: 游标分页 (keyset), 游标为上一页最后一行的排序字段值, 深翻页不扫描前面的行
+   游标对客户端不透明 (base58 编码的 JSON)
+"""
+
+LIST_FIELDS = ('id', 'code', 'path', 'file', 'size', 'duration', 'aspectratio', 'resolution', 'created', 'crc', 'score')
+LIST_SELECT = "SELECT dl.id,dl.code,dl.path,dl.file,dl.size,dl.duration,dl.aspectratio,dl.resolution,dl.created,dl.crc, COALESCE(dw.score, 0) as score"
+LIST_FROM = "dav_local dl LEFT JOIN dav_web dw ON dl.code = dw.code"
+LIST_MODES = ('all', 'all2', 'all3', 'repeat', 'nojapan', 'score')
+JAPANESE_GLOB = "'*[あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをんアイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲン]*'"
+DEFAULT_ASPECTRATIO = 0.5625
+
+
+def split_search(query: str) -> list:
+    """搜索关键字: 含 '*' 按 '*' 分割, 否则按空白分割"""
+    return query.split('*') if '*' in query else query.split()
+
+def list_mode(query: str) -> tuple:
+    """按模式生成列表查询定义 (from_sql, where_sql, values, 排序字段)"""
+    if query == 'all':
+        return LIST_FROM, "dl.status=0 and dl.id>0", (), ('code' if SCAN_CODE else 'file', 'id')
+    if query == 'all2':
+        return LIST_FROM, "dl.status=0 and dl.id>0", (), ('created', 'id')
+    if query == 'all3':
+        return LIST_FROM, "dl.status=0 and dl.id>0", (), ('id',)
+    if query == 'repeat':
+        field = "code" if SCAN_CODE else "file"
+        from_sql = f"""{LIST_FROM}
+                        INNER JOIN (
+                            SELECT {field}
+                            FROM dav_local
+                            WHERE status = 0
+                            GROUP BY {field}
+                            HAVING COUNT(*) > 1
+                        ) dup ON dl.{field} = dup.{field}"""
+        return from_sql, "dl.status = 0", (), tuple(dict.fromkeys((field, 'file', 'id')))
+    if query == 'nojapan':
+        return LIST_FROM, f"dl.status=0 AND dl.file NOT GLOB {JAPANESE_GLOB}", (), ('file', 'id')
+    if query == 'score':
+        return "dav_web dw INNER JOIN dav_local dl ON dw.code = dl.code", "dl.status=0 AND dw.score > 0", (), ('file', 'id')
+    if query: # search
+        query_parts = split_search(query)
+        conditions = " AND ".join([f"INSTR(UPPER(dl.file), UPPER(%s))>0" for _ in query_parts])
+        return LIST_FROM, f"dl.status=0 and {conditions}", tuple(query_parts), ('code', 'id')
+    return LIST_FROM, "dl.status=0 and dl.id=0", (), ('code', 'id')
+
+def order_sql(columns: tuple) -> str:
+    return ", ".join(f"dl.{column} ASC" for column in columns)
+
+
+def build_count_query(query: str) -> tuple:
+    """按模式生成计数语句 (check_query, values)"""
+    if query in ['all','all2','all3']:
+        check_query = """SELECT count(*) as len
+                        FROM dav_local
+                        WHERE status=0 and id>0;
+                        """
+        values = ()
+    elif query == 'repeat':
+        field = "code" if SCAN_CODE else "file"
+        check_query = f"""SELECT count(*) as len
+                        FROM dav_local dl
+                        INNER JOIN (
+                            SELECT {field}
+                            FROM dav_local
+                            WHERE status = 0
+                            GROUP BY {field}
+                            HAVING COUNT(*) > 1
+                        ) dup ON dl.{field} = dup.{field}
+                        WHERE dl.status = 0;
+                    """
+        values = ()
+    elif query == 'nojapan':
+        check_query = f"""SELECT count(*) as len
+                        FROM dav_local
+                        WHERE status=0 AND file NOT GLOB {JAPANESE_GLOB};
+                        """
+        values = ()
+    elif query == 'score':
+        check_query = """SELECT count(dl.file) as len
+                        FROM dav_web dw
+                        INNER JOIN dav_local dl ON dw.code = dl.code
+                        WHERE dl.status=0 AND dw.score > 0;
+                        """
+        values = ()
+    elif query: # search
+        query_parts = split_search(query)
+        conditions = " AND ".join([f"INSTR(UPPER(file), UPPER(%s))>0" for _ in query_parts])
+        check_query = f"""SELECT count(*) as len
+                        FROM dav_local
+                        WHERE status=0 and {conditions}
+                        """
+        values = tuple(query_parts)
+    else:
+        check_query = "SELECT count(*) as len FROM dav_local WHERE status=0 and id=0"
+        values = ()
+    return check_query, values
+
+def build_list_query(query: str, page: int, limit: int, alimit: int) -> tuple:
+    """按模式生成页码分页语句 (check_query, values)"""
+    from_sql, where_sql, values, columns = list_mode(query)
+    check_query = f"""{LIST_SELECT}
+                        FROM {from_sql}
+                        WHERE {where_sql}
+                        ORDER BY {order_sql(columns)}
+                        LIMIT %s,%s;
+                        """
+    return check_query, values + (limit * (page - 1), alimit,)
+
+def keyset_condition(columns: tuple, after: list) -> tuple:
+    """
+    排在 after 之后的行 (升序, NULL 在前)
+    (a, b, id) > (x, y, z) 展开为 a>x OR (a=x AND (b>y OR (b=y AND id>z))), 兼容 SQLite/MySQL
+    """
+    condition, values = f"dl.{columns[-1]} > %s", (after[-1],)
+    for column, value in zip(reversed(columns[:-1]), reversed(after[:-1])):
+        if value is None:
+            condition = f"(dl.{column} IS NOT NULL OR (dl.{column} IS NULL AND {condition}))"
+        else:
+            condition = f"(dl.{column} > %s OR (dl.{column} = %s AND {condition}))"
+            values = (value, value,) + values
+    return condition, values
+
+def build_cursor_query(query: str, after: list | None, limit: int) -> tuple:
+    """按模式生成游标分页语句 (check_query, values), after 为上一页最后一行的排序字段值"""
+    from_sql, where_sql, values, columns = list_mode(query)
+    if after is not None:
+        condition, after_values = keyset_condition(columns, after)
+        where_sql = f"{where_sql} and {condition}"
+        values = values + after_values
+    check_query = f"""{LIST_SELECT}
+                        FROM {from_sql}
+                        WHERE {where_sql}
+                        ORDER BY {order_sql(columns)}
+                        LIMIT %s;
+                        """
+    return check_query, values + (limit,)
+
+
+def encode_cursor(query: str, local_file: dict) -> str:
+    """行 -> 游标 (该行的排序字段值)"""
+    _, _, _, columns = list_mode(query)
+    return bytes.decode(base58.b58encode(json.dumps([local_file[column] for column in columns]).encode('UTF-8')))
+
+def decode_cursor(query: str, cursor: str) -> list:
+    """游标 -> 排序字段值, 与模式不匹配时 ValueError"""
+    _, _, _, columns = list_mode(query)
+    try:
+        after = json.loads(base58.b58decode(cursor))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(after, list) or len(after) != len(columns) or after[-1] is None:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return after
+
+
+async def get_count(cursor, query: str) -> int:
+    """按模式计数"""
+    check_query, values = build_count_query(query)
+    check_query = format_query_for_db(check_query)
+    logger.debug(f"check_query: {check_query} values: {values}")
+    await cursor.execute(check_query, values)
+    len_files = await cursor.fetchone()
+    # logger.debug(f"len_files: {len_files}")
+    len_files = convert_row_to_dict(len_files, cursor.description)  # 转换字典
+    logger.debug(f"len_files: {len_files}")
+
+    count = len_files['len']
+    return count
+
+async def get_page(cursor, query: str, page: int, limit: int, alimit: int) -> list:
+    """按模式页码分页列表"""
+    check_query, values = build_list_query(query, page, limit, alimit)
+    check_query = format_query_for_db(check_query)
+    logger.debug(f"check_query: {check_query} values: {values}")
+    await cursor.execute(check_query, values)
+    local_files = await cursor.fetchall()
+    # logger.debug(f"local_files: {local_files}")
+    local_files = map_rows(local_files, cursor.description)  # 转换字典列表, DATETIME转字符串
+    logger.debug(f"local_files: {local_files[0] if len(local_files)>0 else ''}")
+    return local_files
+
+async def get_page_after(cursor, query: str, after: list | None, limit: int) -> list:
+    """按模式游标分页列表"""
+    check_query, values = build_cursor_query(query, after, limit)
+    check_query = format_query_for_db(check_query)
+    logger.debug(f"check_query: {check_query} values: {values}")
+    await cursor.execute(check_query, values)
+    local_files = await cursor.fetchall()
+    local_files = map_rows(local_files, cursor.description)  # 转换字典列表, DATETIME转字符串
+    logger.debug(f"local_files: {local_files[0] if len(local_files)>0 else ''}")
+    return local_files
+
+
+def decorate_files(local_files: list) -> list:
+    """页面展示字段: 默认宽高比, base58 全路径"""
+    for local_file in local_files:
+        if local_file['aspectratio'] == 0 or local_file['aspectratio'] is None:
+            local_file['aspectratio'] = DEFAULT_ASPECTRATIO
+        # 计算全路径, base58 加密
+        path = os.path.join(local_file['path'], local_file['file'])
+        local_file['base'] = bytes.decode(base58.b58encode(path.encode('UTF-8')))
+    return local_files
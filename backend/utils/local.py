@@ -9,17 +9,20 @@ import asyncio
 import hashlib
 import subprocess
 import shlex
+import uuid
 import shutil
 import ssl
-from zlib import crc32
 from pathlib import Path
 from datetime import timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from fastapi.responses import StreamingResponse
 from loguru import logger
 
-from utils.db import get_db, get_db_app, format_query_for_db, convert_row_to_dict, format_datetime_fields
-from config import BASE_DIR, DB_ENGINE, SSL_CERTFILE, SSL_KEYFILE
+from utils.db import get_db, get_db_app, transaction, stream_rows, format_query_for_db, convert_row_to_dict, format_datetime_fields
+from utils.cache import invalidate_cache
+from utils.fingerprint import file_fingerprint, fingerprint_executor
+from utils.phash import video_phash, to_db_phash
+from config import BASE_DIR, SSL_CERTFILE, SSL_KEYFILE
 from config import TEMP_PATH, TEMP2_PATH, THUMBNAIL_TIME, THUMBNAIL_COMPRESSION, THUMBNAIL_CLEAR # THUMBNAIL
 from config import APP_PAGE_LIMIT, SCAN_CODE, SCAN_EXT_LIST, PATH_FILTER_LIST # PATH
 
@@ -179,24 +182,6 @@ def get_file_size(filepath):
     fsize = fsize / float(1024 * 1024)
     return round(fsize, 2)
 
-def get_file_md5(filepath):
-    """
-    获取文件md5
-    """
-    md5 = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            md5.update(chunk)
-    return md5.hexdigest()
-
-def get_file_crc(filepath):
-    """
-    获取文件crc
-    """
-    with open(filepath, "rb") as f:
-        crc = hex(crc32(f.read()))[2:].upper()
-    return crc
-
 # ------------------------------------------------------
 
 def get_video_fps(filepath):
@@ -432,7 +417,7 @@ def sync_file_cut(ss, tt, frompath, topath, id):
         except OSError as e:
             logger.error(f"File rename Error: {e}")
 
-    ## 删除缩略图
+    ## 删除旧版按路径命名的缩略图 (按指纹命名的在更新指纹后由 release_thumbnail 删除)
     # delete_file(TEMP_PATH, id)
     video_hash = hashlib.sha256(frompath.encode()).hexdigest()
     old_thumbnail_path = f"{TEMP_PATH}/{video_hash}.png"
@@ -489,7 +474,7 @@ def sync_file_transcode(frompath, topath, id):
     #     except OSError as e:
     #         logger.error(f"File rename Error: {e}")
 
-    ## 删除缩略图
+    ## 删除旧版按路径命名的缩略图 (按指纹命名的在更新指纹后由 release_thumbnail 删除)
     # delete_file(TEMP_PATH, id)
     video_hash = hashlib.sha256(frompath.encode()).hexdigest()
     old_thumbnail_path = f"{TEMP_PATH}/{video_hash}.png"
@@ -499,198 +484,504 @@ def sync_file_transcode(frompath, topath, id):
     logger.success(f"File transcode successfully! id: {id}")
 
 # /api/scan 扫描路径
-def sync_scan_path(localpaths):
-    async def run_async_scan():
-        async with get_db_app() as cursor:
-            for localpath in localpaths:
-                logger.info(f"scan path: {localpath}")
-                for fpathe, dirs, files in os.walk(localpath):
-                    # 路径关键字在过滤列表里
-                    if any(filter in fpathe for filter in PATH_FILTER_LIST):
-                        logger.trace(f"The path keywords are in the filter list - fpathe: {fpathe}")
-                        continue
-
-                    files.sort()
-                    for file in files:
-                        # logger.debug(f"file: {file}")
-                        # 合成文件路径
-                        file_full = os.path.join(fpathe, file)
-                        # logger.debug(f"file_full: {file_full}")
-
-                        # 过滤mac垃圾文件
-                        if file.startswith(".DS_Store") or file.startswith("._"):
-                            if os.path.isfile(file_full):
-                                # 删除文件
-                                try:
-                                    os.remove(file_full)
-                                    logger.info(f"File {file_full} remove successfully.")
-                                except OSError as e:
-                                    logger.error(f"File remove Error: {e}")
-                            continue
-
-                        # Check if file already exists
-                        check_query = "SELECT id FROM dav_local WHERE path=%s and file=%s and status=0"
-                        values = (fpathe, file,)
-                        check_query = format_query_for_db(check_query)
-                        logger.debug(f"check_query: {check_query} values: {values}")
-                        await cursor.execute(check_query, values)
-                        exist_file = await cursor.fetchone()
-                        # logger.debug(f"exist_file: {exist_file}")
-                        exist_file = convert_row_to_dict(exist_file, cursor.description)  # 转换字典
-                        logger.debug(f"exist_file: {exist_file}")
-                        if exist_file:
-                            # traceLog.add(f"File has been added - {file}")
-                            logger.trace(f"File has been added - {file}")
-                            continue
-                        else:  # 数据库没有，开始入库逻辑
-                            # 获取 文件名 后缀
-                            file_name = os.path.splitext(file)[0]
-                            file_ext = os.path.splitext(file)[1]
-                            # logger.debug(f"file_path: {fpathe} / file_name: {file_name} / file_ext: {file_ext}")
-
-                            # 文件后缀不在支持数组列表里
-                            if not file_ext.lower() in SCAN_EXT_LIST:
-                                logger.trace(f"Unknown extension: {file_ext.lower()} - {file_full}")
-                                continue
-
-                            # 文件名过滤luan/small
-                            if '-luan' in file_name or '-small' in file_name or '-good' in file_name:
-                                file_name = file_name.rsplit('-', 1)[0]
-                                logger.debug(f"2 file_path: {fpathe} / file_name: {file_name} / file_ext: {file_ext}")
-
-                            if SCAN_CODE:
-                                # 获取识别码
-                                file_code = file_name.split(' ')[0]
-                                # logger.debug(f"file_code: {file_code}")
-                                # 识别码含有未知字符
-                                if not contains_alpha_numeric_symbol(file_code):
-                                    logger.error(f"The code contains unknown characters: {file_code} - {file_full}")
-                                    continue
-                                # 识别码含有中文字符
-                                if contains_chinese(file_code):
-                                    logger.error(f"The code contains Chinese characters: {file_code} - {file_full}")
-                                    continue
-                                # 识别码超长
-                                if len(file_code) > 48:
-                                    logger.error(f"The code is too long: {file_code} - {file_full}")
-                                    continue
-                            else:
-                                file_code = ""
-
-                            # 获取文件大小 MB
-                            file_size = get_file_size(file_full)
-                            # logger.debug(f"size: {file_size} MB")
-                            if file_size < 1:
-                                logger.debug(f"Abnormal file size: < 1 MB - {file_full}")
-                                continue
-
-                            # 获取文件创建时间
-                            file_createtime = get_file_createtime(file_full)
-                            # logger.debug(f"time: {file_createtime}")
-                            # # 获取文件crc
-                            # file_crc = get_file_crc(file_full)
-                            # logger.debug(f"crc: {file_crc}")
-
-                            # 获取视频信息
-                            file_info = get_video_info(file_full)
-                            file_resolution = f"{int(file_info['height'])}p"
-                            file_aspectratio = file_info['aspectratio']
-                            file_duration = file_info['duration']
-                            file_fps = file_info['fps']
-                            if file_resolution == '0p':
-                                logger.error(f"Resolution parsing error: moov atom not found - {file_full}")
-                                continue
-                            if file_aspectratio == 0:
-                                logger.error(f"Aspectratio parsing error: moov atom not found - {file_full}")
-                                continue
-                            if file_duration == 0.0:
-                                logger.error(f"Duration parsing error: Invalid sample size - {file_full}")
-                                continue
-                            if file_fps == 0.0:
-                                logger.error(f"fps parsing error: Invalid fps size - {file_full}")
-                                continue
-                            # 视频时长 转 时分秒
-                            file_hms = duration_to_hms(file_duration)
-                            # logger.debug(f"duration: {file_duration} => hms: {file_hms}")
-
-                            logger.debug(f"code: {file_code} / file: {file_full} / size: {file_size} MB / duration: {file_hms} / resolution: {file_resolution} / fps: {file_fps}")
-
-                            # 使用 ffmpeg 获取视频信息
-                            video_format_name = ""
-                            # try:
-                            #     filepath = os.path.join(fpathe, file)
-                            #     probe = ffmpeg.probe(filepath)
-                            #     video_info = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-                            #     logger.debug(f"video_info: {video_info}")
-                            #     video_format = probe['format']
-                            #     logger.debug(f"video_format: {video_format}")
-                            #     video_format_name = video_format['format_name']
-                            #     logger.debug(f"video_format_name: {video_format_name}")
-                            # except ffmpeg.Error as e:
-                            #     video_format_name = ""
-                            #     logger.error(f"FFmpeg error: {e.stderr.decode()}")
-                            # logger.debug(f"video_format_name: {video_format_name}")
-
-                            update_id = 0
-                            if file_code != "":
-                                # Check if code already exists
-                                check_query = "SELECT id FROM dav_local WHERE path=%s and UPPER(code)=%s and size=%s and duration=%s and status=0"
-                                values = (fpathe, file_code, file_size, file_duration,)
-                                check_query = format_query_for_db(check_query)
-                                logger.debug(f"check_query: {check_query} values: {values}")
-                                await cursor.execute(check_query, values)
-                                exist_code = await cursor.fetchone()
-                                # logger.debug(f"exist_code: {exist_code}")
-                                exist_code = convert_row_to_dict(exist_code, cursor.description)  # 转换字典
-                                logger.debug(f"exist_code: {exist_code}")
-                                update_id = exist_code['id'] if exist_code else 0
-                            
-                            if update_id > 0:
-                                # Update File
-                                update_query = "UPDATE dav_local SET code=%s, name=%s, file=%s WHERE id=%s and status=0"
-                                values = (file_code, file_name, file, update_id,)
-                                update_query = format_query_for_db(update_query)
-                                logger.debug(f"update_query: {update_query} values: {values}")
-                                await cursor.execute(update_query, values)
-                            else:
-                                # Insert File
-                                insert_query = "INSERT INTO dav_local (code, name, path, file, size, created, duration, aspectratio, resolution, format, fps) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-                                values = (file_code, file_name, fpathe, file, file_size, file_createtime, file_duration, file_aspectratio, file_resolution, video_format_name, file_fps,)
-                                insert_query = format_query_for_db(insert_query)
-                                logger.debug(f"insert_query: {insert_query} values: {values}")
-                                await cursor.execute(insert_query, values)
-                            if DB_ENGINE == "sqlite": cursor.connection.commit()
-                            else: await cursor.connection.commit()
-                logger.info(f"scan path: {localpath} end")
-            logger.success(f"Folder scan successful! localpaths: {localpaths}")
-
-    # 运行异步逻辑
-    return asyncio.run(run_async_scan())
+# 扫盘语句: 定义时按引擎转换, 循环内直接执行
+SCAN_EXIST_FILE_QUERY = format_query_for_db("SELECT id FROM dav_local WHERE path=%s and file=%s and status=0")
+SCAN_EXIST_CODE_QUERY = format_query_for_db("SELECT id FROM dav_local WHERE path=%s and UPPER(code)=%s and size=%s and duration=%s and status=0")
+SCAN_UPDATE_QUERY = format_query_for_db("UPDATE dav_local SET code=%s, name=%s, file=%s, crc=%s WHERE id=%s and status=0")
+SCAN_INSERT_QUERY = format_query_for_db("INSERT INTO dav_local (code, name, path, file, size, created, duration, aspectratio, resolution, format, fps, crc) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
+SCAN_ROWS_QUERY = "SELECT id,path,file,size,crc FROM dav_local WHERE status=0"
+SCAN_DIR_ROWS_QUERY = "SELECT id,path,file,size,crc FROM dav_local WHERE status=0 and path=%s"
+SCAN_TREE_ROWS_QUERY = "SELECT id,path,file,size,crc FROM dav_local WHERE status=0 and (path=%s or path LIKE %s)"
+SCAN_ID_ROWS_QUERY = "SELECT id,path,file,size,crc FROM dav_local WHERE status=0 and id in ({})"
+SCAN_COUNTERS = ("dirs", "files", "inserted", "moved", "skipped", "errors", "vanished")
+SCAN_MOVE_QUERY = format_query_for_db("UPDATE dav_local SET code=%s, name=%s, path=%s, file=%s, crc=%s WHERE id=%s and status=0")
+SCAN_MOVE_MISSION_QUERY = format_query_for_db("UPDATE dav_missions SET path=%s, file=%s WHERE localid=%s and status<2 and type in (1, 2)")
+
+def probe_scan_file(file_full: str) -> dict:
+    """
+    读取新文件大小 / 指纹 (线程池并发, 只读取采样块)
+    小于 1 MB 的文件只返回大小
+    """
+    probe = {"size": get_file_size(file_full)}
+    if probe['size'] < 1:
+        return probe
+    probe['crc'] = file_fingerprint(file_full)
+    return probe
+
+def probe_scan_info(file_full: str) -> dict:
+    """
+    读取新文件创建时间 / 视频信息 (线程池并发, 移动过来的文件不需要)
+    """
+    return {"created": get_file_createtime(file_full), "info": get_video_info(file_full)}
+
+def moved_key(size, crc: str) -> tuple:
+    """
+    移动识别索引键 (大小, 指纹)
+    MySQL float 为单精度, 按入库精度取整后比较
+    """
+    return round(float(size), 2), crc
+
+def find_vanished_files(local_files: list, listings: dict) -> list:
+    """
+    文件已不存在的记录
+    listings: 目录 -> 文件名集合, 每个目录只列一次 (跨批次复用)
+    """
+    vanished = []
+    for local_file in local_files:
+        names = listings.get(local_file['path'])
+        if names is None:
+            try:
+                names = set(os.listdir(local_file['path']))
+            except OSError:
+                names = set()
+            listings[local_file['path']] = names
+        if local_file['file'] not in names:
+            vanished.append(local_file)
+    return vanished
+
+async def build_moved_index(scopes: list | None = None) -> tuple:
+    """
+    扫盘前建立内存索引: 文件已不存在的记录, 用于识别在 iTube 之外移动/重命名的文件
+    scopes : 只检查这些查询的记录 [(query, values)], 默认全部 (增量扫描只检查变化的目录)
+    return (按 (大小, 指纹) 索引, 没有指纹的记录)
+    匹配到的记录原地更新路径, 保留 id / 评分 / 任务, 不用重新解析视频信息和生成缩略图
+    没有指纹的旧记录无法可靠匹配 (大小+时长相同的不同文件很常见), 只计入 vanished
+    """
+    moved_index, unindexed = {}, []
+    listings = {}
+    seen = set()
+    for query, values in scopes if scopes is not None else [(SCAN_ROWS_QUERY, ())]:
+        async for local_files in stream_rows(query, values):
+            local_files = [local_file for local_file in local_files if local_file['id'] not in seen]
+            seen.update(local_file['id'] for local_file in local_files)
+            for local_file in await asyncio.to_thread(find_vanished_files, local_files, listings):
+                if local_file['crc']:
+                    moved_index.setdefault(moved_key(local_file['size'], local_file['crc']), []).append(local_file)
+                else:
+                    unindexed.append(local_file)
+    return moved_index, unindexed
+
+def tree_scope(path: str) -> tuple:
+    """build_moved_index 的范围: 目录及其子目录下的记录"""
+    return (SCAN_TREE_ROWS_QUERY, (path, path.rstrip(os.sep) + os.sep + '%',),)
+
+def pop_moved_file(index: dict, key: tuple) -> dict | None:
+    """取出匹配的记录 (同一条记录只匹配一次)"""
+    local_files = index.get(key)
+    if not local_files:
+        return None
+    local_file = local_files.pop(0)
+    if not local_files:
+        del index[key]
+    return local_file
+
+def in_scan_paths(path: str, localpaths: list) -> bool:
+    return any(path == localpath or path.startswith(localpath.rstrip(os.sep) + os.sep) for localpath in localpaths)
+
+async def scan_dir(cursor, fpathe: str, files: list, moved_index: dict, stats: dict, settle: int = 0) -> tuple:
+    """
+    扫描单个目录 (不含子目录) 的新文件, 按目录一次提交
+    moved_index : build_moved_index 的 (大小, 指纹) 索引, 匹配到的记录原地更新
+    stats : 累加 SCAN_COUNTERS (files / inserted / moved / skipped / errors)
+    settle : 修改时间在 settle 秒内的文件视为正在写入, 本次跳过
+    return (是否有写入, 是否有跳过的文件)
+    """
+    loop = asyncio.get_running_loop()
+    files.sort()
+    deferred = False # 有正在写入的文件, 稍后重新扫描
+    candidates = [] # 当前目录新文件 (file, file_full, file_name, file_code)
+    for file in files:
+        # logger.debug(f"file: {file}")
+        # 合成文件路径
+        file_full = os.path.join(fpathe, file)
+        # logger.debug(f"file_full: {file_full}")
+
+        # 过滤mac垃圾文件
+        if file.startswith(".DS_Store") or file.startswith("._"):
+            if os.path.isfile(file_full):
+                # 删除文件
+                try:
+                    os.remove(file_full)
+                    logger.info(f"File {file_full} remove successfully.")
+                except OSError as e:
+                    logger.error(f"File remove Error: {e}")
+            continue
+
+        # 获取 文件名 后缀
+        file_name = os.path.splitext(file)[0]
+        file_ext = os.path.splitext(file)[1]
+        # logger.debug(f"file_path: {fpathe} / file_name: {file_name} / file_ext: {file_ext}")
+
+        # 文件后缀不在支持数组列表里
+        if not file_ext.lower() in SCAN_EXT_LIST:
+            logger.trace(f"Unknown extension: {file_ext.lower()} - {file_full}")
+            continue
+        stats["files"] += 1
+
+        # Check if file already exists
+        check_query = SCAN_EXIST_FILE_QUERY
+        values = (fpathe, file,)
+        logger.debug(f"check_query: {check_query} values: {values}")
+        await cursor.execute(check_query, values)
+        exist_file = await cursor.fetchone()
+        # logger.debug(f"exist_file: {exist_file}")
+        exist_file = convert_row_to_dict(exist_file, cursor.description)  # 转换字典
+        logger.debug(f"exist_file: {exist_file}")
+        if exist_file:
+            # traceLog.add(f"File has been added - {file}")
+            logger.trace(f"File has been added - {file}")
+            stats["skipped"] += 1
+            continue
+
+        # 正在写入 (复制中) 的文件
+        if settle > 0:
+            try:
+                if time.time() - os.path.getmtime(file_full) < settle:
+                    logger.debug(f"File is still being written - {file_full}")
+                    deferred = True
+                    continue
+            except OSError:
+                continue
+
+        # 数据库没有，开始入库逻辑
+        # 文件名过滤luan/small
+        if '-luan' in file_name or '-small' in file_name or '-good' in file_name:
+            file_name = file_name.rsplit('-', 1)[0]
+            logger.debug(f"2 file_path: {fpathe} / file_name: {file_name} / file_ext: {file_ext}")
+
+        if SCAN_CODE:
+            # 获取识别码
+            file_code = file_name.split(' ')[0]
+            # logger.debug(f"file_code: {file_code}")
+            # 识别码含有未知字符
+            if not contains_alpha_numeric_symbol(file_code):
+                logger.error(f"The code contains unknown characters: {file_code} - {file_full}")
+                stats["errors"] += 1
+                continue
+            # 识别码含有中文字符
+            if contains_chinese(file_code):
+                logger.error(f"The code contains Chinese characters: {file_code} - {file_full}")
+                stats["errors"] += 1
+                continue
+            # 识别码超长
+            if len(file_code) > 48:
+                logger.error(f"The code is too long: {file_code} - {file_full}")
+                stats["errors"] += 1
+                continue
+        else:
+            file_code = ""
+        candidates.append((file, file_full, file_name, file_code,))
+
+    if not candidates:
+        return False, deferred
+
+    # 并发读取新文件: 大小 / 指纹
+    probes = await asyncio.gather(*[
+        loop.run_in_executor(fingerprint_executor, probe_scan_file, file_full)
+        for _, file_full, _, _ in candidates
+    ], return_exceptions=True)
+
+    pending_writes = [] # 当前目录待写入 (query, values)
+    moved_files = [] # 当前目录移动过来的文件 (原路径, 指纹)
+    unmatched = [] # 需要解析视频信息的新文件
+    for candidate, probe in zip(candidates, probes):
+        file, file_full, file_name, file_code = candidate
+        if isinstance(probe, Exception):
+            logger.error(f"File probe error: {str(probe)} - {file_full}")
+            stats["errors"] += 1
+            continue
+
+        # 文件大小 MB
+        file_size = probe['size']
+        # logger.debug(f"size: {file_size} MB")
+        if file_size < 1:
+            logger.debug(f"Abnormal file size: < 1 MB - {file_full}")
+            stats["skipped"] += 1
+            continue
+
+        # 移动/重命名: 大小和指纹与已不存在的记录相同, 原地更新路径
+        moved = pop_moved_file(moved_index, moved_key(file_size, probe['crc']))
+        if moved:
+            logger.debug(f"moved: {moved['path']}/{moved['file']} => {file_full}")
+            pending_writes.append((SCAN_MOVE_QUERY, (file_code, file_name, fpathe, file, probe['crc'], moved['id'],),))
+            pending_writes.append((SCAN_MOVE_MISSION_QUERY, (fpathe, file, moved['id'],),))
+            moved_files.append((os.path.join(moved['path'], moved['file']), probe['crc'],))
+            continue
+        unmatched.append((candidate, probe,))
+
+    # 并发读取新文件: 创建时间 / 视频信息
+    infos = await asyncio.gather(*[
+        loop.run_in_executor(fingerprint_executor, probe_scan_info, file_full)
+        for (_, file_full, _, _), _ in unmatched
+    ], return_exceptions=True)
+
+    for ((file, file_full, file_name, file_code), probe), info in zip(unmatched, infos):
+        if isinstance(info, Exception):
+            logger.error(f"File probe error: {str(info)} - {file_full}")
+            stats["errors"] += 1
+            continue
+
+        # 文件大小 MB / 创建时间 / 指纹 (缩略图按指纹命名)
+        file_size = probe['size']
+        file_createtime = info['created']
+        file_crc = probe['crc']
+        # logger.debug(f"time: {file_createtime} crc: {file_crc}")
+
+        # 视频信息
+        file_info = info['info']
+        file_resolution = f"{int(file_info['height'])}p"
+        file_aspectratio = file_info['aspectratio']
+        file_duration = file_info['duration']
+        file_fps = file_info['fps']
+        if file_resolution == '0p':
+            logger.error(f"Resolution parsing error: moov atom not found - {file_full}")
+            stats["errors"] += 1
+            continue
+        if file_aspectratio == 0:
+            logger.error(f"Aspectratio parsing error: moov atom not found - {file_full}")
+            stats["errors"] += 1
+            continue
+        if file_duration == 0.0:
+            logger.error(f"Duration parsing error: Invalid sample size - {file_full}")
+            stats["errors"] += 1
+            continue
+        if file_fps == 0.0:
+            logger.error(f"fps parsing error: Invalid fps size - {file_full}")
+            stats["errors"] += 1
+            continue
+        # 视频时长 转 时分秒
+        file_hms = duration_to_hms(file_duration)
+        # logger.debug(f"duration: {file_duration} => hms: {file_hms}")
+
+        logger.debug(f"code: {file_code} / file: {file_full} / size: {file_size} MB / duration: {file_hms} / resolution: {file_resolution} / fps: {file_fps}")
+
+        # 使用 ffmpeg 获取视频信息
+        video_format_name = ""
+
+        update_id = 0
+        if file_code != "":
+            # Check if code already exists
+            check_query = SCAN_EXIST_CODE_QUERY
+            values = (fpathe, file_code, file_size, file_duration,)
+            logger.debug(f"check_query: {check_query} values: {values}")
+            await cursor.execute(check_query, values)
+            exist_code = await cursor.fetchone()
+            # logger.debug(f"exist_code: {exist_code}")
+            exist_code = convert_row_to_dict(exist_code, cursor.description)  # 转换字典
+            logger.debug(f"exist_code: {exist_code}")
+            update_id = exist_code['id'] if exist_code else 0
+
+        if update_id > 0:
+            # Update File
+            update_query = SCAN_UPDATE_QUERY
+            values = (file_code, file_name, file, file_crc, update_id,)
+            logger.debug(f"update_query: {update_query} values: {values}")
+            pending_writes.append((update_query, values,))
+            stats["moved"] += 1
+        else:
+            # Insert File
+            insert_query = SCAN_INSERT_QUERY
+            values = (file_code, file_name, fpathe, file, file_size, file_createtime, file_duration, file_aspectratio, file_resolution, video_format_name, file_fps, file_crc,)
+            logger.debug(f"insert_query: {insert_query} values: {values}")
+            pending_writes.append((insert_query, values,))
+            stats["inserted"] += 1
+
+    # 按目录批量提交
+    if pending_writes:
+        async with transaction(cursor):
+            for query, values in pending_writes:
+                await cursor.execute(query, values)
+        await invalidate_cache('dav_local')
+        logger.info(f"scan dir: {fpathe} - write: {len(pending_writes)}")
+
+    # 旧版按路径命名的缩略图改为按指纹命名
+    for video_name, file_crc in moved_files:
+        adopt_legacy_thumbnail(video_name, file_crc)
+    stats["moved"] += len(moved_files)
+    return bool(pending_writes), deferred
+
+def list_dir_files(path: str) -> list:
+    """目录下的文件名 (不含子目录), 目录不存在返回空"""
+    try:
+        with os.scandir(path) as entries:
+            return [entry.name for entry in entries if entry.is_file()]
+    except OSError:
+        return []
+
+async def sync_scan_dirs(dirs: list, pending_ids: list = (), settle: int = 0) -> tuple:
+    """
+    增量扫描 (目录监控): 只扫描变化的目录
+    dirs : [(目录, 是否包含子目录)], 新建/移入/删除的目录包含子目录, 文件变化只扫描所在目录
+    pending_ids : 之前已发现文件不存在的记录, 继续参与移动匹配 (跨批次的移动)
+    settle : 正在写入的文件跳过, 所在目录返回给调用方稍后重新扫描
+    return (统计 SCAN_COUNTERS, 文件不存在且未匹配到的记录, 需重新扫描的目录, 有写入的目录)
+    """
+    stats = dict.fromkeys(SCAN_COUNTERS, 0)
+    scopes = []
+    for path, recursive in dirs:
+        if recursive:
+            scopes.append(tree_scope(path))
+        else:
+            scopes.append((SCAN_DIR_ROWS_QUERY, (path,),))
+    pending_ids = list(pending_ids)
+    for start in range(0, len(pending_ids), 500):
+        chunk = pending_ids[start:start + 500]
+        scopes.append((SCAN_ID_ROWS_QUERY.format(','.join(['%s'] * len(chunk))), tuple(chunk),))
+    moved_index, unindexed = await build_moved_index(scopes)
+
+    deferred_dirs, changed_dirs = [], []
+    async with get_db_app() as cursor:
+        for path, recursive in dirs:
+            if recursive:
+                walk = os.walk(path)
+            else:
+                walk = [(path, [], await asyncio.to_thread(list_dir_files, path))]
+            for fpathe, _, files in walk:
+                # 路径关键字在过滤列表里
+                if any(filter in fpathe for filter in PATH_FILTER_LIST):
+                    continue
+                written, deferred = await scan_dir(cursor, fpathe, files, moved_index, stats, settle)
+                stats["dirs"] += 1
+                if written:
+                    changed_dirs.append(fpathe)
+                if deferred:
+                    deferred_dirs.append(fpathe)
+    vanished = [local_file for local_files in moved_index.values() for local_file in local_files] + unindexed
+    stats["vanished"] = len(vanished)
+    logger.info(f"Incremental scan: {len(dirs)} dirs - {stats}")
+    return stats, vanished, deferred_dirs, changed_dirs
+
+# 缩略图按文件内容指纹 (dav_local.crc) 命名, 重命名/移动/清空数据库后重新扫描仍命中
+THUMBNAIL_NAME_RE = re.compile(r'^([0-9a-f]{32}|[0-9a-f]{64})\.png$')  # 指纹 / 旧版 sha256(路径)
+THUMBNAIL_ORPHAN_AGE = 3600  # 清理时跳过刚生成的缩略图 (秒)
+CRC_UPDATE_QUERY = format_query_for_db("UPDATE dav_local SET crc=%s WHERE id=%s")
+PHASH_UPDATE_QUERY = format_query_for_db("UPDATE dav_local SET phash=%s WHERE id=%s")
+PHASH_CACHE_TABLE = "dav_local.phash"  # 只写 phash 时的缓存版本键, 只有近似重复组依赖
+
+def thumbnail_path(fingerprint: str) -> str:
+    """缩略图路径"""
+    return f"{TEMP_PATH}/{fingerprint}.png"
+
+def thumbnail_version(path: str) -> str:
+    """缩略图版本 (修改时间), 重新生成后变化"""
+    try:
+        return format(os.stat(path).st_mtime_ns, 'x')
+    except OSError:
+        return ''
+
+def versioned_thumbnail(path: str) -> str:
+    """带版本的缩略图地址, 同名缩略图重新生成后浏览器重新获取"""
+    version = thumbnail_version(path)
+    return f"{path}?v={version}" if version else path
+
+def legacy_thumbnail_paths(video_name: str) -> list:
+    """旧版按路径哈希命名的缩略图 (TEMP_PATH / cleardb 备份的 TEMP2_PATH)"""
+    video_hash = hashlib.sha256(video_name.encode()).hexdigest()
+    return [f"{TEMP_PATH}/{video_hash}.png", f"{TEMP2_PATH}/{video_hash}.png"]
+
+def get_thumbnail_file(video_name: str, fingerprint: str = '') -> str:
+    """已有缩略图的路径 (删除缩略图时使用)"""
+    return thumbnail_path(fingerprint) if fingerprint else legacy_thumbnail_paths(video_name)[0]
+
+THUMBNAIL_SHARED_QUERY = "SELECT 1 FROM dav_local WHERE crc=%s AND status=0 AND id!=%s LIMIT 1"
+
+async def thumbnail_shared(cursor, fingerprint: str, id_name) -> bool:
+    """按指纹命名的缩略图是否还被其他未删除的记录 (重复文件) 使用"""
+    if not fingerprint:
+        return False
+    check_query = format_query_for_db(THUMBNAIL_SHARED_QUERY)
+    values = (fingerprint, id_name,)
+    logger.debug(f"check_query: {check_query} values: {values}")
+    await cursor.execute(check_query, values)
+    return await cursor.fetchone() is not None
+
+async def release_thumbnail(cursor, fingerprint: str, id_name) -> None:
+    """记录的指纹已变化 (剪切/转码): 旧指纹的缩略图不再被其他记录使用时删除"""
+    if not fingerprint or await thumbnail_shared(cursor, fingerprint, id_name):
+        return
+    path = thumbnail_path(fingerprint)
+    try:
+        os.remove(path)
+        logger.info(f"Thumbnail {path} remove successfully.")
+    except FileNotFoundError:
+        pass
+
+def adopt_legacy_thumbnail(video_name: str, fingerprint: str) -> bool:
+    """缩略图是否存在; 旧版缩略图改为按指纹命名, 避免重新解码"""
+    path = thumbnail_path(fingerprint)
+    if os.path.exists(path):
+        return True
+    for legacy_path in legacy_thumbnail_paths(video_name):
+        if os.path.exists(legacy_path):
+            shutil.move(legacy_path, path)
+            logger.debug(f"Move file: {legacy_path} => {path}")
+            return True
+    return False
+
+def thumbnail_task(local_file: dict, isShow=True):
+    """
+    获取单个文件缩略图, 缺少指纹时先计算 (写入 local_file['crc'])
+    查询包含 phash 且为 NULL 时, 截图时顺带计算感知哈希 (写入 local_file['phash'])
+    """
+    video_name = os.path.join(local_file['path'], local_file['file'])
+    if isShow and not local_file.get('crc') and os.path.isfile(video_name):
+        local_file['crc'] = file_fingerprint(video_name)
+    phash = {} if 'phash' in local_file and local_file['phash'] is None else None
+    thumbnail_url = generate_thumbnail(local_file['id'], local_file['code'], video_name, isShow, local_file.get('crc') or '', phash)
+    if phash:
+        local_file['phash'] = phash['phash']
+    return thumbnail_url
+
+async def save_phashes(updates: list):
+    """
+    批量写入感知哈希 [(phash, id)], phash 为无符号 64 位
+    """
+    if not updates:
+        return
+    logger.debug(f"update_query: {PHASH_UPDATE_QUERY} values: {len(updates)}")
+    async with transaction() as cursor:
+        await cursor.executemany(PHASH_UPDATE_QUERY, [(to_db_phash(phash), id,) for phash, id in updates])
+    await invalidate_cache(PHASH_CACHE_TABLE)
+
+async def save_fingerprints(updates: list):
+    """
+    批量写入指纹 [(crc, id)]
+    """
+    if not updates:
+        return
+    logger.debug(f"update_query: {CRC_UPDATE_QUERY} values: {len(updates)}")
+    async with transaction() as cursor:
+        await cursor.executemany(CRC_UPDATE_QUERY, updates)
+    await invalidate_cache('dav_local')
 
 # /api/syncthumbnail 批量生成缩略图
-def sync_generate_thumbnails(local_files):
+async def sync_generate_thumbnails(check_query: str, values: tuple = ()):
     """
-    批量生成缩略图
+    批量生成缩略图: 按批流式读取, 每批交给线程池生成
     """
-    thumbnail_urls = {}
+    thumbnail_count = 0
     cpu_count = os.cpu_count() or 1
     if cpu_count > APP_PAGE_LIMIT: cpu_count=APP_PAGE_LIMIT
     logger.debug(f"max_workers: {cpu_count}")
+    loop = asyncio.get_running_loop()
     with ThreadPoolExecutor(max_workers=cpu_count) as executor:  # 设置最大线程数
-        future_to_local_file = {
-            executor.submit(generate_thumbnail, local_file['id'], local_file['code'], os.path.join(local_file['path'], local_file['file'])): local_file
-            for local_file in local_files
-        }
-        for future in as_completed(future_to_local_file):
-            local_file = future_to_local_file[future]
-            try:
-                thumbnail_url = future.result()
-                # logger.debug(f"thumbnail_url: {thumbnail_url}")
-                local_file['thumbnail_url'] = thumbnail_url
-                thumbnail_urls[local_file['id']] = thumbnail_url
-            except Exception as e:
-                logger.error(f"Error generating thumbnail for {local_file['id']}: {str(e)}")
-    logger.success(f"Thumbnail sync successful! len: {len(thumbnail_urls)}")
+        async for local_files in stream_rows(check_query, values):
+            missing = [local_file for local_file in local_files if not local_file.get('crc')]
+            unhashed = [local_file for local_file in local_files if 'phash' in local_file and local_file['phash'] is None]
+            futures = [
+                loop.run_in_executor(executor, thumbnail_task, local_file)
+                for local_file in local_files
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            for local_file, thumbnail_url in zip(local_files, results):
+                if isinstance(thumbnail_url, Exception):
+                    logger.error(f"Error generating thumbnail for {local_file['id']}: {str(thumbnail_url)}")
+                    continue
+                thumbnail_count += 1
+            await save_fingerprints([(local_file['crc'], local_file['id'],) for local_file in missing if local_file.get('crc')])
+            await save_phashes([(local_file['phash'], local_file['id'],) for local_file in unhashed if local_file['phash'] is not None])
+            logger.info(f"Thumbnail sync: {thumbnail_count}")
+    logger.success(f"Thumbnail sync successful! len: {thumbnail_count}")
 
 # /index.html 批量获取缩略图
 async def generate_thumbnails(local_files, isShow=True):
@@ -698,12 +989,13 @@ async def generate_thumbnails(local_files, isShow=True):
     批量获取缩略图
     """
     thumbnail_urls = {}
+    missing = [local_file for local_file in local_files if not local_file.get('crc')]
     cpu_count = os.cpu_count() or 1
     if cpu_count > APP_PAGE_LIMIT: cpu_count=APP_PAGE_LIMIT
     # logger.debug(f"max_workers: {cpu_count}")
     with ThreadPoolExecutor(max_workers=cpu_count) as executor:  # 设置最大线程数
         future_to_local_file = {
-            executor.submit(generate_thumbnail, local_file['id'], local_file['code'], os.path.join(local_file['path'], local_file['file']), isShow): local_file
+            executor.submit(thumbnail_task, local_file, isShow): local_file
             for local_file in local_files
         }
         for future in as_completed(future_to_local_file):
@@ -716,11 +1008,92 @@ async def generate_thumbnails(local_files, isShow=True):
             except Exception as e:
                 logger.error(f"Error generating thumbnail for {local_file['id']}: {str(e)}")
     logger.debug(f"thumbnail_urls: {thumbnail_urls}")
+    # 首次计算的指纹写回数据库
+    await save_fingerprints([(local_file['crc'], local_file['id'],) for local_file in missing if local_file.get('crc')])
     return thumbnail_urls
 
-def generate_thumbnail(id_name: str, code_name: str, video_name: str, isShow=True):
+# /api/sweepthumbnail 清理缩略图
+SWEEP_MISSING_QUERY = "SELECT id,path,file,crc FROM dav_local WHERE status=0 and (crc='' or crc is NULL)"
+SWEEP_REFERENCED_QUERY = "SELECT path,file,crc FROM dav_local WHERE status=0"
+
+def fingerprint_task(local_file: dict) -> str:
+    """补算单个文件指纹, 同时迁移旧版缩略图; 文件不存在返回空"""
+    video_name = os.path.join(local_file['path'], local_file['file'])
+    if not os.path.isfile(video_name):
+        return ''
+    fingerprint = file_fingerprint(video_name)
+    adopt_legacy_thumbnail(video_name, fingerprint)
+    return fingerprint
+
+async def sync_fingerprint_files() -> int:
+    """
+    为缺少指纹的文件补算指纹: 按批流式读取, 指纹线程池并发计算, 每批写入一次
+    """
+    count = 0
+    loop = asyncio.get_running_loop()
+    async for local_files in stream_rows(SWEEP_MISSING_QUERY):
+        futures = [loop.run_in_executor(fingerprint_executor, fingerprint_task, local_file) for local_file in local_files]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        updates = []
+        for local_file, fingerprint in zip(local_files, results):
+            if isinstance(fingerprint, Exception):
+                logger.error(f"Error fingerprinting {local_file['id']}: {str(fingerprint)}")
+            elif fingerprint:
+                updates.append((fingerprint, local_file['id'],))
+        await save_fingerprints(updates)
+        count += len(updates)
+    return count
+
+def remove_orphan_thumbnails(referenced: set, fingerprinted: list) -> int:
+    """
+    删除未被引用的缩略图
+    referenced    : 被引用的缩略图名 (指纹 / 旧版路径哈希)
+    fingerprinted : [(视频路径, 指纹)] 删除前先把 TEMP2_PATH 中仍被引用的旧版缩略图移回
+    """
+    for video_name, fingerprint in fingerprinted:
+        adopt_legacy_thumbnail(video_name, fingerprint)
+    # 旧版 cleardb 备份目录, 仍被引用的缩略图已移回
+    if os.path.exists(TEMP2_PATH):
+        shutil.rmtree(TEMP2_PATH, ignore_errors=True)
+
+    removed = 0
+    now = time.time()
+    for entry in os.scandir(TEMP_PATH):
+        match = THUMBNAIL_NAME_RE.match(entry.name)
+        if match is None or match.group(1) in referenced or not entry.is_file():
+            continue
+        if now - entry.stat().st_mtime < THUMBNAIL_ORPHAN_AGE:
+            continue
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except OSError as e:
+            logger.error(f"Thumbnail remove Error: {e}")
+    return removed
+
+async def sync_sweep_thumbnails():
+    """
+    清理缩略图: 先补算缺少的指纹, 再删除没有任何 dav_local 记录引用的缩略图
+    """
+    fingerprint_count = await sync_fingerprint_files()
+    referenced = set()
+    fingerprinted = []
+    async for local_files in stream_rows(SWEEP_REFERENCED_QUERY):
+        for local_file in local_files:
+            video_name = os.path.join(local_file['path'], local_file['file'])
+            if local_file['crc']:
+                referenced.add(local_file['crc'])
+                fingerprinted.append((video_name, local_file['crc'],))
+            else:
+                referenced.add(hashlib.sha256(video_name.encode()).hexdigest())
+    removed = await asyncio.to_thread(remove_orphan_thumbnails, referenced, fingerprinted)
+    logger.success(f"Thumbnail sweep successful! fingerprint: {fingerprint_count} referenced: {len(referenced)} removed: {removed}")
+
+def generate_thumbnail(id_name: str, code_name: str, video_name: str, isShow=True, fingerprint: str = '', phash: dict | None = None):
     """
     获取缩略图
+    fingerprint : 文件指纹 (dav_local.crc), 为空时计算
+    phash : 传入时新截图顺带计算感知哈希, 写入 phash['phash'] (已有缩略图不解码, 由感知哈希任务补算)
     """
     if not isShow:
         return "/frontend/static/images/video.png"
@@ -736,18 +1109,13 @@ def generate_thumbnail(id_name: str, code_name: str, video_name: str, isShow=Tru
     if not os.path.exists(TEMP_PATH): os.mkdir(TEMP_PATH)
     
     # thumbnail_path = f"{TEMP_PATH}/{id_name}_{code_name}.png" if code_name else f"{TEMP_PATH}/{id_name}.png"
-    video_hash = hashlib.sha256(video_name.encode()).hexdigest()
-    thumbnail_path = f"{TEMP_PATH}/{video_hash}.png"
-    thumbnail2_path = f"{TEMP2_PATH}/{video_hash}.png"
-    # logger.debug(f"thumbnail_path: {thumbnail_path}")
-    # logger.debug(f"thumbnail2_path: {thumbnail2_path}")
-    if os.path.exists(thumbnail_path):
-        return thumbnail_path
-    if os.path.exists(thumbnail2_path):
-        shutil.move(thumbnail2_path, thumbnail_path)
-        logger.debug(f"Move file: {thumbnail_path}")
-        return thumbnail_path
-    if not os.path.exists(thumbnail_path):
+    if not fingerprint:
+        fingerprint = file_fingerprint(video_name)
+    thumbnail_file = thumbnail_path(fingerprint)
+    # logger.debug(f"thumbnail_file: {thumbnail_file}")
+    if adopt_legacy_thumbnail(video_name, fingerprint):
+        return versioned_thumbnail(thumbnail_file)
+    if not os.path.exists(thumbnail_file):
         try:
             ## cv2截图
             # 读取视频
@@ -798,9 +1166,15 @@ def generate_thumbnail(id_name: str, code_name: str, video_name: str, isShow=Tru
             if not result:
                 logger.error(f"Failed to imencode frame. ERROR: {str(result).splitlines()[0]} - {video_name}")
                 return "/frontend/static/images/video.png"
-            # 保存图片
-            encoded_image.tofile(thumbnail_path)
-            logger.debug(f"id_name: {id_name} thumbnail_path: {thumbnail_path}")
+            # 保存图片 (先写临时文件再替换, 其他 worker 不会读到未写完的图片)
+            # 重复文件共用同一指纹文件名, 线程池内可能同时生成, 临时文件名每次唯一
+            temp_file = f"{thumbnail_file}.{uuid.uuid4().hex}.tmp"
+            encoded_image.tofile(temp_file)
+            os.replace(temp_file, thumbnail_file)
+            logger.debug(f"id_name: {id_name} thumbnail_file: {thumbnail_file}")
+            # 感知哈希 (共用已打开的视频)
+            if phash is not None:
+                phash['phash'] = video_phash(cap, frame_count)
         except FileNotFoundError as e:
             logger.error(f"FileNotFoundError ERROR: {str(e).splitlines()[0]} - {video_name}")
             return "/frontend/static/images/video.png"
@@ -811,9 +1185,9 @@ def generate_thumbnail(id_name: str, code_name: str, video_name: str, isShow=Tru
             # 确保视频文件被释放
             if cap.isOpened():
                 cap.release()
-    if not os.path.exists(thumbnail_path):
-        logger.warning(f"The thumbnail not found: {thumbnail_path}")
+    if not os.path.exists(thumbnail_file):
+        logger.warning(f"The thumbnail not found: {thumbnail_file}")
         return "/frontend/static/images/video.png"
-    return thumbnail_path
+    return versioned_thumbnail(thumbnail_file)
 
 # ------------------------------------------------------
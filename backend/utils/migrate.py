@@ -0,0 +1,201 @@
+# -*- coding: UTF8 -*-
+from loguru import logger
+
+from utils.db import get_db_app, transaction, format_query_for_db, convert_row_to_dict
+from utils.tags import backfill_web_tags
+from config import DB_ENGINE
+
+"""
+数据库版本迁移
+ - dav_schema 记录已执行的版本, 启动时按版本号顺序执行未执行的迁移
+ - 已发布的迁移不再修改, 变更只追加新版本
+ - 每一步均可重复执行 (先检查索引/字段是否存在)
+ - SQLite: CREATE INDEX / ADD COLUMN 不重写表
+ - MySQL: ALGORITHM=INPLACE, LOCK=NONE 在线变更, 不锁表
+"""
+
+# 步骤:
+#   ("index",  表, 索引名, SQLite 字段, MySQL 字段)
+#   ("column", 表, 字段名, SQLite 定义, MySQL 定义)
+#   ("table",  表, SQLite 建表语句, MySQL 建表语句)
+#   ("sql",    SQLite 语句, MySQL 语句)
+#   ("call",   协程函数)  数据迁移, 参数为迁移游标, 与本版本一起提交
+MIGRATIONS = [
+    (1, "hot query indexes", [
+        # 扫盘查重 / 按文件定位
+        ("index", "dav_local", "idx_dav_local_path_file", "path, file, status", "`path`, `file`(255), `status`"),
+        # 列表 / 计数 / 按识别码关联
+        ("index", "dav_local", "idx_dav_local_status_code", "status, code", "`status`, `code`"),
+        ("index", "dav_local", "idx_dav_local_status_created", "status, created", "`status`, `created`"),
+        ("index", "dav_web", "idx_dav_web_code", "code", "`code`"),
+        # 评分列表
+        ("index", "dav_web", "idx_dav_web_score_code", "score, code", "`score`, `code`"),
+        # 任务轮询
+        ("index", "dav_missions", "idx_dav_missions_status", "status", "`status`"),
+        # 搜索记录
+        ("index", "dav_search", "idx_dav_search_key", "`key`", "`key`"),
+    ]),
+    (2, "metadata prefetch", [
+        # 任务进度 / 断点
+        ("column", "dav_missions", "total", "INTEGER DEFAULT 0", "int DEFAULT 0 COMMENT '总数'"),
+        ("column", "dav_missions", "progress", "INTEGER DEFAULT 0", "int DEFAULT 0 COMMENT '已处理数'"),
+        ("column", "dav_missions", "checkpoint", "TEXT DEFAULT ''", "varchar(512) DEFAULT '' COMMENT '断点'"),
+        ("column", "dav_missions", "rate", "REAL DEFAULT 0", "float DEFAULT 0 COMMENT '速度 (个/秒)'"),
+        ("index", "dav_missions", "idx_dav_missions_type_status", "type, status", "`type`, `status`"),
+        # 未找到的识别码 (负缓存)
+        ("table", "dav_web_miss", """
+            CREATE TABLE IF NOT EXISTS dav_web_miss (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                code         TEXT     NOT NULL,
+                attempts     INTEGER  DEFAULT 1,
+                created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_time DATETIME DEFAULT CURRENT_TIMESTAMP
+            )""", """
+            CREATE TABLE IF NOT EXISTS dav_web_miss (
+                `id`                    int           NOT NULL AUTO_INCREMENT COMMENT 'id',
+                `code`                  varchar(48)   NOT NULL      COMMENT '识别码',
+                `attempts`              int           DEFAULT 1     COMMENT '未找到次数',
+                `created_time`          datetime      DEFAULT NOW() COMMENT '创建时间',
+                `updated_time`          datetime      DEFAULT NOW() COMMENT '最后查询时间',
+                PRIMARY KEY (`id`)  USING BTREE
+            ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+            """),
+        ("index", "dav_web_miss", "idx_dav_web_miss_code", "code, updated_time", "`code`, `updated_time`"),
+    ]),
+    (3, "file verification", [
+        # 全量哈希 / 校验时间 (crc 为采样指纹)
+        ("column", "dav_local", "hash", "TEXT DEFAULT ''", "varchar(64) DEFAULT '' COMMENT '全量哈希'"),
+        ("column", "dav_local", "verified", "DATETIME DEFAULT NULL", "datetime DEFAULT NULL COMMENT '校验时间'"),
+    ]),
+    (4, "perceptual hash", [
+        # 近似重复检测, NULL 为未计算
+        ("column", "dav_local", "phash", "INTEGER DEFAULT NULL", "bigint DEFAULT NULL COMMENT '感知哈希'"),
+    ]),
+    (5, "multi-process workers", [
+        # 任务归属 (原子认领 + 租约) / 计数 (任一 worker 可查询)
+        ("column", "dav_missions", "owner", "TEXT DEFAULT ''", "varchar(128) DEFAULT '' COMMENT '执行进程'"),
+        ("column", "dav_missions", "counters", "TEXT DEFAULT ''", "varchar(1024) DEFAULT '' COMMENT '计数'"),
+    ]),
+    (6, "web tags backfill", [
+        # 按识别码查询/去重关联
+        ("index", "dav_web_actor", "idx_dav_web_actor_code", "code", "`code`"),
+        ("index", "dav_web_genre", "idx_dav_web_genre_code", "code", "`code`"),
+        ("index", "dav_web_studio", "idx_dav_web_studio_code", "code", "`code`"),
+        # 已刮削记录的 JSON 字段 -> 关联表 (只执行一次)
+        ("call", backfill_web_tags),
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def index_exists(cursor, table: str, name: str) -> bool:
+    """索引是否存在"""
+    if DB_ENGINE == "sqlite":
+        await cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND tbl_name=? AND name=?", (table, name,))
+    else:
+        await cursor.execute("SELECT 1 FROM information_schema.statistics WHERE table_schema=DATABASE() AND table_name=%s AND index_name=%s", (table, name,))
+    return await cursor.fetchone() is not None
+
+async def column_exists(cursor, table: str, column: str) -> bool:
+    """字段是否存在"""
+    if DB_ENGINE == "sqlite":
+        await cursor.execute(f"PRAGMA table_info({table})")
+        return any(row["name"] == column for row in await cursor.fetchall())
+    await cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_schema=DATABASE() AND table_name=%s AND column_name=%s", (table, column,))
+    return await cursor.fetchone() is not None
+
+async def apply_step(cursor, step: tuple) -> None:
+    """执行单个迁移步骤"""
+    kind = step[0]
+    if kind == "index":
+        _, table, name, sqlite_fields, mysql_fields = step
+        if await index_exists(cursor, table, name):
+            logger.debug(f"index exists: {table}.{name}")
+            return
+        if DB_ENGINE == "sqlite":
+            query = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({sqlite_fields})"
+        else:
+            query = f"ALTER TABLE {table} ADD INDEX {name} ({mysql_fields}), ALGORITHM=INPLACE, LOCK=NONE"
+    elif kind == "column":
+        _, table, column, sqlite_define, mysql_define = step
+        if await column_exists(cursor, table, column):
+            logger.debug(f"column exists: {table}.{column}")
+            return
+        if DB_ENGINE == "sqlite":
+            query = f"ALTER TABLE {table} ADD COLUMN {column} {sqlite_define}"
+        else:
+            query = f"ALTER TABLE {table} ADD COLUMN `{column}` {mysql_define}, ALGORITHM=INPLACE, LOCK=NONE"
+    elif kind == "table":
+        _, table, sqlite_query, mysql_query = step
+        query = sqlite_query if DB_ENGINE == "sqlite" else mysql_query
+    elif kind == "sql":
+        _, sqlite_query, mysql_query = step
+        query = sqlite_query if DB_ENGINE == "sqlite" else mysql_query
+    elif kind == "call":
+        _, migrate = step
+        logger.debug(f"migrate: {migrate.__name__}")
+        await migrate(cursor)
+        return
+    else:
+        raise ValueError(f"Unknown migration step: {kind}")
+    logger.debug(f"migrate: {query}")
+    await cursor.execute(query)
+
+async def get_schema_version(cursor) -> int:
+    """当前数据库版本"""
+    if DB_ENGINE == "sqlite":
+        await cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dav_schema (
+                version      INTEGER  PRIMARY KEY,
+                name         TEXT     DEFAULT '',
+                applied_time DATETIME DEFAULT CURRENT_TIMESTAMP
+            )""")
+    else:
+        await cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dav_schema (
+                `version`               int           NOT NULL      COMMENT '版本',
+                `name`                  varchar(128)  DEFAULT ''    COMMENT '说明',
+                `applied_time`          datetime      DEFAULT NOW() COMMENT '执行时间',
+                PRIMARY KEY (`version`)  USING BTREE
+            ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
+            """)
+    await cursor.execute("SELECT MAX(version) as version FROM dav_schema")
+    row = await cursor.fetchone()
+    row = convert_row_to_dict(row, cursor.description)  # 转换字典
+    return row['version'] or 0
+
+async def run_migrations(cursor) -> int:
+    """
+    按版本执行未执行的迁移, 每个版本单独提交
+    返回执行的版本数
+    """
+    async with transaction(cursor):
+        version = await get_schema_version(cursor)
+    applied = 0
+    for migration_version, name, steps in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        logger.info(f"Schema migrate: v{migration_version} {name}")
+        async with transaction(cursor):
+            for step in steps:
+                await apply_step(cursor, step)
+            insert_query = "INSERT INTO dav_schema (version, name) VALUES (%s, %s)"
+            insert_query = format_query_for_db(insert_query)
+            await cursor.execute(insert_query, (migration_version, name,))
+        applied += 1
+    if applied and DB_ENGINE == "sqlite":
+        # 更新统计信息 (sqlite_stat1), 让查询规划器按选择性使用新索引
+        async with transaction(cursor):
+            await cursor.execute("ANALYZE")
+    return applied
+
+async def migrate_schema() -> int:
+    """启动时执行迁移"""
+    async with get_db_app() as cursor:
+        applied = await run_migrations(cursor)
+    if applied:
+        logger.success(f"Schema migrated to v{SCHEMA_VERSION}, applied: {applied}")
+    else:
+        logger.info(f"Schema is up to date: v{SCHEMA_VERSION}")
+    return applied
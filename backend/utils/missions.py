@@ -0,0 +1,187 @@
+# -*- coding: UTF8 -*-
+import json
+import time
+import asyncio
+from datetime import datetime as dt, timedelta
+from loguru import logger
+
+from utils.db import get_db_app, transaction, format_query_for_db, fetchone_dict
+from utils.workers import WORKER_ID
+from config import MISSION_LEASE
+
+"""
+Web 进程内的后台任务 (dav_missions)
+ - 同一类型 (同一 path, 如扫盘的根目录) 同时只运行一个, 重复启动返回正在运行的任务
+ - 进度 total/progress/checkpoint/rate/counters 写入任务记录; 停止时保持 status=1, 下次启动从断点继续
+ - 状态: 0 等待 / 1 执行中 / 2 完成 / -1 失败
+ - 多 worker: 启动前原子认领 (owner 为空或租约过期才能写入自己的标识), 执行期间每 MISSION_LEASE/4 秒续约
+   其他 worker 的停止请求把 owner 改为 stop, 执行的 worker 续约失败后自行停止
+   进程异常退出时租约过期 (MISSION_LEASE 秒) 后可被重新认领
+"""
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+MISSION_STOPPING = "stop"
+
+MISSION_QUERY = format_query_for_db("SELECT id,type,path,total,progress,checkpoint,rate,counters,owner,status,created_time,updated_time FROM dav_missions WHERE type=%s and path=%s ORDER BY id DESC LIMIT 1")
+MISSION_PROGRESS_QUERY = format_query_for_db("UPDATE dav_missions SET status=%s, total=%s, progress=%s, checkpoint=%s, rate=%s, counters=%s, updated_time=%s WHERE id=%s")
+MISSION_INSERT_QUERY = format_query_for_db("INSERT INTO dav_missions (localid, path, file, type, status) VALUES (%s, %s, %s, %s, %s)")
+MISSION_CLAIM_QUERY = format_query_for_db("UPDATE dav_missions SET owner=%s, updated_time=%s WHERE id=%s and status in (0, 1) and (owner='' or owner=%s or updated_time<%s)")
+MISSION_RENEW_QUERY = format_query_for_db("UPDATE dav_missions SET updated_time=%s WHERE id=%s and owner=%s")
+MISSION_RELEASE_QUERY = format_query_for_db("UPDATE dav_missions SET owner='' WHERE id=%s and owner in (%s, %s)")
+MISSION_STOP_QUERY = format_query_for_db("UPDATE dav_missions SET owner=%s WHERE id=%s and status in (0, 1) and owner not in ('', %s)")
+
+
+def now_time() -> str:
+    return dt.now().strftime(DATETIME_FORMAT)
+
+def lease_expired_time() -> str:
+    """早于此时间未续约的任务视为无人执行"""
+    return (dt.now() - timedelta(seconds=MISSION_LEASE)).strftime(DATETIME_FORMAT)
+
+def lease_active(mission: dict) -> bool:
+    """任务被某个 worker 持有且租约未过期"""
+    if not mission['owner'] or mission['status'] not in (0, 1):
+        return False
+    updated_time = mission['updated_time']
+    if isinstance(updated_time, dt):
+        updated_time = updated_time.strftime(DATETIME_FORMAT)
+    return bool(updated_time) and updated_time >= lease_expired_time()
+
+
+class BackgroundMission:
+    """
+    单个类型的后台任务
+    run(cursor, mission, state): 从 mission['checkpoint'] 继续执行, 通过 save() 记录进度
+    counters: state 中的计数字段, 每次启动清零
+    path: 任务记录的 path, 同一类型按 path 区分 (默认 '')
+    """
+    def __init__(self, mission_type: int, name: str, run, counters: tuple = (), path: str = ''):
+        self.type = mission_type
+        self.name = name
+        self.path = path
+        self.run = run
+        self.counters = counters
+        self.task: asyncio.Task | None = None
+        self.state = {"mission": 0, **{counter: 0 for counter in counters}}
+        self.started = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def save(self, cursor, mission: dict, status: int, tx: bool = True) -> None:
+        """
+        写入进度
+        tx=False 时不单独提交, 由调用方事务与本批结果一起提交
+        """
+        mission['status'] = status
+        counters = json.dumps({counter: self.state[counter] for counter in self.counters})
+        values = (status, mission['total'], mission['progress'], mission['checkpoint'], mission['rate'], counters, now_time(), mission['id'],)
+        if not tx:
+            await cursor.execute(MISSION_PROGRESS_QUERY, values)
+            return
+        async with transaction(cursor):
+            await cursor.execute(MISSION_PROGRESS_QUERY, values)
+
+    def rate(self, done: float) -> float:
+        """本次启动以来的速度 (done / 秒)"""
+        return round(done / max(time.monotonic() - self.started, 1e-6), 3)
+
+    async def heartbeat(self, mission_id: int) -> None:
+        """续约; 失去归属 (其他 worker 请求停止) 时停止本任务"""
+        while True:
+            await asyncio.sleep(MISSION_LEASE / 4)
+            async with transaction() as cursor:
+                await cursor.execute(MISSION_RENEW_QUERY, (now_time(), mission_id, WORKER_ID,))
+                renewed = cursor.rowcount
+            if not renewed:
+                logger.info(f"{self.name} mission {mission_id} released by another worker, stopping")
+                self.task.cancel()
+                return
+
+    async def execute(self, mission_id: int) -> None:
+        self.state.update(mission=mission_id, **{counter: 0 for counter in self.counters})
+        self.started = time.monotonic()
+        heartbeat = asyncio.create_task(self.heartbeat(mission_id))
+        async with get_db_app() as cursor:
+            try:
+                await cursor.execute(MISSION_QUERY, (self.type, self.path,))
+                mission = await fetchone_dict(cursor)
+                mission['checkpoint'] = mission['checkpoint'] or ''
+                mission['progress'] = mission['progress'] or 0
+                mission['total'] = mission['total'] or 0
+                mission['rate'] = 0
+                try:
+                    await self.run(cursor, mission, self.state)
+                    await self.save(cursor, mission, 2)
+                    logger.success(f"{self.name} mission {mission_id} completed! {self.state}")
+                except asyncio.CancelledError:
+                    # 停止时保持 status=1, 重启后从断点继续
+                    logger.info(f"{self.name} mission {mission_id} paused at: {mission['checkpoint']}")
+                    raise
+                except Exception as e:
+                    logger.error(f"{self.name} mission {mission_id} failed: {str(e)}")
+                    await self.save(cursor, mission, -1)
+            finally:
+                heartbeat.cancel()
+                async with transaction(cursor):
+                    await cursor.execute(MISSION_RELEASE_QUERY, (mission_id, WORKER_ID, MISSION_STOPPING,))
+
+    async def start(self, create: bool = True) -> int:
+        """
+        启动任务 (同一时间只运行一个, 多 worker 时由认领保证)
+        存在未完成的任务则从断点继续, 否则 create=True 时新建任务
+        任务正由其他 worker 执行时直接返回任务ID
+        return 任务ID, 0 为没有任务
+        """
+        if self.running:
+            return self.state["mission"]
+        async with transaction() as cursor:
+            await cursor.execute(MISSION_QUERY, (self.type, self.path,))
+            mission = await fetchone_dict(cursor)
+            if mission and mission['status'] in (0, 1):
+                mission_id = mission['id']
+            elif create:
+                await cursor.execute(MISSION_INSERT_QUERY, (0, self.path, '', self.type, 0,))
+                mission_id = cursor.lastrowid
+            else:
+                return 0
+            await cursor.execute(MISSION_CLAIM_QUERY, (WORKER_ID, now_time(), mission_id, WORKER_ID, lease_expired_time(),))
+            claimed = cursor.rowcount
+        if not claimed:
+            logger.debug(f"{self.name} mission {mission_id} is running in another worker")
+            return mission_id
+        self.task = asyncio.create_task(self.execute(mission_id))
+        return mission_id
+
+    async def stop(self, all_workers: bool = False) -> None:
+        """
+        停止任务 (保留断点)
+        all_workers=True 时任务由其他 worker 执行则请求其停止, 否则只停止本进程内的任务 (关闭时)
+        """
+        if self.running:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        elif all_workers:
+            async with transaction() as cursor:
+                await cursor.execute(MISSION_QUERY, (self.type, self.path,))
+                mission = await fetchone_dict(cursor)
+                if mission is not None:
+                    await cursor.execute(MISSION_STOP_QUERY, (MISSION_STOPPING, mission['id'], MISSION_STOPPING,))
+        self.task = None
+
+    async def status(self, cursor) -> dict | None:
+        """最近一次任务的进度 (计数取本进程实时值, 其他 worker 执行时取最近一次保存的值)"""
+        await cursor.execute(MISSION_QUERY, (self.type, self.path,))
+        mission = await fetchone_dict(cursor)
+        if mission is None:
+            return None
+        counters = json.loads(mission.pop('counters') or '{}')
+        if self.state["mission"] == mission['id']:
+            counters = {counter: self.state[counter] for counter in self.counters}
+        mission.update({counter: counters.get(counter, 0) for counter in self.counters})
+        mission['running'] = (self.running and self.state["mission"] == mission['id']) or lease_active(mission)
+        return mission
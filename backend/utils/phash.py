@@ -0,0 +1,169 @@
+# -*- coding: UTF8 -*-
+import cv2
+import numpy as np
+
+from config import PHASH_FRAMES
+
+"""
+感知哈希 (近似重复检测)
+ - 单帧: 灰度缩放到 32x32, DCT 取左上 8x8 低频系数, 与中位数比较得到 64 bit
+ - 视频: 在 PHASH_FRAMES 个均匀位置取帧, 各帧哈希按位多数表决合成一个 64 bit 整数
+   重新编码 / 不同分辨率 / 不同码率的同一视频哈希相同或只差几位
+   纯色帧 (黑场/白场) 不参与; 没有可用帧时为 0 (不参与比较), 未计算为 NULL
+ - 数据库按有符号 64 位整数存储 (dav_local.phash)
+ - 查找: 多索引哈希, 64 bit 分 4 段 × 16 bit, 距离 ≤ 7 的两个哈希至少有一段相差不超过 1 位
+   每段按值分桶后批量查找 (原值 + 16 个单比特翻转), 候选对再用完整汉明距离过滤
+   全部为 NumPy 向量运算, 不逐个比较
+"""
+
+PHASH_BITS = 64
+PHASH_CHUNKS = 4
+PHASH_CHUNK_BITS = PHASH_BITS // PHASH_CHUNKS
+PHASH_MAX_DISTANCE = PHASH_CHUNKS * 2 - 1  # 多索引查找的召回上限
+PHASH_FLAT_STD = 4.0  # 灰度标准差低于此值视为纯色帧
+BIT_WEIGHTS = np.uint64(1) << np.arange(PHASH_BITS - 1, -1, -1, dtype=np.uint64)
+
+
+def frame_phash(frame) -> int | None:
+    """单帧 64 bit 感知哈希, 纯色帧返回 None"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    if small.std() < PHASH_FLAT_STD:
+        return None
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])  # 中位数不含直流分量
+    return int((bits.astype(np.uint64) * BIT_WEIGHTS).sum())
+
+def combine_hashes(hashes: list) -> int:
+    """多帧哈希按位多数表决"""
+    if not hashes:
+        return 0
+    bits = (np.array(hashes, dtype=np.uint64)[:, None] & BIT_WEIGHTS) != 0
+    majority = bits.sum(axis=0) * 2 > len(hashes)
+    return int((majority.astype(np.uint64) * BIT_WEIGHTS).sum())
+
+def video_phash(cap, frame_count: int, frames: int = PHASH_FRAMES) -> int:
+    """
+    视频感知哈希 (使用已打开的 cv2.VideoCapture, 与截图共用解码)
+    return 64 bit 无符号整数, 没有可用帧返回 0
+    """
+    hashes = []
+    for i in range(frames):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_count * (i + 1) / (frames + 1)))
+        result, frame = cap.read()
+        if not result:
+            continue
+        frame_hash = frame_phash(frame)
+        if frame_hash is not None:
+            hashes.append(frame_hash)
+    return combine_hashes(hashes)
+
+def file_phash(video_name: str, frames: int = PHASH_FRAMES) -> int:
+    """视频文件感知哈希, 无法打开返回 0"""
+    cap = cv2.VideoCapture(video_name)
+    try:
+        if not cap.isOpened():
+            return 0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frame_count <= 0:
+            return 0
+        return video_phash(cap, frame_count, frames)
+    finally:
+        cap.release()
+
+def to_db_phash(value: int) -> int:
+    """无符号 64 位 => 有符号 (SQLite INTEGER / MySQL BIGINT)"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """uint64 数组逐个统计 1 的位数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.int64)
+    counts = np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1)  # NumPy < 2.0
+    return counts.sum(axis=1, dtype=np.int64)
+
+def chunk_pairs(keys: np.ndarray, hashes: np.ndarray, index: tuple, flip: int, distance: int) -> tuple:
+    """
+    段值满足 keys[i] ^ flip == keys[j] 且完整汉明距离 ≤ distance 的所有 (i, j), i < j
+    index : (按段值排序的下标, 排序后的哈希, 每个段值在排序中的起点, 数量)
+    先用连续存放的排序哈希过滤候选, 只为命中的对计算下标
+    """
+    order, sorted_hashes, offsets, sizes = index
+    if flip:
+        # 翻转位为 0 的一侧查询即可, 另一侧得到的是同一批对
+        query = np.nonzero((keys & np.uint32(flip)) == 0)[0]
+        targets = keys[query] ^ np.uint32(flip)
+    else:
+        query = np.arange(len(keys))
+        targets = keys
+    counts = sizes[targets]
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    positions = np.arange(total) + np.repeat(offsets[targets] - (np.cumsum(counts) - counts), counts)
+    near = popcount(np.repeat(hashes[query], counts) ^ sorted_hashes[positions]) <= distance
+    first = np.repeat(query, counts)[near]
+    second = order[positions[near]]
+    if not flip:
+        keep = first < second
+        return first[keep], second[keep]
+    return np.minimum(first, second), np.maximum(first, second)
+
+def find_near_pairs(hashes: np.ndarray, distance: int) -> tuple:
+    """
+    所有汉明距离 ≤ distance 的哈希对
+    hashes   : uint64 数组
+    distance : 不超过 PHASH_MAX_DISTANCE
+    return (i, j, 距离) 三个数组, i < j, 每对只出现一次
+    """
+    distance = max(0, min(distance, PHASH_MAX_DISTANCE))
+    flips = [0] if distance < PHASH_CHUNKS else [0] + [1 << b for b in range(PHASH_CHUNK_BITS)]
+    found = []
+    for chunk in range(PHASH_CHUNKS):
+        keys = ((hashes >> np.uint64(chunk * PHASH_CHUNK_BITS)) & np.uint64(0xFFFF)).astype(np.uint32)
+        order = np.argsort(keys, kind='stable')
+        sizes = np.bincount(keys, minlength=1 << PHASH_CHUNK_BITS)
+        index = (order, hashes[order], np.cumsum(sizes) - sizes, sizes)
+        for flip in flips:
+            first, second = chunk_pairs(keys, hashes, index, flip, distance)
+            if len(first):
+                found.append(first * len(hashes) + second)
+    if not found:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+    # 同一对可能在多个段命中, 去重
+    pairs = np.unique(np.concatenate(found))
+    first, second = pairs // len(hashes), pairs % len(hashes)
+    return first, second, popcount(hashes[first] ^ hashes[second])
+
+def cluster_pairs(first: np.ndarray, second: np.ndarray) -> list:
+    """按相似对合并为重复组 (并查集), return [[下标, ...], ...] 组内下标升序"""
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(x, x) != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    clusters = {}
+    for x in set(first.tolist()) | set(second.tolist()):
+        clusters.setdefault(find(x), []).append(x)
+    return [sorted(members) for members in clusters.values()]
+
+def find_duplicate_clusters(ids: list, values: list, distance: int) -> list:
+    """
+    近似重复组
+    ids / values : dav_local.id 与 phash (有符号存储值, 0 已排除)
+    return [[id, ...], ...]
+    """
+    if len(values) < 2:
+        return []
+    hashes = np.array(values, dtype=np.int64).view(np.uint64)
+    first, second, _ = find_near_pairs(hashes, distance)
+    return [[ids[i] for i in members] for members in cluster_pairs(first, second)]
@@ -0,0 +1,132 @@
+# -*- coding: UTF8 -*-
+import json
+import asyncio
+from datetime import datetime as dt, timedelta
+from loguru import logger
+
+from utils.db import transaction, format_query_for_db, fetchone_dict, fetchall_dict
+from utils.missions import BackgroundMission, DATETIME_FORMAT, now_time
+from utils.cache import invalidate_cache
+from utils.tags import save_web_tags
+from utils.web import fetch_text, get_code_source
+from utils.images import warm_images
+from config import PREFETCH_CONCURRENCY, PREFETCH_BATCH, PREFETCH_RETRIES, PREFETCH_MISS_DAYS, IMAGE_PREFETCH
+
+"""
+元数据批量预取 (任务类型 5)
+ - 查找 dav_local 中 dav_web 不存在的识别码, 按识别码顺序分批抓取
+ - 每批并发抓取 (PREFETCH_CONCURRENCY), 站点并发/频率由 fetch_text 限制
+ - 连接错误按指数退避重试; 未找到的识别码写入 dav_web_miss, PREFETCH_MISS_DAYS 天内不再查询
+ - 每批一次事务写入结果并记录断点 (本批最后一个识别码), 重启后从断点继续
+ - IMAGE_PREFETCH 时在后台镜像抓取到的封面/预览图
+"""
+
+MISSION_TYPE_PREFETCH = 5
+
+PREFETCH_WHERE = """dl.status=0 AND dl.code!=''
+                        AND NOT EXISTS (SELECT 1 FROM dav_web dw WHERE dw.code = dl.code)
+                        AND NOT EXISTS (SELECT 1 FROM dav_web_miss dm WHERE dm.code = dl.code AND dm.updated_time > %s)"""
+PREFETCH_COUNT_QUERY = format_query_for_db(f"""SELECT count(DISTINCT dl.code) as len
+                        FROM dav_local dl
+                        WHERE {PREFETCH_WHERE} AND dl.code > %s""")
+PREFETCH_CODES_QUERY = format_query_for_db(f"""SELECT DISTINCT dl.code
+                        FROM dav_local dl
+                        WHERE {PREFETCH_WHERE} AND dl.code > %s
+                        ORDER BY dl.code ASC
+                        LIMIT %s""")
+PREFETCH_INSERT_QUERY = format_query_for_db("INSERT INTO dav_web (code,name,date,studio,director,series,genre,websites,actors,images,status) SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM dav_web WHERE code=%s)")
+MISS_UPDATE_QUERY = format_query_for_db("UPDATE dav_web_miss SET attempts=attempts+1, updated_time=%s WHERE code=%s")
+MISS_INSERT_QUERY = format_query_for_db("INSERT INTO dav_web_miss (code, attempts, created_time, updated_time) SELECT %s, 1, %s, %s WHERE NOT EXISTS (SELECT 1 FROM dav_web_miss WHERE code=%s)")
+
+
+async def prefetch_code(code: str) -> tuple:
+    """
+    抓取单个识别码
+    return (结果, code_info): found / miss / error
+    """
+    code_name, code_url, parser = get_code_source(code)
+    try:
+        response = await fetch_text(code_url, retries=PREFETCH_RETRIES)
+        code_info = parser(code_name, code_url, response)
+    except Exception as e:
+        logger.warning(f"prefetch error: {code} - {str(e)}")
+        return "error", None
+    if code_info is None:
+        return "miss", None
+    code_info['code'] = code  # 与 dav_local.code 一致, 保证关联
+    return "found", code_info
+
+async def save_prefetch_batch(cursor, found: list, missed: list, now: str) -> None:
+    """批量写入抓取结果 / 未找到记录"""
+    if found:
+        values = [(code_info['code'], code_info['name'], code_info['date'], code_info['studio'], code_info['director'], code_info['series'], json.dumps(code_info['genre'], ensure_ascii=False),  json.dumps(code_info['websites']), json.dumps(code_info['actors'], ensure_ascii=False), json.dumps(code_info['images'], ensure_ascii=False), 1, code_info['code'],) for code_info in found]
+        logger.debug(f"insert_query: {PREFETCH_INSERT_QUERY} values: {len(values)}")
+        await cursor.executemany(PREFETCH_INSERT_QUERY, values)
+        for code_info in found:
+            await save_web_tags(cursor, code_info)
+    if missed:
+        await cursor.executemany(MISS_UPDATE_QUERY, [(now, code,) for code in missed])
+        await cursor.executemany(MISS_INSERT_QUERY, [(code, now, now, code,) for code in missed])
+
+async def run_prefetch(cursor, mission: dict, state: dict) -> None:
+    """执行预取任务, 从任务断点继续"""
+    miss_before = (dt.now() - timedelta(days=PREFETCH_MISS_DAYS)).strftime(DATETIME_FORMAT)
+    await cursor.execute(PREFETCH_COUNT_QUERY, (miss_before, mission['checkpoint'],))
+    mission['total'] = mission['progress'] + (await fetchone_dict(cursor))['len']
+    logger.info(f"Prefetch mission {mission['id']} starting - total: {mission['total']} progress: {mission['progress']} checkpoint: {mission['checkpoint']}")
+
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def fetch(code):
+        async with semaphore:
+            return await prefetch_code(code)
+
+    done = 0
+    await prefetch_mission.save(cursor, mission, 1)
+    while True:
+        await cursor.execute(PREFETCH_CODES_QUERY, (miss_before, mission['checkpoint'], PREFETCH_BATCH,))
+        codes = [row['code'] for row in await fetchall_dict(cursor)]
+        if not codes:
+            break
+        results = await asyncio.gather(*(fetch(code) for code in codes))
+
+        found, missed = [], []
+        for code, (result, code_info) in zip(codes, results):
+            if result == "found":
+                found.append(code_info)
+            elif result == "miss":
+                missed.append(code)
+            else:
+                state["errors"] += 1  # 连接错误不记入负缓存, 下次任务重试
+        state["found"] += len(found)
+        state["missed"] += len(missed)
+
+        done += len(codes)
+        mission.update(checkpoint=codes[-1], progress=mission['progress'] + len(codes), rate=prefetch_mission.rate(done))
+        async with transaction(cursor):
+            await save_prefetch_batch(cursor, found, missed, now_time())
+            await prefetch_mission.save(cursor, mission, 1, tx=False)
+        if found:
+            await invalidate_cache('dav_web')
+            if IMAGE_PREFETCH:
+                warm_images([image for code_info in found for image in code_info['images']])
+        logger.info(f"Prefetch {mission['progress']}/{mission['total']} - checkpoint: {mission['checkpoint']} found: {len(found)} missed: {len(missed)} rate: {mission['rate']}/s")
+
+
+prefetch_mission = BackgroundMission(MISSION_TYPE_PREFETCH, "Prefetch", run_prefetch, ("found", "missed", "errors"))
+
+async def start_prefetch(create: bool = True) -> int:
+    """
+    启动预取任务 (同一时间只运行一个)
+    存在未完成的任务则从断点继续, 否则 create=True 时新建任务
+    return 任务ID, 0 为没有任务
+    """
+    return await prefetch_mission.start(create)
+
+async def stop_prefetch() -> None:
+    """停止当前进程内的预取任务 (保留断点)"""
+    await prefetch_mission.stop()
+
+async def get_prefetch_status(cursor) -> dict | None:
+    """最近一次预取任务的进度"""
+    return await prefetch_mission.status(cursor)
@@ -9,10 +9,14 @@
 @Descripttion : "redis连接初始化"
 """
 
+import asyncio
 from fastapi import FastAPI
 from fastapi.requests import Request
 from pydantic import Field
 from redis import asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 from typing import Union, Annotated
 from loguru import logger
 
@@ -20,20 +24,36 @@ from config import REDIS_CONFIG
 
 
 class RedisMixin:
-    def __init__(self):
+    def __init__(self, decode_responses: bool = True):
         self.mode: str = REDIS_CONFIG['mode']
         self.host: str = REDIS_CONFIG['host']
         self.username: str = REDIS_CONFIG['username']
         self.password: str = REDIS_CONFIG['password']
         self.db: int = REDIS_CONFIG['db']
-        self.sentinel_name: str = None
+        self.sentinel_name: str = REDIS_CONFIG['sentinel_name']
         self.encoding: str = 'utf-8'
-        self.decode_responses: bool = True
-        self.max_connections: int = 2000
+        self.decode_responses: bool = decode_responses
+        self.max_connections: int = REDIS_CONFIG['max_connections']
+        self.timeout: int = REDIS_CONFIG['timeout']
+        self.health_check_interval: int = REDIS_CONFIG['health_check']
+        self.retries: int = REDIS_CONFIG['retries']
         self.ssl: bool = False
         self.ssl_cert_reqs: str = None
         self.ssl_ca_certs: str = None
 
+    @property
+    def pool_options(self) -> dict:
+        """
+        连接池参数: 连接数上限 / 超时 / 空闲连接健康检查 / 断线指数退避重试
+        :return:
+        """
+        return dict(max_connections=self.max_connections,
+                    socket_timeout=self.timeout,
+                    socket_connect_timeout=self.timeout,
+                    health_check_interval=self.health_check_interval,
+                    retry=Retry(ExponentialBackoff(cap=2, base=0.05), self.retries),
+                    retry_on_error=[RedisConnectionError, RedisTimeoutError])
+
     @property
     async def redis_standalone_conn(self) -> aioredis.Redis:
         """
@@ -47,13 +67,13 @@ class RedisMixin:
                               password=self.password,
                               db=self.db,
                               decode_responses=self.decode_responses,
-                              max_connections=self.max_connections,
                               ssl=self.ssl,
                               ssl_cert_reqs=self.ssl_cert_reqs,
-                              ssl_ca_certs=self.ssl_ca_certs)
+                              ssl_ca_certs=self.ssl_ca_certs,
+                              **self.pool_options)
 
     @property
-    async def redis_sentinel_conn(self) -> aioredis.Sentinel:
+    async def redis_sentinel_conn(self) -> aioredis.Redis:
         """
         哨兵
         :return:
@@ -65,15 +85,19 @@ class RedisMixin:
             sentinel_list.append(
                 (sentinel_host, sentinel_port)
             )
-        return aioredis.Sentinel(sentinels=sentinel_list,
-                                 username=self.username,
-                                 password=self.password,
-                                 db=self.db,
-                                 decode_responses=self.decode_responses,
-                                 max_connections=self.max_connections,
-                                 ssl=self.ssl,
-                                 ssl_cert_reqs=self.ssl_cert_reqs,
-                                 ssl_ca_certs=self.ssl_ca_certs)
+        sentinel = aioredis.Sentinel(sentinels=sentinel_list,
+                                     socket_timeout=self.timeout,
+                                     sentinel_kwargs={"username": self.username, "password": self.password})
+        # 通过哨兵发现主节点, 主从切换后连接池自动重连新主节点
+        return sentinel.master_for(self.sentinel_name,
+                                   username=self.username,
+                                   password=self.password,
+                                   db=self.db,
+                                   decode_responses=self.decode_responses,
+                                   ssl=self.ssl,
+                                   ssl_cert_reqs=self.ssl_cert_reqs,
+                                   ssl_ca_certs=self.ssl_ca_certs,
+                                   **self.pool_options)
 
     @property
     async def redis_cluster_conn(self) -> aioredis.RedisCluster:
@@ -94,23 +118,32 @@ class RedisMixin:
                                      decode_responses=self.decode_responses,
                                      ssl=self.ssl,
                                      ssl_cert_reqs=self.ssl_cert_reqs,
-                                     ssl_ca_certs=self.ssl_ca_certs)
+                                     ssl_ca_certs=self.ssl_ca_certs,
+                                     **self.pool_options)
 
     @property
-    async def connect_redis(self):
+    async def create_redis(self):
         """
-        连接redis
+        创建客户端 (不连接, 首次命令时建立连接)
         """
 
         if self.mode == "standalone":
             redis_conn: aioredis.Redis = await self.redis_standalone_conn
         elif self.mode == "sentinel":
-            redis_conn: aioredis.Sentinel = await self.redis_sentinel_conn
+            redis_conn: aioredis.Redis = await self.redis_sentinel_conn
         elif self.mode == "cluster":
             redis_conn: aioredis.RedisCluster = await self.redis_cluster_conn
         else:
             raise ValueError("Redis mode not supported")
+        return redis_conn
 
+    @property
+    async def connect_redis(self):
+        """
+        连接redis
+        """
+
+        redis_conn = await self.create_redis
         try:
             await redis_conn.ping()
             return redis_conn
@@ -119,29 +152,78 @@ class RedisMixin:
             return None
 
 
+redisCache = Annotated[
+    Union[aioredis.Redis, aioredis.RedisCluster], Field(description="redis联合类型")]
+
+
+# 应用级共享客户端: lifespan 中创建, 各缓存函数复用同一个连接池
+redis_client: redisCache = None
+# 二进制客户端 (decode_responses=False): 存取 msgpack 等序列化后的缓存值
+redis_raw_client: redisCache = None
+redis_client_lock = asyncio.Lock()
+
+
+async def init_redis() -> redisCache:
+    """
+    创建共享客户端并测试连接
+    Redis 暂不可用时仍保留客户端, 由连接池在后续命令中按退避策略重连
+    """
+    global redis_client
+    async with redis_client_lock:
+        if redis_client is None:
+            redis_client = await RedisMixin().create_redis
+    try:
+        await redis_client.ping()
+        logger.info(f"Redis connected: {REDIS_CONFIG['mode']} {REDIS_CONFIG['host']}")
+    except Exception as e:
+        logger.warning(f"Redis连接失败: {e}")
+    return redis_client
+
+
+async def close_redis() -> None:
+    """关闭共享客户端 (释放连接池)"""
+    global redis_client, redis_raw_client
+    clients = [client for client in (redis_client, redis_raw_client) if client is not None]
+    redis_client = redis_raw_client = None
+    for client in clients:
+        await client.aclose()
+
+
 async def register_redis(app: FastAPI):
-    # 注册redis测试连接
-    app.state.cache = await RedisMixin().connect_redis
+    # 注册redis共享客户端
+    app.state.cache = await init_redis()
 
 
-redisCache = Annotated[
-    Union[aioredis.Redis, aioredis.Sentinel, aioredis.RedisCluster], Field(description="redis联合类型")]
+async def get_redis_client() -> redisCache:
+    """
+    获取共享客户端
+    未经 lifespan 初始化时 (如 app.py 任务进程) 首次调用时创建
+    """
+    global redis_client
+    if redis_client is None:
+        async with redis_client_lock:
+            if redis_client is None:
+                redis_client = await RedisMixin().create_redis
+    return redis_client
+
+
+async def get_redis_raw_client() -> redisCache:
+    """获取共享二进制客户端, 首次调用时创建"""
+    global redis_raw_client
+    if redis_raw_client is None:
+        async with redis_client_lock:
+            if redis_raw_client is None:
+                redis_raw_client = await RedisMixin(decode_responses=False).create_redis
+    return redis_raw_client
 
 
 async def get_redis() -> redisCache:
     try:
-        _redis_coon = await RedisMixin().connect_redis
-        if _redis_coon is None:
-            yield None
-
-        try:
-            yield _redis_coon
-        finally:
-            await _redis_coon.close()
+        _redis_client = await get_redis_client()
     except Exception as e:
-        if _redis_coon is not None:
-            await _redis_coon.close()
-        yield None
+        logger.error(f"Redis client error: {e}")
+        _redis_client = None
+    yield _redis_client
 
 
 if __name__ == "__main__":
@@ -1,6 +1,57 @@
 import json
 from typing import List, Union
 
+try:
+    import msgpack  # 可选: 未安装时使用 JSON
+except ImportError:
+    msgpack = None
+
+
+# 缓存值类型信封: 2 字节前缀标明编码, 读取时无需试探解析
+# 旧版本写入的值没有前缀 (首字节不会是 \x00), 按旧方式解析
+ENVELOPE_MSGPACK = b"\x00m"
+ENVELOPE_JSON = b"\x00j"
+ENVELOPE_STR = b"\x00s"
+ENVELOPE_BYTES = b"\x00b"
+
+
+def dumps_value(value) -> bytes:
+    """
+    序列化缓存值
+    str/bytes 原样存储, 其他类型优先 msgpack, 未安装时 JSON
+    """
+    if isinstance(value, str):
+        return ENVELOPE_STR + value.encode("utf-8")
+    if isinstance(value, (bytes, bytearray)):
+        return ENVELOPE_BYTES + bytes(value)
+    if msgpack is not None:
+        return ENVELOPE_MSGPACK + msgpack.packb(value, default=str, use_bin_type=True)
+    return ENVELOPE_JSON + json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def loads_value(data):
+    """
+    反序列化缓存值, None 表示不存在
+    """
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    envelope, payload = data[:2], data[2:]
+    if envelope == ENVELOPE_MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    if envelope == ENVELOPE_JSON:
+        return json.loads(payload)
+    if envelope == ENVELOPE_STR:
+        return payload.decode("utf-8")
+    if envelope == ENVELOPE_BYTES:
+        return payload
+    # 旧格式: JSON 文本或普通字符串
+    data = data.decode("utf-8", errors="replace")
+    return json.loads(data) if is_json(data) else data
+
 
 def is_json(data):
     """
@@ -0,0 +1,109 @@
+# -*- coding: UTF8 -*-
+import os
+import time
+import asyncio
+from loguru import logger
+
+from utils.missions import BackgroundMission
+from utils.local import SCAN_COUNTERS, build_moved_index, tree_scope, scan_dir
+from config import SCAN_PATH, PATH_FILTER_LIST
+
+"""
+扫盘任务 (任务类型 3)
+ - 每个根目录一个任务 (dav_missions.path), 同一根目录同时只运行一个, 重复点击返回正在运行的任务
+ - 按目录名排序的先序遍历, 断点为最后完成的目录; 停止/重启后再次启动从断点之后继续
+   断点每 SCAN_SAVE_INTERVAL 秒保存一次, 恢复时可能重复扫描几个目录 (已入库的文件直接跳过)
+ - 目录遍历在线程中执行, 慢速存储不阻塞事件循环
+ - 计数: dirs / files / inserted / moved / skipped / errors / vanished, rate 为 文件/秒
+"""
+
+MISSION_TYPE_SCAN = 3
+SCAN_SAVE_INTERVAL = 2  # 进度保存间隔秒数
+
+scan_missions = {}  # 根目录 -> BackgroundMission
+
+
+def walk_key(root: str, path: str) -> tuple:
+    """目录在先序遍历 (子目录按名称排序) 中的位置, 可直接比较先后"""
+    relative = os.path.relpath(path, root)
+    return () if relative == os.curdir else tuple(relative.split(os.sep))
+
+def sorted_walk(root: str):
+    """子目录按名称排序的 os.walk, 遍历顺序固定"""
+    for fpathe, dirs, files in os.walk(root):
+        dirs.sort()
+        yield fpathe, dirs, files
+
+async def run_scan(cursor, mission: dict, state: dict) -> None:
+    """执行扫盘任务, 从断点目录之后继续"""
+    root = mission['path']
+    checkpoint = walk_key(root, mission['checkpoint']) if mission['checkpoint'] else None
+    logger.info(f"Scan mission {mission['id']} starting - path: {root} progress: {mission['progress']} checkpoint: {mission['checkpoint']}")
+
+    # 只检查本根目录下的记录: 各根目录的任务并发运行, 不会匹配到同一条记录
+    moved_index, unindexed = await build_moved_index([tree_scope(root)])
+    logger.info(f"scan moved index: {sum(map(len, moved_index.values()))} vanished files, without fingerprint: {len(unindexed)}")
+
+    await scan_missions[root].save(cursor, mission, 1)
+    saved = time.monotonic()
+    walker = sorted_walk(root)
+    while True:
+        entry = await asyncio.to_thread(next, walker, None)
+        if entry is None:
+            break
+        fpathe, _, files = entry
+        # 断点之前 (含) 的目录已完成
+        if checkpoint is not None and walk_key(root, fpathe) <= checkpoint:
+            continue
+        # 路径关键字在过滤列表里
+        if any(filter in fpathe for filter in PATH_FILTER_LIST):
+            logger.trace(f"The path keywords are in the filter list - fpathe: {fpathe}")
+            continue
+
+        await scan_dir(cursor, fpathe, files, moved_index, state)
+        state["dirs"] += 1
+        mission.update(checkpoint=fpathe, progress=mission['progress'] + 1, rate=scan_missions[root].rate(state["files"]))
+        if time.monotonic() - saved >= SCAN_SAVE_INTERVAL:
+            await scan_missions[root].save(cursor, mission, 1)
+            saved = time.monotonic()
+
+    vanished = [local_file for local_files in moved_index.values() for local_file in local_files] + unindexed
+    state["vanished"] = len(vanished)
+    mission['total'] = mission['progress']
+    logger.success(f"Folder scan successful! path: {root} - {state}")
+
+
+def get_scan_mission(root: str) -> BackgroundMission:
+    if root not in scan_missions:
+        scan_missions[root] = BackgroundMission(MISSION_TYPE_SCAN, f"Scan {root}", run_scan, SCAN_COUNTERS, path=root)
+    return scan_missions[root]
+
+async def start_scan(localpaths: list) -> list:
+    """
+    启动扫盘任务 (每个根目录一个, 同一根目录同时只运行一个)
+    存在未完成的任务则从断点继续
+    return 任务ID列表
+    """
+    return [await get_scan_mission(localpath).start() for localpath in localpaths]
+
+async def stop_scan(localpaths: list | None = None) -> None:
+    """
+    停止扫盘任务 (保留断点, 再次启动时继续)
+    localpaths 为空时只停止本进程内的任务 (关闭时), 否则同时请求其他 worker 停止这些根目录的任务
+    """
+    if localpaths is None:
+        for mission in list(scan_missions.values()):
+            await mission.stop()
+        return
+    for localpath in localpaths:
+        await get_scan_mission(localpath).stop(all_workers=True)
+
+async def get_scan_status(cursor, localpaths: list | None = None) -> list:
+    """各根目录最近一次扫盘任务的进度"""
+    roots = localpaths or list(dict.fromkeys(list(SCAN_PATH) + list(scan_missions)))
+    statuses = []
+    for root in roots:
+        mission = await get_scan_mission(root).status(cursor)
+        if mission is not None:
+            statuses.append(mission)
+    return statuses
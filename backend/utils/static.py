@@ -0,0 +1,74 @@
+# -*- coding: UTF8 -*-
+import os
+import hashlib
+from urllib.parse import parse_qs
+from starlette.staticfiles import StaticFiles
+
+from utils.compress import PrecompressedStaticFiles
+from utils.local import THUMBNAIL_NAME_RE, thumbnail_version
+
+"""
+静态文件 / 缩略图的浏览器缓存
+ - 模板中用 static_url('js/hls.js') 生成带内容哈希的地址 /frontend/static/js/hls.js?v=<哈希>
+   哈希与当前文件内容一致时返回 Cache-Control: immutable (一年), 重复打开页面不再请求
+   文件更新后哈希变化, 页面引用新地址; 不带哈希 (或哈希已过期) 的请求 no-cache, 按 ETag/Last-Modified 协商 (304)
+ - 缩略图文件名即视频内容指纹 (utils/local.py thumbnail_path), 地址带 ?v=<修改时间> (versioned_thumbnail)
+   版本与当前文件一致时 immutable; 重新生成 (/api/thumbnail 或修改 THUMBNAIL_TIME) 后版本变化, 页面引用新地址
+   旧版按路径命名 (sha256) 的缩略图、不带版本或版本已过期的请求 no-cache
+"""
+
+STATIC_DIR = "./frontend/static"
+STATIC_URL = "/frontend/static"
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+FINGERPRINT_LENGTH = 12
+
+fingerprints = {}  # 相对路径 -> (mtime_ns, size, 哈希)
+
+
+def static_fingerprint(path: str) -> str:
+    """静态文件内容哈希 (按修改时间和大小缓存), 文件不存在返回空"""
+    try:
+        stat_result = os.stat(os.path.join(STATIC_DIR, path))
+    except OSError:
+        return ''
+    cached = fingerprints.get(path)
+    if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+        return cached[2]
+    digest = hashlib.sha1()
+    with open(os.path.join(STATIC_DIR, path), 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()[:FINGERPRINT_LENGTH]
+    fingerprints[path] = (stat_result.st_mtime_ns, stat_result.st_size, fingerprint)
+    return fingerprint
+
+def static_url(path: str) -> str:
+    """模板全局函数: 带内容哈希的静态文件地址"""
+    path = path.lstrip('/')
+    fingerprint = static_fingerprint(path)
+    return f"{STATIC_URL}/{path}?v={fingerprint}" if fingerprint else f"{STATIC_URL}/{path}"
+
+
+def with_cache_control(response, immutable: bool):
+    if response.status_code in (200, 304):
+        response.headers["Cache-Control"] = CACHE_IMMUTABLE if immutable else CACHE_REVALIDATE
+    return response
+
+
+class FingerprintedStaticFiles(PrecompressedStaticFiles):
+    """/frontend/static: ?v= 与当前内容哈希一致时 immutable"""
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        version = parse_qs(scope.get("query_string", b"").decode()).get("v", [''])[0]
+        return with_cache_control(response, bool(version) and version == static_fingerprint(path))
+
+
+class ThumbnailStaticFiles(StaticFiles):
+    """/.temp: 按内容指纹命名且 ?v= 与当前修改时间一致的缩略图 immutable"""
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        match = THUMBNAIL_NAME_RE.match(os.path.basename(path))
+        version = parse_qs(scope.get("query_string", b"").decode()).get("v", [''])[0]
+        immutable = match is not None and len(match.group(1)) == 32 and bool(version) and version == thumbnail_version(os.path.join(self.directory, path))
+        return with_cache_control(response, immutable)
@@ -0,0 +1,118 @@
+# -*- coding: UTF8 -*-
+import json
+from loguru import logger
+
+from utils.db import format_query_for_db, fetchall_dict
+
+"""
+演员/类别/发行商 规范化存储
+ - dav_actor  / dav_web_actor
+ - dav_genre  / dav_web_genre
+ - dav_studio / dav_web_studio
+"""
+
+# kind: (实体表, 关联表, 关联字段)
+TAG_TABLES = {
+    'actor': ('dav_actor', 'dav_web_actor', 'actor_id'),
+    'genre': ('dav_genre', 'dav_web_genre', 'genre_id'),
+    'studio': ('dav_studio', 'dav_web_studio', 'studio_id'),
+}
+
+def parse_tag_list(value):
+    """
+    解析 dav_web 中的 JSON 列表字段
+    """
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple)):
+        names = value
+    else:
+        try:
+            names = json.loads(value)
+        except ValueError:
+            names = [value]
+        if isinstance(names, str):
+            names = [names]
+        elif not isinstance(names, list):
+            return []
+    # 去空去重, 保持原有顺序
+    return list(dict.fromkeys(str(name).strip() for name in names if str(name).strip()))
+
+TAG_BATCH = 500  # IN (...) 参数个数 / 回填每批记录数
+
+
+def chunked(items: list, size: int = TAG_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+async def resolve_tag_ids(cursor, table: str, names: list) -> dict:
+    """
+    名称 -> id, 不存在的先写入实体表
+    每批一次查询 + 一次批量写入 + 一次补查, 不按名称逐个查询
+    """
+    tag_ids = {}
+    for batch in chunked(list(dict.fromkeys(names))):
+        placeholders = ",".join(["%s"] * len(batch))
+        check_query = format_query_for_db(f"SELECT id,name FROM {table} WHERE name IN ({placeholders})")
+        logger.debug(f"check_query: {check_query} values: {len(batch)}")
+        await cursor.execute(check_query, tuple(batch))
+        tag_ids.update({row['name']: row['id'] for row in await fetchall_dict(cursor)})
+        missing = [name for name in batch if name not in tag_ids]
+        if not missing:
+            continue
+        insert_query = format_query_for_db(f"INSERT INTO {table} (name) SELECT %s WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE name=%s)")
+        logger.debug(f"insert_query: {insert_query} values: {len(missing)}")
+        await cursor.executemany(insert_query, [(name, name,) for name in missing])
+        placeholders = ",".join(["%s"] * len(missing))
+        check_query = format_query_for_db(f"SELECT id,name FROM {table} WHERE name IN ({placeholders})")
+        await cursor.execute(check_query, tuple(missing))
+        tag_ids.update({row['name']: row['id'] for row in await fetchall_dict(cursor)})
+    return tag_ids
+
+async def save_tags_batch(cursor, kind: str, code_names: list):
+    """
+    批量写入实体并建立与识别码的关联
+    code_names : [(识别码, [名称...])]
+    """
+    table, link_table, field = TAG_TABLES[kind]
+    tag_ids = await resolve_tag_ids(cursor, table, [name for _, names in code_names for name in names])
+    links = [(code, tag_ids[name],) for code, names in code_names for name in names if name in tag_ids]
+    if not links:
+        return
+    insert_query = format_query_for_db(f"INSERT INTO {link_table} (code, {field}) SELECT %s, %s WHERE NOT EXISTS (SELECT 1 FROM {link_table} WHERE code=%s and {field}=%s)")
+    logger.debug(f"insert_query: {insert_query} values: {len(links)}")
+    await cursor.executemany(insert_query, [(code, tag_id, code, tag_id,) for code, tag_id in links])
+
+def web_tag_names(code_info: dict) -> dict:
+    """刮削结果 / dav_web 记录 -> {kind: [名称...]}"""
+    return {
+        'actor': parse_tag_list(code_info.get('actors')),
+        'genre': parse_tag_list(code_info.get('genre')),
+        'studio': parse_tag_list([code_info.get('studio') or '']),
+    }
+
+async def save_web_tags(cursor, code_info: dict):
+    """
+    按 get_javbus_title / get_123av_title 返回结果写入演员/类别/发行商
+    """
+    if not code_info or not code_info.get('code'):
+        return
+    for kind, names in web_tag_names(code_info).items():
+        await save_tags_batch(cursor, kind, [(code_info['code'], names)])
+
+async def backfill_web_tags(cursor) -> int:
+    """
+    迁移步骤 (utils/migrate.py v6): 解析 dav_web 中已有的 JSON 字段, 回填演员/类别/发行商关联表
+    只在迁移时执行一次, 由迁移事务提交; 之后的刮削结果由 save_web_tags 写入
+    """
+    check_query = "SELECT code,studio,genre,actors FROM dav_web WHERE status=1"
+    check_query = format_query_for_db(check_query)
+    logger.debug(f"check_query: {check_query}")
+    await cursor.execute(check_query)
+    web_infos = await fetchall_dict(cursor)
+    for batch in chunked(web_infos):
+        batch_names = [(web_info['code'], web_tag_names(web_info)) for web_info in batch if web_info['code']]
+        for kind in TAG_TABLES:
+            await save_tags_batch(cursor, kind, [(code, names[kind]) for code, names in batch_names])
+    logger.success(f"Web tags backfill successful! len: {len(web_infos)}")
+    return len(web_infos)
@@ -0,0 +1,106 @@
+# -*- coding: UTF8 -*-
+import os
+import asyncio
+from loguru import logger
+
+from utils.db import transaction, format_query_for_db, fetchone_dict, fetchall_dict
+from utils.missions import BackgroundMission, now_time
+from utils.cache import invalidate_cache
+from utils.fingerprint import file_fingerprint, file_hash, fingerprint_executor
+from config import VERIFY_CONCURRENCY
+
+"""
+全量校验 (任务类型 6)
+ - 按 id 顺序分批读取 dav_local, 顺序读取整个文件计算 blake2b-256 (VERIFY_CHUNK_MB 大块读取)
+ - 首次校验记录哈希 (dav_local.hash); 之后与上次结果比较:
+     采样指纹变化 => 文件已被修改 (changed), 更新指纹和哈希
+     指纹相同但哈希不同 => 内容损坏 (mismatch), 保留原哈希并记录警告
+ - rate 为读取速度 MB/s; 每批一次事务写入结果并记录断点 (本批最后一个 id), 重启后从断点继续
+"""
+
+MISSION_TYPE_VERIFY = 6
+VERIFY_BATCH = 20
+
+VERIFY_COUNT_QUERY = format_query_for_db("SELECT count(*) as len FROM dav_local WHERE status=0 and id > %s")
+VERIFY_ROWS_QUERY = format_query_for_db("SELECT id,path,file,crc,hash FROM dav_local WHERE status=0 and id > %s ORDER BY id ASC LIMIT %s")
+VERIFY_UPDATE_QUERY = format_query_for_db("UPDATE dav_local SET crc=%s, hash=%s, verified=%s WHERE id=%s")
+
+
+def verify_file(local_file: dict) -> tuple:
+    """
+    校验单个文件
+    return (结果, 指纹, 哈希, 字节数): verified / changed / mismatch / missing
+    """
+    video_name = os.path.join(local_file['path'], local_file['file'])
+    if not os.path.isfile(video_name):
+        return "missing", '', '', 0
+    fingerprint = file_fingerprint(video_name)
+    full_hash, size, seconds = file_hash(video_name)
+    logger.debug(f"verify: {video_name} - {size / 1024 / 1024:.1f} MB in {seconds:.2f}s")
+    if local_file['crc'] and fingerprint != local_file['crc']:
+        return "changed", fingerprint, full_hash, size
+    if local_file['hash'] and full_hash != local_file['hash']:
+        return "mismatch", fingerprint, full_hash, size
+    return "verified", fingerprint, full_hash, size
+
+async def run_verify(cursor, mission: dict, state: dict) -> None:
+    """执行校验任务, 从任务断点继续"""
+    await cursor.execute(VERIFY_COUNT_QUERY, (int(mission['checkpoint'] or 0),))
+    mission['total'] = mission['progress'] + (await fetchone_dict(cursor))['len']
+    logger.info(f"Verify mission {mission['id']} starting - total: {mission['total']} progress: {mission['progress']} checkpoint: {mission['checkpoint']}")
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(VERIFY_CONCURRENCY)
+
+    async def verify(local_file):
+        async with semaphore:
+            return await loop.run_in_executor(fingerprint_executor, verify_file, local_file)
+
+    await verify_mission.save(cursor, mission, 1)
+    while True:
+        await cursor.execute(VERIFY_ROWS_QUERY, (int(mission['checkpoint'] or 0), VERIFY_BATCH,))
+        local_files = await fetchall_dict(cursor)
+        if not local_files:
+            break
+        results = await asyncio.gather(*(verify(local_file) for local_file in local_files), return_exceptions=True)
+
+        now = now_time()
+        updates = []
+        crc_changed = False  # 缓存的列表含 crc, hash/verified 不在缓存中
+        for local_file, result in zip(local_files, results):
+            if isinstance(result, Exception):
+                state["errors"] += 1
+                logger.error(f"Verify error: {local_file['id']} - {str(result)}")
+                continue
+            status, fingerprint, full_hash, size = result
+            state[status] += 1
+            state["bytes"] += size
+            if status == "mismatch":
+                logger.warning(f"Verify mismatch: {local_file['id']} {os.path.join(local_file['path'], local_file['file'])} - {local_file['hash']} => {full_hash}")
+            elif status in ("verified", "changed"):
+                updates.append((fingerprint, full_hash, now, local_file['id'],))
+                crc_changed = crc_changed or fingerprint != local_file['crc']
+
+        mission.update(checkpoint=str(local_files[-1]['id']), progress=mission['progress'] + len(local_files), rate=verify_mission.rate(state["bytes"] / 1024 / 1024))
+        async with transaction(cursor):
+            if updates:
+                await cursor.executemany(VERIFY_UPDATE_QUERY, updates)
+            await verify_mission.save(cursor, mission, 1, tx=False)
+        if crc_changed:
+            await invalidate_cache('dav_local')
+        logger.info(f"Verify {mission['progress']}/{mission['total']} - checkpoint: {mission['checkpoint']} rate: {mission['rate']} MB/s")
+
+
+verify_mission = BackgroundMission(MISSION_TYPE_VERIFY, "Verify", run_verify, ("verified", "changed", "mismatch", "missing", "errors", "bytes"))
+
+async def start_verify(create: bool = True) -> int:
+    """启动校验任务 (同一时间只运行一个), 存在未完成的任务则从断点继续"""
+    return await verify_mission.start(create)
+
+async def stop_verify() -> None:
+    """停止当前进程内的校验任务 (保留断点)"""
+    await verify_mission.stop()
+
+async def get_verify_status(cursor) -> dict | None:
+    """最近一次校验任务的进度, rate 为 MB/s"""
+    return await verify_mission.status(cursor)
@@ -0,0 +1,265 @@
+# -*- coding: UTF8 -*-
+import os
+import time
+import asyncio
+from loguru import logger
+
+from utils.db import transaction, format_query_for_db
+from utils.cache import invalidate_cache
+from utils.local import sync_scan_dirs, sync_generate_thumbnails, in_scan_paths
+from utils.prefetch import start_prefetch
+from config import SCAN_PATH, SCAN_CODE, SCAN_EXT_LIST, PATH_FILTER_LIST
+from config import WATCH_MODE, WATCH_INTERVAL, WATCH_DEBOUNCE, WATCH_SETTLE, WATCH_DELETE, WATCH_DELETE_DELAY
+
+try:
+    from watchdog.observers import Observer  # 可选: Linux 下为 inotify
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_ENABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    WATCHDOG_ENABLE = False
+
+"""
+目录监控: SCAN_PATH 下的新建/移动/删除只扫描变化的目录, 不需要手动 /api/scan
+ - inotify (需安装 watchdog): 文件事件标记所在目录, 目录事件标记整个子树
+ - poll (NFS/SMB 挂载不产生 inotify 事件, 或未安装 watchdog): 每 WATCH_INTERVAL 秒比较所有目录的修改时间
+   目录内新建/删除/重命名文件会更新目录修改时间, 只需 stat 目录, 不列文件
+ - 防抖: 最后一个事件 WATCH_DEBOUNCE 秒后一次扫描所有标记的目录 (持续有事件时最多等待 10 倍)
+ - 正在写入的文件 (修改时间在 WATCH_SETTLE 秒内) 跳过, 稍后重新扫描所在目录
+ - 文件不存在的记录等待 WATCH_DELETE_DELAY 秒, 期间出现相同指纹的文件视为移动 (跨文件系统的 mv 先复制后删除),
+   超时后标记删除; 所在监控根目录不存在或为空 (挂载断开) 时不删除
+ - 新文件写入后生成缩略图, 开启 SCAN_CODE 时启动元数据预取
+ - 只在一个进程内运行 (多 worker 时由启动逻辑保证)
+"""
+
+WATCH_DELETE_QUERY = format_query_for_db("UPDATE dav_local SET status=1, updated_time=NOW() WHERE id=%s and status=0")
+WATCH_THUMBNAIL_QUERY = "SELECT id,code,path,file,crc,phash FROM dav_local WHERE path=%s and status=0"
+WATCH_MAX_WAIT = 10  # 持续有事件时最多等待 WATCH_DEBOUNCE 的倍数
+
+
+def is_watched_file(path: str) -> bool:
+    """需要入库的视频文件 (按后缀)"""
+    name = os.path.basename(path)
+    if name.startswith(".DS_Store") or name.startswith("._"):
+        return False
+    return os.path.splitext(name)[1].lower() in SCAN_EXT_LIST
+
+def is_filtered_path(path: str) -> bool:
+    return any(filter in path for filter in PATH_FILTER_LIST)
+
+def snapshot_dirs(roots: list) -> dict:
+    """所有目录的修改时间 (poll 模式)"""
+    snapshot = {}
+    stack = [root for root in roots if os.path.isdir(root)]
+    while stack:
+        path = stack.pop()
+        try:
+            snapshot[path] = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return snapshot
+
+def root_available(path: str, roots: list) -> bool:
+    """记录所在的监控根目录存在且不为空 (挂载断开时不删除记录)"""
+    for root in roots:
+        if in_scan_paths(path, [root]):
+            try:
+                return any(True for _ in os.scandir(root))
+            except OSError:
+                return False
+    return False
+
+
+class WatchHandler(FileSystemEventHandler):
+    """watchdog 事件 (监控线程) 转到事件循环"""
+    def __init__(self, watcher, loop):
+        self.watcher = watcher
+        self.loop = loop
+
+    def on_any_event(self, event):
+        if event.event_type not in ("created", "deleted", "moved", "modified", "closed"):
+            return
+        paths = [event.src_path, getattr(event, 'dest_path', '') or '']
+        self.loop.call_soon_threadsafe(self.watcher.mark_event, event.is_directory, event.event_type, [os.fsdecode(path) for path in paths if path])
+
+
+class PathWatcher:
+    def __init__(self, roots: list):
+        self.roots = [root for root in roots if root]
+        self.mode = ''
+        self.dirty = {}  # 目录 -> 是否包含子目录
+        self.pending_deletes = {}  # id -> 首次发现文件不存在的时间
+        self.first_event = 0.0
+        self.last_event = 0.0
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.poll_task: asyncio.Task | None = None
+        self.observer = None
+        self.stats = {"events": 0, "batches": 0, "inserted": 0, "moved": 0, "deleted": 0, "last_scan": None}
+
+    def mark(self, path: str, recursive: bool = False) -> None:
+        """标记需要扫描的目录"""
+        if is_filtered_path(path) or not in_scan_paths(path, self.roots):
+            return
+        self.dirty[path] = self.dirty.get(path, False) or recursive
+        now = time.monotonic()
+        if not self.first_event:
+            self.first_event = now
+        self.last_event = now
+        self.stats["events"] += 1
+        self.wakeup.set()
+
+    def mark_event(self, is_directory: bool, event_type: str, paths: list) -> None:
+        """inotify 事件: 目录的新建/删除/移动标记整个子树, 视频文件标记所在目录"""
+        for path in paths:
+            if is_directory:
+                if event_type in ("created", "deleted", "moved"):
+                    self.mark(path, True)
+                    self.mark(os.path.dirname(path))
+            elif is_watched_file(path):
+                self.mark(os.path.dirname(path))
+
+    async def poll(self) -> None:
+        """poll 模式: 比较目录修改时间"""
+        previous = await asyncio.to_thread(snapshot_dirs, self.roots)
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            current = await asyncio.to_thread(snapshot_dirs, self.roots)
+            for path, mtime in current.items():
+                if path not in previous:
+                    self.mark(path, True)
+                elif previous[path] != mtime:
+                    self.mark(path)
+            for path in previous.keys() - current.keys():
+                self.mark(path, True)
+            previous = current
+
+    def take_dirs(self) -> list:
+        """取出标记的目录, 已被包含子目录的上级覆盖的目录不重复扫描"""
+        dirty, self.dirty = self.dirty, {}
+        self.first_event = 0.0
+        trees = [path for path, recursive in dirty.items() if recursive]
+        return sorted(
+            (path, recursive) for path, recursive in dirty.items()
+            if not any(tree != path and in_scan_paths(path, [tree]) for tree in trees)
+        )
+
+    async def flush(self) -> None:
+        """扫描标记的目录, 处理删除, 生成缩略图"""
+        dirs = self.take_dirs()
+        stats, vanished, deferred_dirs, changed_dirs = await sync_scan_dirs(dirs, list(self.pending_deletes), WATCH_SETTLE)
+        self.stats["batches"] += 1
+        self.stats["inserted"] += stats["inserted"]
+        self.stats["moved"] += stats["moved"]
+        self.stats["last_scan"] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+        # 正在写入的文件稍后重新扫描
+        loop = asyncio.get_running_loop()
+        for path in deferred_dirs:
+            loop.call_later(WATCH_SETTLE, self.mark, path)
+
+        # 文件不存在的记录: 等待期内继续参与移动匹配, 超时后标记删除
+        now = time.monotonic()
+        pending = {}
+        expired = []
+        for local_file in vanished:
+            first_seen = self.pending_deletes.get(local_file['id'], now)
+            if now - first_seen < WATCH_DELETE_DELAY:
+                pending[local_file['id']] = first_seen
+            elif WATCH_DELETE and root_available(local_file['path'], self.roots):
+                expired.append(local_file)
+        self.pending_deletes = pending
+        if expired:
+            async with transaction() as cursor:
+                await cursor.executemany(WATCH_DELETE_QUERY, [(local_file['id'],) for local_file in expired])
+            await invalidate_cache('dav_local')
+            self.stats["deleted"] += len(expired)
+            logger.info(f"Watch deleted: {[os.path.join(local_file['path'], local_file['file']) for local_file in expired]}")
+
+        # 新文件: 缩略图 (顺带感知哈希) / 元数据
+        for path in changed_dirs:
+            await sync_generate_thumbnails(WATCH_THUMBNAIL_QUERY, (path,))
+        if stats["inserted"] and SCAN_CODE:
+            await start_prefetch()
+
+    async def run(self) -> None:
+        """防抖后扫描; 有待删除的记录时定期重新检查"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), WATCH_DELETE_DELAY if self.pending_deletes else None)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            while self.dirty:
+                now = time.monotonic()
+                wait = WATCH_DEBOUNCE - (now - self.last_event)
+                if wait <= 0 or now - self.first_event >= WATCH_DEBOUNCE * WATCH_MAX_WAIT:
+                    break
+                await asyncio.sleep(wait)
+            if not self.dirty and not self.pending_deletes:
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Watch scan error: {str(e)}")
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if WATCH_MODE != 'poll' and WATCHDOG_ENABLE:
+            self.mode = 'inotify'
+            self.observer = Observer()
+            handler = WatchHandler(self, loop)
+            for root in self.roots:
+                if os.path.isdir(root):
+                    self.observer.schedule(handler, root, recursive=True)
+            self.observer.start()
+        else:
+            if WATCH_MODE == 'inotify':
+                logger.warning("watchdog is not installed, falling back to polling")
+            self.mode = 'poll'
+            self.poll_task = asyncio.create_task(self.poll())
+        self.task = asyncio.create_task(self.run())
+        logger.info(f"Watching {self.roots} - mode: {self.mode}")
+
+    async def stop(self) -> None:
+        if self.observer is not None:
+            self.observer.stop()
+            await asyncio.to_thread(self.observer.join)
+            self.observer = None
+        tasks = [task for task in (self.poll_task, self.task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = self.poll_task = None
+
+    def status(self) -> dict:
+        return {
+            "mode": self.mode,
+            "roots": self.roots,
+            "running": self.task is not None and not self.task.done(),
+            "dirty": len(self.dirty),
+            "pending_deletes": len(self.pending_deletes),
+            **self.stats,
+        }
+
+
+watcher: PathWatcher | None = None
+
+async def start_watcher() -> None:
+    """启动目录监控 (WATCH_ENABLE)"""
+    global watcher
+    if watcher is None:
+        watcher = PathWatcher(SCAN_PATH)
+        watcher.start()
+
+async def stop_watcher() -> None:
+    global watcher
+    if watcher is not None:
+        await watcher.stop()
+        watcher = None
+
+def get_watcher_status() -> dict | None:
+    return watcher.status() if watcher is not None else None
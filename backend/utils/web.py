@@ -6,206 +6,184 @@ import time
 import datetime
 import asyncio
 import hashlib
+import random
 import subprocess
-import requests
+import httpx
 import shlex
 import ssl
 from zlib import crc32
 from pathlib import Path
 from datetime import timedelta
+from urllib.parse import urlsplit
 from fastapi.responses import StreamingResponse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-from config import web_headers, web_proxies
+from utils.extractors import JAVBUS, AV123, extract_code_info
+from config import web_headers, web_proxies, HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_HOST_CONCURRENCY, HTTP_HOST_RATE, HTTP_RETRY_BACKOFF
+
+try:
+    import h2  # noqa: F401 可选: 安装后启用 HTTP/2
+    HTTP2_ENABLE = True
+except ImportError:
+    HTTP2_ENABLE = False
 
 """
-替换图片URL前缀
+共享 HTTP 客户端
+ - 长连接池复用, 站点支持时使用 HTTP/2
+ - 每个站点限制并发请求数与每秒请求数, 单个慢站点不阻塞事件循环
+ - 连接错误 / 429 / 5xx 按指数退避重试
 """
-def replace_images_url(old_list, prefix):
-    prefix = prefix.rstrip('/')
-    new_list = []
-    for image in old_list:
-        if not image.startswith(('https://', 'http://')):
-            # 如果是相对路径，添加前缀
-            new_image = f"{prefix}{image}"
-            logger.debug(f"new_image: {new_image}")
-        else:
-            # 如果已经是完整URL，保持不变
-            new_image = image
-            logger.debug(f"old_image: {new_image}")
-        new_list.append(new_image)
-    return new_list
-
-def get_javbus_title(code_name):
+http_client: httpx.AsyncClient | None = None
+host_semaphores = {}  # host -> asyncio.Semaphore
+host_next_time = {}  # host -> 下一个请求允许发出的时间 (loop.time)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享客户端, 首次调用时创建"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            headers=web_headers,
+            proxy=web_proxies.get('https') or None,
+            http2=HTTP2_ENABLE,
+            verify=False,
+            follow_redirects=False,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=min(HTTP_TIMEOUT, 5)),
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS, keepalive_expiry=60),
+        )
+    return http_client
+
+async def close_http_client():
+    """关闭共享客户端"""
+    global http_client
+    if http_client is not None:
+        client, http_client = http_client, None
+        await client.aclose()
+
+async def wait_host_rate(host: str):
+    """每个站点每秒最多 HTTP_HOST_RATE 个请求 (0 不限制)"""
+    if HTTP_HOST_RATE <= 0:
+        return
+    now = asyncio.get_running_loop().time()
+    send_time = max(now, host_next_time.get(host, 0))
+    host_next_time[host] = send_time + 1 / HTTP_HOST_RATE  # 预占下一个时间片
+    if send_time > now:
+        await asyncio.sleep(send_time - now)
+
+def raise_for_retry(response: httpx.Response) -> None:
+    """429 / 5xx 抛出 httpx.HTTPStatusError (可重试)"""
+    if response.status_code in RETRY_STATUS:
+        response.raise_for_status()
+
+async def fetch_with_retry(url: str, retries: int, request):
+    """
+    按站点限制并发/频率执行 request(), 连接错误 / 429 / 5xx 时重试
+    retries : 重试次数, 用尽后抛出 httpx.HTTPError
+    """
+    host = urlsplit(url).netloc
+    semaphore = host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = host_semaphores[host] = asyncio.Semaphore(HTTP_HOST_CONCURRENCY)
+    attempt = 0
+    while True:
+        try:
+            async with semaphore:
+                await wait_host_rate(host)
+                return await request()
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if attempt >= retries:
+                raise
+            delay = HTTP_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random() / 2)
+            attempt += 1
+            logger.warning(f"fetch retry {attempt}/{retries} in {delay:.1f}s: {url} - {str(e)}")
+            await asyncio.sleep(delay)
+
+async def fetch_response(url: str, retries: int = 0) -> httpx.Response:
+    """
+    按站点限制并发/频率发出 GET 请求
+    retries : 连接错误 / 429 / 5xx 的重试次数, 用尽后抛出 httpx.HTTPError
+    """
+    async def request():
+        response = await get_http_client().get(url)
+        raise_for_retry(response)
+        return response
+    return await fetch_with_retry(url, retries, request)
+
+async def fetch_bytes(url: str, max_bytes: int, retries: int = 0) -> tuple:
+    """
+    流式下载, 超过 max_bytes 时中止 (ValueError), 不把超大响应读入内存
+    Content-Length 已超出时不读取响应体
+    return (响应, 内容)
+    """
+    async def request():
+        async with get_http_client().stream("GET", url) as response:
+            raise_for_retry(response)
+            length = response.headers.get("content-length", "")
+            if length.isdigit() and int(length) > max_bytes:
+                raise ValueError(f"too large: {length} bytes")
+            data = bytearray()
+            async for chunk in response.aiter_bytes():
+                data += chunk
+                if len(data) > max_bytes:
+                    raise ValueError(f"too large: > {max_bytes} bytes")
+            return response, bytes(data)
+    return await fetch_with_retry(url, retries, request)
+
+async def fetch_text(url: str, retries: int = 0) -> str:
+    """获取页面文本 (UTF-8)"""
+    response = await fetch_response(url, retries=retries)
+    response.encoding = "UTF-8"
+    return response.text
+
+JAVBUS_URL = JAVBUS.baseurl
+AV123_URL = AV123.baseurl
+
+def format_code_name(code_name):
+    return code_name.upper() if code_name.find('-') > 0 else code_name.lower()
+
+def parse_javbus_title(code_name, code_url, response):
+    """解析 javbus 页面"""
+    return extract_code_info(JAVBUS, code_name, code_url, response)
+
+def parse_123av_title(code_name, code_url, response):
+    """解析 123av 页面"""
+    return extract_code_info(AV123, code_name, code_url, response)
+
+def get_code_source(code_name):
+    """
+    按识别码选择站点
+    return (code_name, code_url, parser)
+    """
+    code_name = format_code_name(code_name)
+    if code_name.upper().startswith('FC2-'):
+        return code_name, AV123_URL + code_name, parse_123av_title
+    return code_name, JAVBUS_URL + code_name, parse_javbus_title
+
+async def get_javbus_title(code_name):
     try:
         if len(code_name) == 0:
             logger.error(f"Not Code")
             return None
-        code_name = code_name.upper() if code_name.find('-') > 0 else code_name.lower()
-        baseurl = 'https://www.javbus.com/'
-        code_url = baseurl + code_name
+        code_name = format_code_name(code_name)
+        code_url = JAVBUS_URL + code_name
         logger.info(f"code_url: {code_url}")
-        if web_proxies.get('https','') == '':
-            response = requests.get(code_url, headers=web_headers, allow_redirects=False, timeout=10, verify=False)
-        else:
-            response = requests.get(code_url, headers=web_headers, proxies=web_proxies, allow_redirects=False, timeout=10, verify=False)
-        response.encoding="UTF-8"
-        response = response.text
-        # logger.debug(f"response: {response}")
-        # logger.debug(f"response.find('Page Not Found'): {response.find('Page Not Found')}")
-        if response.find('Page Not Found') > 0:
-            logger.error(f"404 Page Not Found")
-            return None
-        
-        # # temp_log
-        # log_message = f"{datetime.datetime.now()} {code_name} - response: {response}\n"
-        # with open(f'jav_{code_name}_log.txt', 'w') as log_file:
-        #     log_file.write(log_message)
-
-        code_title=re.findall('<h3>(.+)</h3>',response)[0].strip()
-        logger.debug(f"title: {code_title}")
-
-        if code_title.lower().find(code_name.lower()) == -1:
-            logger.error(f"title is None: {code_title}")
-            return None
-
-        date=re.findall('發行日期:</span>(.+)</p>',response)
-        logger.debug(f"date: {date}")
-
-        pattern = r'<a href="https://www.javbus.com/studio/\w+">(.*?)</a>'
-        studio = re.findall(pattern,response)
-        logger.debug(f"studio: {studio}")
-
-        pattern = r'<a href="https://www.javbus.com/director/\w+">(.*?)</a>'
-        director = re.findall(pattern,response)
-        logger.debug(f"director: {director}")
-
-        pattern = r'<a href="https://www.javbus.com/series/\w+">(.*?)</a>'
-        series = re.findall(pattern,response)
-        logger.debug(f"series: {series}")
-
-        pattern = r'<a href="https://www.javbus.com/genre/\w+">(.*?)</a></label></span>'
-        genre = re.findall(pattern,response)
-        logger.debug(f"genre: {genre}")
-
-        pattern = r'<a href="https://www.javbus.com/star/\w+">([^<]+)</a>'
-        actors = re.findall(pattern,response)
-        logger.debug(f"actors: {actors}")
-
-        pattern = r'<a class="sample-box" href="([^"]+)">'
-        images = re.findall(pattern,response)
-        logger.debug(f"old images: {images}")
-        images = replace_images_url(images, baseurl)
-        logger.debug(f"new images: {images}")
-
-        code_info = {
-            "code": code_name,
-            "name": code_title,
-            "date": date[0].strip() if len(date) > 0 else '',
-            "studio": studio[0].strip() if len(studio) > 0 else '',
-            "director": director[0].strip() if len(director) > 0 else '',
-            "series": series[0].strip() if len(series) > 0 else '',
-            "genre": genre if len(genre) > 0 else [],
-            "websites": [code_url],
-            "actors": actors if len(actors) > 0 else [],
-            "images": images if len(images) > 0 else [],
-            "score": 0,
-        }
-
-        if code_title.lower().find(code_name.lower()) != -1:
-            return code_info
-        else:
-            logger.error(f"title is None: {code_title}")
-            return None
+        response = await fetch_text(code_url)
+        return parse_javbus_title(code_name, code_url, response)
     except Exception as e:
         logger.error(f"Exception: {str(e)}")
         return None
 
-def get_123av_title(code_name):
+async def get_123av_title(code_name):
     try:
         if len(code_name) == 0:
             logger.error(f"Not Code")
             return None
-        code_name = code_name.upper() if code_name.find('-') > 0 else code_name.lower()
-        baseurl = 'https://123av.com/ja/v/'
-        code_url = baseurl + code_name
+        code_name = format_code_name(code_name)
+        code_url = AV123_URL + code_name
         logger.info(f"code_url: {code_url}")
-        if web_proxies.get('https','') == '':
-            response = requests.get(code_url, headers=web_headers, allow_redirects=False, timeout=10, verify=False)
-        else:
-            response = requests.get(code_url, headers=web_headers, proxies=web_proxies, allow_redirects=False, timeout=10, verify=False)
-        response.encoding="UTF-8"
-        response = response.text
-        # logger.debug(f"response: {response}")
-        # logger.debug(f"response.find('Page Not Found'): {response.find('Page Not Found')}")
-        if response.find('Page Not Found') > 0:
-            logger.error(f"404 Page Not Found")
-            return None
-        
-        # temp_log
-        log_message = f"{datetime.datetime.now()} {code_name} - response: {response}\n"
-        with open(f'123_{code_name}_log.txt', 'w') as log_file:
-            log_file.write(log_message)
-
-        code_title=re.findall('<h1>(.+)</h1>',response)[0].strip().replace(' - 123AV','').replace('オンライン視聴, , ','').replace('オンライン視聴, ', '')
-        # code_title=re.findall('<title>(.+)</title>',response)[0].strip().replace(' - 123AV','').replace('オンライン視聴, , ','').replace('オンライン視聴, ', '')
-        logger.debug(f"title: {code_title}")
-        
-        if code_title.lower().find(code_name.lower()) == -1:
-            logger.error(f"title is None: {code_title}")
-            return None
-
-        date=re.findall('リリース日:</span>(.+)</p>',response)
-        logger.debug(f"date: {date}")
-
-        pattern = r'<a href="https://www.123av.com/studio/\w+">(.*?)</a>'
-        studio = re.findall(pattern,response)
-        logger.debug(f"studio: {studio}")
-
-        pattern = r'<a href="https://www.123av.com/director/\w+">(.*?)</a>'
-        director = re.findall(pattern,response)
-        logger.debug(f"director: {director}")
-
-        pattern = r'<a href="https://www.123av.com/series/\w+">(.*?)</a>'
-        series = re.findall(pattern,response)
-        logger.debug(f"series: {series}")
-
-        pattern = r'<a href="https://www.123av.com/genre/\w+">(.*?)</a></label></span>'
-        genre = re.findall(pattern,response)
-        logger.debug(f"genre: {genre}")
-
-        pattern = r'<a href="https://www.123av.com/star/\w+">([^<]+)</a>'
-        actors = re.findall(pattern,response)
-        logger.debug(f"actors: {actors}")
-
-        pattern = r'<a class="sample-box" href="([^"]+)">'
-        images = re.findall(pattern,response)
-        logger.debug(f"old images: {images}")
-        images = replace_images_url(images, baseurl)
-        logger.debug(f"new images: {images}")
-
-        code_info = {
-            "code": code_name,
-            "name": code_title,
-            "date": date[0].strip() if len(date) > 0 else '',
-            "studio": studio[0].strip() if len(studio) > 0 else '',
-            "director": director[0].strip() if len(director) > 0 else '',
-            "series": series[0].strip() if len(series) > 0 else '',
-            "genre": genre if len(genre) > 0 else [],
-            "websites": [code_url],
-            "actors": actors if len(actors) > 0 else [],
-            "images": images if len(images) > 0 else [],
-            "score": 0,
-        }
-
-        if code_title.lower().find(code_name.lower()) != -1:
-            return code_info
-        else:
-            logger.error(f"title is None: {code_title}")
-            return None
+        response = await fetch_text(code_url)
+        return parse_123av_title(code_name, code_url, response)
     except Exception as e:
         logger.error(f"Exception: {str(e)}")
         return None
@@ -0,0 +1,155 @@
+# -*- coding: UTF8 -*-
+import os
+import signal
+import socket
+import asyncio
+from contextlib import asynccontextmanager
+from loguru import logger
+
+from config import RUN_PATH, UVICORN_WORKERS
+
+try:
+    import fcntl  # Windows 没有 flock, 只支持单 worker (main.py 强制 workers=1)
+except ImportError:
+    fcntl = None
+
+PROCESS_LOCK_ENABLE = fcntl is not None
+
+"""
+多 worker (UVICORN_WORKERS > 1) 共享状态
+ - 后台任务归属: worker 标识 (主机名:进程号) 写入 dav_missions.owner, 见 utils/missions.py
+ - 进程锁: RUN_PATH 下的文件锁 (flock), 进程退出时由系统释放
+   启动初始化 (建表/迁移) 串行执行, 目录监控只在持有锁的 worker 运行
+ - 转码进程: 进程号记录在 RUN_PATH/<分组>/, 任一 worker 都能结束其他 worker 启动的 ffmpeg
+ - 缓存版本号: Redis 不可用时记录在 RUN_PATH/generations/<表> (flock 保护的计数), 各 worker 同时失效
+"""
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+SHARED_STATE = UVICORN_WORKERS > 1 and PROCESS_LOCK_ENABLE
+
+held_locks = {}  # 锁名 -> 文件描述符
+
+
+def run_file(*names: str) -> str:
+    """RUN_PATH 下的文件路径 (自动创建目录)"""
+    path = os.path.join(RUN_PATH, *names)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def try_lock(name: str) -> bool:
+    """
+    非阻塞获取进程锁, 持有到进程退出或 release_lock()
+    return 是否获得 (同一进程重复获取返回 True)
+    """
+    if name in held_locks:
+        return True
+    fd = os.open(run_file(f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+    held_locks[name] = fd
+    return True
+
+def release_lock(name: str) -> None:
+    fd = held_locks.pop(name, None)
+    if fd is not None:
+        os.close(fd)  # 关闭即释放 flock
+
+@asynccontextmanager
+async def process_lock(name: str):
+    """阻塞获取进程锁 (在线程中等待, 不阻塞事件循环), 块结束释放"""
+    fd = os.open(run_file(f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+# ------------------------------------------------------------------------
+# 转码进程
+# ------------------------------------------------------------------------
+def is_own_process(pid: int, name: str) -> bool:
+    """进程存在且命令行包含 name (防止结束复用了进程号的其他进程)"""
+    try:
+        with open(f"/proc/{pid}/cmdline", 'rb') as f:
+            return name.encode() in f.read()
+    except FileNotFoundError:
+        return False
+    except OSError:
+        # 没有 /proc (macOS): 只检查进程是否存在
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+def register_pid(group: str, pid: int) -> None:
+    open(run_file(group, str(pid)), 'w').close()
+
+def unregister_pid(group: str, pid: int) -> None:
+    try:
+        os.remove(os.path.join(RUN_PATH, group, str(pid)))
+    except FileNotFoundError:
+        pass
+
+def kill_registered(group: str, name: str) -> list:
+    """结束分组内所有 worker 登记的进程, return 结束的进程号"""
+    killed = []
+    try:
+        entries = os.listdir(os.path.join(RUN_PATH, group))
+    except FileNotFoundError:
+        return killed
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        if is_own_process(pid, name):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                killed.append(pid)
+            except OSError as e:
+                logger.warning(f"kill process {pid} failed: {str(e)}")
+        unregister_pid(group, pid)
+    return killed
+
+
+# ------------------------------------------------------------------------
+# 缓存版本号 (Redis 不可用时)
+# ------------------------------------------------------------------------
+GENERATION_WIDTH = 20  # 定长十进制, 原地覆盖写入
+
+def parse_generation(fd: int) -> int:
+    data = os.pread(fd, GENERATION_WIDTH, 0)
+    if data and not data.isdigit():
+        return os.fstat(fd).st_size  # 旧格式: 文件长度即版本号
+    return int(data or 0)
+
+def read_generation(table: str) -> int:
+    """读取版本号 (共享锁, 不会读到写了一半的值)"""
+    try:
+        fd = os.open(os.path.join(RUN_PATH, "generations", table), os.O_RDONLY)
+    except FileNotFoundError:
+        return 0
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        return parse_generation(fd)
+    finally:
+        os.close(fd)  # 关闭即释放 flock
+
+def bump_generation(table: str) -> None:
+    """排他锁内读取 + 1 后原地覆盖, 文件大小固定"""
+    fd = os.open(run_file("generations", table), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        generation = parse_generation(fd) + 1
+        os.pwrite(fd, str(generation).zfill(GENERATION_WIDTH).encode(), 0)
+        os.ftruncate(fd, GENERATION_WIDTH)
+    finally:
+        os.close(fd)